@@ -2,8 +2,27 @@ from .user import db, User
 from .borrowers import Borrower
 from .loans import Loan
 from .payments import Payment
-from .salary import SalaryCalculation
+from .salary import SalaryCalculation, OfficerCompensation
 from .settings import SystemSetting
+from .jobs import BackgroundJob
+from .installments import Installment
+from .aging import LoanAgingSnapshot, PortfolioAgingSnapshot
+from .vintages import VintageCohort
+from .business_calendar import Holiday
+from .risk_scores import BorrowerRiskScore
+from .products import LoanProduct
+from .allocations import PaymentAllocation
+from .penalties import PenaltyAccrual
+from .changes import ChangeEvent, ChangeConsumerOffset
+from .reminders import ReminderMessage
+from .reconciliation import BankStatement, StatementLine
+from .bulk_operations import BulkOperation
+from .audit import AuditLog
+from .archive import ArchivedLoan, ArchivedPayment
 
-__all__ = ['db', 'User', 'Borrower', 'Loan', 'Payment', 'SalaryCalculation', 'SystemSetting']
-
+__all__ = ['db', 'User', 'Borrower', 'Loan', 'Payment', 'SalaryCalculation', 'SystemSetting',
+           'BackgroundJob', 'Installment', 'LoanAgingSnapshot', 'PortfolioAgingSnapshot',
+           'VintageCohort', 'Holiday', 'BorrowerRiskScore',
+           'LoanProduct', 'PaymentAllocation', 'PenaltyAccrual', 'OfficerCompensation',
+           'ChangeEvent', 'ChangeConsumerOffset', 'ReminderMessage', 'BankStatement', 'StatementLine',
+           'BulkOperation', 'AuditLog', 'ArchivedLoan', 'ArchivedPayment']
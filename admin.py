@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from user import db, User
 from auth import admin_required
+from business_calendar import Holiday, invalidate_business_calendar
+from cache import cached
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, case
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -145,7 +147,7 @@ def delete_user(user_id):
         from loans import Loan
         loan_count = Loan.query.filter_by(account_officer_id=user_id).count()
         if loan_count > 0:
-            return jsonify({'error': f'Cannot delete user with {loan_count} associated loans'}), 400
+            return jsonify({'error': f'Cannot delete user with {loan_count} associated loans, reassign them first'}), 400
         
         db.session.delete(user)
         db.session.commit()
@@ -156,54 +158,150 @@ def delete_user(user_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Seconds a dashboard bundle is served from cache before it is rebuilt
+DASHBOARD_TTL = 30
+
+def compute_dashboard(officer_id, today):
+    """
+    Build the dashboard bundle: stats, recent loans, today's payments and
+    chart series. All counts and sums come from conditional aggregates, one
+    statement over loans and one over payments.
+    """
+    # Import models to avoid circular imports
+    from borrowers import Borrower
+    from loans import Loan
+    from payments import Payment
+
+    def count_status(status):
+        return func.coalesce(func.sum(case((Loan.status == status, 1), else_=0)), 0)
+
+    loans = db.session.query(
+        func.count(Loan.id),
+        count_status('active'),
+        count_status('completed'),
+        count_status('overdue'),
+        count_status('defaulted'),
+        count_status('written_off'),
+        func.coalesce(func.sum(Loan.principal_amount), 0),
+        func.count(func.distinct(Loan.borrower_id)),
+        db.session.query(func.count(User.id)).scalar_subquery(),
+        db.session.query(func.count(Borrower.id)).scalar_subquery()
+    )
+    if officer_id:
+        loans = loans.filter(Loan.account_officer_id == officer_id)
+    (total_loans, active_loans, completed_loans, overdue_loans, defaulted_loans, written_off_loans,
+     total_principal, officer_borrowers, total_users, total_borrowers) = loans.one()
+
+    is_today = Payment.payment_date == today
+    payments = db.session.query(
+        func.coalesce(func.sum(Payment.actual_amount), 0),
+        func.coalesce(func.sum(case((is_today, Payment.actual_amount), else_=0)), 0),
+        func.coalesce(func.sum(case((is_today, Payment.expected_amount), else_=0)), 0),
+        func.coalesce(func.sum(case((is_today, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Payment.payment_date >= today.replace(day=1), Payment.actual_amount), else_=0)), 0)
+    ).join(Loan, Payment.loan_id == Loan.id)
+    if officer_id:
+        payments = payments.filter(Loan.account_officer_id == officer_id)
+    total_collections, today_collections, today_expected, today_count, month_collections = payments.one()
+
+    def scoped(query):
+        return query.filter(Loan.account_officer_id == officer_id) if officer_id else query
+
+    purposes = scoped(db.session.query(Loan.loan_purpose, func.count(Loan.id)).group_by(Loan.loan_purpose)).all()
+    recent_loans = scoped(db.session.query(Loan, Borrower.name).join(Borrower, Loan.borrower_id == Borrower.id)).order_by(
+        Loan.created_at.desc()).limit(5).all()
+    today_payments = scoped(db.session.query(Payment).join(Loan, Payment.loan_id == Loan.id).filter(is_today)).order_by(
+        Payment.created_at.desc()).limit(5).all()
+
+    stats = {
+        'total_users': total_users if not officer_id else None,
+        'total_borrowers': total_borrowers if not officer_id else officer_borrowers,
+        'total_loans': total_loans,
+        'active_loans': active_loans,
+        'completed_loans': completed_loans,
+        'overdue_loans': overdue_loans,
+        'defaulted_loans': defaulted_loans,
+        'written_off_loans': written_off_loans,
+        'total_principal': float(total_principal),
+        'total_collections': float(total_collections),
+        'today_collections': float(today_collections),
+        'month_collections': float(month_collections)
+    }
+    return {
+        'stats': stats,
+        'recent_loans': [
+            {
+                'id': loan.id,
+                'borrower_name': borrower_name,
+                'principal_amount': float(loan.principal_amount),
+                'status': loan.status,
+                'start_date': loan.start_date.isoformat()
+            }
+            for loan, borrower_name in recent_loans
+        ],
+        'today': {
+            'date': today.isoformat(),
+            'payments': [
+                {
+                    'id': payment.id,
+                    'loan_id': payment.loan_id,
+                    'payment_day': payment.payment_day,
+                    'actual_amount': float(payment.actual_amount or 0)
+                }
+                for payment in today_payments
+            ],
+            'summary': {
+                'total_payments': today_count,
+                'total_expected': float(today_expected),
+                'total_collected': float(today_collections),
+                'collection_rate': float(today_collections / today_expected * 100) if today_expected else 0
+            }
+        },
+        'charts': {
+            'loan_status': {
+                'labels': ['Active', 'Completed', 'Overdue', 'Defaulted', 'Written Off'],
+                'data': [active_loans, completed_loans, overdue_loans, defaulted_loans, written_off_loans]
+            },
+            'loans_by_purpose': {
+                'labels': [purpose for purpose, _ in purposes],
+                'data': [count for _, count in purposes]
+            },
+            'loaned_vs_collected': {
+                'labels': ['Total'],
+                'loaned': [stats['total_principal']],
+                'collected': [stats['total_collections']]
+            }
+        },
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+def get_dashboard_bundle(officer_id=None):
+    """The dashboard bundle for an officer (or the whole book), cached for DASHBOARD_TTL seconds"""
+    today = datetime.now().date()
+    return cached('admin_dashboard', (officer_id, today), lambda: compute_dashboard(officer_id, today),
+                  ttl=DASHBOARD_TTL)
+
+@admin_bp.route('/dashboard', methods=['GET'])
+@login_required
+def dashboard():
+    """
+    Get everything the dashboard shows in one response. Account officers
+    get the figures for their own loans.
+    """
+    try:
+        officer_id = None if current_user.is_admin() else current_user.id
+        return jsonify(get_dashboard_bundle(officer_id)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @login_required
 @admin_required
 def dashboard_stats():
     """Get dashboard statistics"""
     try:
-        # Import models to avoid circular imports
-        from borrowers import Borrower
-        from loans import Loan
-        from payments import Payment
-        
-        # Get basic counts
-        total_users = User.query.count()
-        total_borrowers = Borrower.query.count()
-        total_loans = Loan.query.count()
-        active_loans = Loan.query.filter_by(status='active').count()
-        completed_loans = Loan.query.filter_by(status='completed').count()
-        overdue_loans = Loan.query.filter_by(status='overdue').count()
-        
-        # Get financial stats
-        total_principal = db.session.query(func.sum(Loan.principal_amount)).scalar() or 0
-        total_collections = db.session.query(func.sum(Payment.actual_amount)).scalar() or 0
-        
-        # Get today's collections
-        today = datetime.now().date()
-        today_collections = db.session.query(func.sum(Payment.actual_amount)).filter(
-            Payment.payment_date == today
-        ).scalar() or 0
-        
-        # Get this month's collections
-        first_day_of_month = today.replace(day=1)
-        month_collections = db.session.query(func.sum(Payment.actual_amount)).filter(
-            Payment.payment_date >= first_day_of_month
-        ).scalar() or 0
-        
         return jsonify({
-            'stats': {
-                'total_users': total_users,
-                'total_borrowers': total_borrowers,
-                'total_loans': total_loans,
-                'active_loans': active_loans,
-                'completed_loans': completed_loans,
-                'overdue_loans': overdue_loans,
-                'total_principal': float(total_principal),
-                'total_collections': float(total_collections),
-                'today_collections': float(today_collections),
-                'month_collections': float(month_collections)
-            }
+            'stats': get_dashboard_bundle()['stats']
         }), 200
         
     except Exception as e:
@@ -229,10 +327,27 @@ def get_settings():
 @login_required
 @admin_required
 def update_settings():
-    """Update system settings"""
+    """
+    Update system settings. Changing weekend_payment_handling reschedules
+    the installments of every active and overdue loan; other workers pick
+    the new calendar up within CALENDAR_TTL seconds.
+    """
     try:
+        from settings import SystemSetting
+        from reminders import valid_reminder_rate, valid_reminder_burst
+
         data = request.get_json()
         settings_data = data.get('settings', [])
+
+        for setting_data in settings_data:
+            if setting_data.get('setting_key') == 'reminder_rate_per_minute' and \
+                    not valid_reminder_rate(setting_data.get('setting_value')):
+                return jsonify({'error': 'reminder_rate_per_minute must be a positive number'}), 400
+            if setting_data.get('setting_key') == 'reminder_burst' and \
+                    not valid_reminder_burst(setting_data.get('setting_value')):
+                return jsonify({'error': 'reminder_burst must be a whole number of at least 1'}), 400
+
+        handling = SystemSetting.get_setting('weekend_payment_handling', 'next_business_day')
         
         for setting_data in settings_data:
             key = setting_data.get('setting_key')
@@ -240,10 +355,134 @@ def update_settings():
             description = setting_data.get('description')
             
             if key and value is not None:
-                from settings import SystemSetting
                 SystemSetting.set_setting(key, value, description, current_user.id)
         
-        return jsonify({'message': 'Settings updated successfully'}), 200
+        # Weekend handling changes the business calendar, and so the schedule of open loans
+        invalidate_business_calendar()
+        rescheduled = 0
+        if SystemSetting.get_setting('weekend_payment_handling', 'next_business_day') != handling:
+            try:
+                rescheduled = reschedule_open_loans()
+                db.session.commit()
+            except Exception:
+                # Put the old calendar back, so saving the setting again retries the reschedule
+                db.session.rollback()
+                SystemSetting.set_setting('weekend_payment_handling', handling, None, current_user.id)
+                invalidate_business_calendar()
+                raise
+        
+        return jsonify({'message': 'Settings updated successfully', 'loans_rescheduled': rescheduled}), 200
         
     except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def reschedule_open_loans():
+    """Rewrite the installments of every active and overdue loan, in one batch"""
+    from loans import Loan
+    from installments import reschedule_loans
+
+    return reschedule_loans(Loan.query.filter(Loan.status.in_(['active', 'overdue'])).all())
+
+def reschedule_around(holiday_date):
+    """
+    Rewrite the installments of active and overdue loans that have
+    installments on or after a changed holiday, in one batch
+    """
+    from loans import Loan
+    from installments import Installment, reschedule_loans
+
+    invalidate_business_calendar()
+    loans = Loan.query.filter(
+        Loan.status.in_(['active', 'overdue']),
+        Loan.start_date <= holiday_date,
+        db.session.query(Installment.id).filter(
+            Installment.loan_id == Loan.id,
+            Installment.due_date >= holiday_date
+        ).exists()
+    ).all()
+    return reschedule_loans(loans)
+
+@admin_bp.route('/holidays', methods=['GET'])
+@login_required
+@admin_required
+def get_holidays():
+    """Get all holidays"""
+    try:
+        query = Holiday.query
+
+        year = request.args.get('year', type=int)
+        if year:
+            query = query.filter(func.strftime('%Y', Holiday.holiday_date) == str(year))
+
+        holidays = query.order_by(Holiday.holiday_date).all()
+        return jsonify({
+            'holidays': [holiday.to_dict() for holiday in holidays]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/holidays', methods=['POST'])
+@login_required
+@admin_required
+def create_holiday():
+    """Add a holiday and reschedule the loans it affects"""
+    try:
+        data = request.get_json()
+
+        if not data.get('holiday_date') or not data.get('name'):
+            return jsonify({'error': 'holiday_date and name are required'}), 400
+
+        holiday_date = datetime.strptime(data['holiday_date'], '%Y-%m-%d').date()
+
+        if Holiday.query.filter_by(holiday_date=holiday_date).first():
+            return jsonify({'error': 'A holiday already exists on this date'}), 400
+
+        holiday = Holiday(
+            holiday_date=holiday_date,
+            name=data['name'],
+            created_by=current_user.id
+        )
+        db.session.add(holiday)
+        db.session.flush()
+
+        rescheduled = reschedule_around(holiday_date)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Holiday created successfully',
+            'holiday': holiday.to_dict(),
+            'loans_rescheduled': rescheduled
+        }), 201
+
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    except Exception as e:
+        db.session.rollback()
+        invalidate_business_calendar()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/holidays/<int:holiday_id>', methods=['DELETE'])
+@login_required
+@admin_required
+def delete_holiday(holiday_id):
+    """Delete a holiday and reschedule the loans it affected"""
+    try:
+        holiday = Holiday.query.get_or_404(holiday_id)
+        holiday_date = holiday.holiday_date
+
+        db.session.delete(holiday)
+        db.session.flush()
+
+        rescheduled = reschedule_around(holiday_date)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Holiday deleted successfully',
+            'loans_rescheduled': rescheduled
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        invalidate_business_calendar()
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,147 @@
+from user import db
+from loans import Loan
+from payments import Payment
+from installments import Installment, backfill_installments
+from sqlalchemy import func
+from datetime import datetime, date
+
+# Aging buckets by days past due of the oldest unpaid installment, largest first
+PAR_BUCKETS = [(60, 'par60'), (30, 'par30'), (7, 'par7'), (1, 'par1')]
+BUCKET_NAMES = ['current', 'par1', 'par7', 'par30', 'par60']
+
+def aging_bucket(days_past_due):
+    """Get the aging bucket for a number of days past due"""
+    for threshold, bucket in PAR_BUCKETS:
+        if days_past_due >= threshold:
+            return bucket
+    return 'current'
+
+def loan_aging_query(as_of):
+    """
+    Query outstanding balance, accrued penalties included, and oldest unpaid installment due date for
+    every active or overdue loan, in a single statement.
+    """
+    oldest_unpaid = db.session.query(
+        Installment.loan_id,
+        func.min(Installment.due_date).label('oldest_due_date')
+    ).filter(
+        Installment.due_date < as_of,
+        Installment.paid_amount < Installment.expected_amount
+    ).group_by(Installment.loan_id).subquery()
+
+    paid_by_loan = db.session.query(
+        Payment.loan_id,
+        func.sum(Payment.actual_amount).label('paid')
+    ).group_by(Payment.loan_id).subquery()
+
+    return db.session.query(
+        Loan.id,
+        Loan.account_officer_id,
+        Loan.total_amount + Loan.penalty_amount - func.coalesce(paid_by_loan.c.paid, 0),
+        oldest_unpaid.c.oldest_due_date
+    ).outerjoin(
+        paid_by_loan, paid_by_loan.c.loan_id == Loan.id
+    ).outerjoin(
+        oldest_unpaid, oldest_unpaid.c.loan_id == Loan.id
+    ).filter(Loan.status.in_(['active', 'overdue']))
+
+def compute_aging_snapshot(as_of=None):
+    """
+    Compute and store the portfolio aging snapshot for a day, replacing any
+    earlier snapshot for that day. Per-loan rows are only kept for the latest
+    snapshot, so an earlier day leaves them alone; per-officer bucket totals
+    are kept as history. A day without open loans stores one empty row, so
+    it counts as computed.
+    """
+    as_of = as_of or date.today()
+    backfill_installments()
+
+    loan_rows = []
+    totals = {}
+    for loan_id, officer_id, outstanding, oldest_due_date in loan_aging_query(as_of):
+        days_past_due = (as_of - oldest_due_date).days if oldest_due_date else 0
+        bucket = aging_bucket(days_past_due)
+        loan_rows.append({
+            'snapshot_date': as_of,
+            'loan_id': loan_id,
+            'account_officer_id': officer_id,
+            'days_past_due': days_past_due,
+            'bucket': bucket,
+            'outstanding_balance': outstanding
+        })
+        loan_count, balance = totals.get((officer_id, bucket), (0, 0))
+        totals[(officer_id, bucket)] = (loan_count + 1, balance + outstanding)
+
+    latest_loans_date = db.session.query(func.max(LoanAgingSnapshot.snapshot_date)).scalar()
+    if latest_loans_date is None or as_of >= latest_loans_date:
+        LoanAgingSnapshot.query.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(LoanAgingSnapshot, loan_rows)
+
+    if not totals:
+        totals[(None, 'current')] = (0, 0)
+    PortfolioAgingSnapshot.query.filter_by(snapshot_date=as_of).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(PortfolioAgingSnapshot, [
+        {
+            'snapshot_date': as_of,
+            'account_officer_id': officer_id,
+            'bucket': bucket,
+            'loan_count': loan_count,
+            'outstanding_balance': balance
+        }
+        for (officer_id, bucket), (loan_count, balance) in totals.items()
+    ])
+    db.session.commit()
+
+    return {'snapshot_date': as_of.isoformat(), 'loans': len(loan_rows)}
+
+def latest_snapshot_date(as_of=None):
+    """Get the date of the latest stored snapshot on or before ``as_of``"""
+    query = db.session.query(func.max(PortfolioAgingSnapshot.snapshot_date))
+    if as_of:
+        query = query.filter(PortfolioAgingSnapshot.snapshot_date <= as_of)
+    return query.scalar()
+
+def par_summary(bucket_totals):
+    """
+    Summarize bucket totals as cumulative PAR ratios: PAR30 is the share of
+    outstanding balance in loans 30 or more days past due.
+    """
+    total = sum(balance for _, balance in bucket_totals.values())
+    summary = {
+        'loan_count': sum(count for count, _ in bucket_totals.values()),
+        'total_outstanding': float(total)
+    }
+    for position, bucket in enumerate(BUCKET_NAMES[1:], start=1):
+        at_risk = sum(bucket_totals.get(name, (0, 0))[1] for name in BUCKET_NAMES[position:])
+        summary[bucket] = {
+            'outstanding': float(at_risk),
+            'ratio': float(at_risk / total * 100) if total > 0 else 0
+        }
+    return summary
+
+
+# Model Definitions
+class LoanAgingSnapshot(db.Model):
+    __tablename__ = 'loan_aging_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False, index=True)
+    account_officer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    days_past_due = db.Column(db.Integer, default=0, nullable=False)
+    bucket = db.Column(db.String(10), nullable=False)
+    outstanding_balance = db.Column(db.Numeric(10, 2), nullable=False)
+
+class PortfolioAgingSnapshot(db.Model):
+    __tablename__ = 'portfolio_aging_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('snapshot_date', 'account_officer_id', 'bucket', name='uq_portfolio_aging_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False, index=True)
+    account_officer_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # None on the row of a day without open loans
+    bucket = db.Column(db.String(10), nullable=False)
+    loan_count = db.Column(db.Integer, default=0, nullable=False)
+    outstanding_balance = db.Column(db.Numeric(12, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,148 @@
+from user import db
+from payments import Payment
+from installments import Installment
+from pricing import to_cents, from_cents
+from datetime import datetime
+
+def outstanding_installments(loan_id):
+    """Installments of a loan not yet paid in full, oldest first (an indexed read)"""
+    return Installment.query.filter(
+        Installment.loan_id == loan_id,
+        Installment.paid_amount < Installment.expected_amount
+    ).order_by(Installment.day)
+
+def oldest_outstanding_day(loan_id):
+    """Day of the oldest installment of a loan not yet paid in full"""
+    installment = outstanding_installments(loan_id).with_entities(Installment.day).first()
+    return installment[0] if installment else None
+
+def apply_payments(payments, installments):
+    """
+    Apply payments, in order, to installments, oldest first. Updates the
+    installments' paid amounts and returns the allocation rows. Amounts are
+    handled in cents; whatever exceeds the installments stays unallocated.
+    """
+    installments = list(installments)
+    due = [to_cents(installment.expected_amount) - to_cents(installment.paid_amount or 0)
+           for installment in installments]
+    paid = [to_cents(installment.paid_amount or 0) for installment in installments]
+
+    rows = []
+    position = 0
+    for payment in payments:
+        remaining = to_cents(payment.actual_amount or 0)
+        while remaining > 0 and position < len(installments):
+            if due[position] <= 0:
+                position += 1
+                continue
+            amount = min(remaining, due[position])
+            rows.append({
+                'payment_id': payment.id,
+                'installment_id': installments[position].id,
+                'loan_id': payment.loan_id,
+                'amount': from_cents(amount)
+            })
+            due[position] -= amount
+            paid[position] += amount
+            remaining -= amount
+
+    for installment, cents in zip(installments, paid):
+        installment.paid_amount = from_cents(cents)
+    return rows
+
+def split_allocations(payments, rows):
+    """
+    Split the rows apply_payments made for several payments back into one
+    list per payment. Rows come in payment order and each payment takes
+    exactly its amount, unless the installments ran out.
+    """
+    split, position = [], 0
+    for payment in payments:
+        remaining = to_cents(payment.actual_amount or 0)
+        taken = []
+        while remaining > 0 and position < len(rows):
+            taken.append(rows[position])
+            remaining -= to_cents(rows[position]['amount'])
+            position += 1
+        split.append(taken)
+    return split
+
+def allocate_payment(payment):
+    """
+    Allocate a new (flushed) payment across its loan's outstanding
+    installments, oldest first, touching only those installments
+    """
+    rows = apply_payments([payment], outstanding_installments(payment.loan_id).all())
+    db.session.bulk_insert_mappings(PaymentAllocation, rows)
+    return rows
+
+def reallocate_loans(loan_ids):
+    """
+    Replay every payment of the given loans over their installments, oldest
+    payment first. Used when a payment is edited or deleted, or when
+    installments are rewritten, as that can shift every later allocation.
+    """
+    loan_ids = list(loan_ids)
+    if not loan_ids:
+        return 0
+
+    PaymentAllocation.query.filter(PaymentAllocation.loan_id.in_(loan_ids)).delete(synchronize_session=False)
+
+    installments = {}
+    for installment in Installment.query.filter(Installment.loan_id.in_(loan_ids)).order_by(
+            Installment.loan_id, Installment.day).execution_options(populate_existing=True):
+        installment.paid_amount = 0
+        installments.setdefault(installment.loan_id, []).append(installment)
+
+    payments = {}
+    for payment in Payment.query.filter(Payment.loan_id.in_(loan_ids)).order_by(
+            Payment.loan_id, Payment.payment_date, Payment.id):
+        payments.setdefault(payment.loan_id, []).append(payment)
+
+    rows = []
+    for loan_id in loan_ids:
+        rows += apply_payments(payments.get(loan_id, []), installments.get(loan_id, []))
+    db.session.bulk_insert_mappings(PaymentAllocation, rows)
+    return len(loan_ids)
+
+def unallocated_loan_ids():
+    """
+    Loans with a payment that has no allocations although installments are
+    outstanding, e.g. payments recorded before allocations were kept
+    """
+    return [loan_id for (loan_id,) in db.session.query(Payment.loan_id).filter(
+        Payment.actual_amount > 0,
+        ~db.session.query(PaymentAllocation.id).filter(PaymentAllocation.payment_id == Payment.id).exists(),
+        db.session.query(Installment.id).filter(
+            Installment.loan_id == Payment.loan_id,
+            Installment.paid_amount < Installment.expected_amount
+        ).exists()
+    ).distinct()]
+
+def payment_allocations(payment_id):
+    """Allocations of a payment with the installment days they cover"""
+    return [
+        {'day': day, 'due_date': due_date.isoformat(), 'amount': float(amount)}
+        for day, due_date, amount in db.session.query(
+            Installment.day, Installment.due_date, PaymentAllocation.amount
+        ).join(Installment, PaymentAllocation.installment_id == Installment.id).filter(
+            PaymentAllocation.payment_id == payment_id
+        ).order_by(Installment.day)
+    ]
+
+
+# Model Definition
+class PaymentAllocation(db.Model):
+    __tablename__ = 'payment_allocations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=False, index=True)
+    installment_id = db.Column(db.Integer, db.ForeignKey('installments.id'), nullable=False, index=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False, index=True)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    loan = db.relationship('Loan', backref=db.backref('allocations', lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<PaymentAllocation Payment {self.payment_id} - Installment {self.installment_id} - {self.amount}>'
@@ -0,0 +1,264 @@
+"""
+Parquet snapshot of loans, payments, borrowers (non-PII columns) and
+installments for offline analysis, laid out as
+<folder>/<table>/month=YYYY-MM/part.parquet.
+
+Each table keeps a manifest of per-partition fingerprints (row count, last
+update, id checksum) so incremental runs only rewrite changed partitions.
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from user import db
+from borrowers import Borrower
+from loans import Loan
+from payments import Payment
+from installments import Installment, backfill_installments
+from archive import ARCHIVES, archive_of
+
+# Borrower columns that do not identify a person
+BORROWER_COLUMNS = [
+    'id', 'created_by', 'created_at', 'updated_at', 'city', 'state', 'country',
+    'marital_status', 'employment_type', 'business_type', 'monthly_income',
+    'annual_revenue', 'bank_name', 'account_type'
+]
+
+def month_of(column):
+    """SQL expression for the YYYY-MM partition of a date column"""
+    return func.strftime('%Y-%m', column)
+
+def arrow_type(column):
+    """Map a SQLAlchemy column to its Arrow type"""
+    import pyarrow as pa  # Imported here: only the snapshot export needs pyarrow, and it is slow to import
+
+    column_type = column.type
+    if isinstance(column_type, db.Numeric):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, db.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, db.Date):
+        return pa.date32()
+    if isinstance(column_type, db.Boolean):
+        return pa.bool_()
+    if isinstance(column_type, db.Integer):
+        return pa.int64()
+    return pa.string()
+
+def merged_fingerprints(queries):
+    """
+    Run grouped (partition, count, last update, checksum) queries over the
+    hot table and its archive and combine them per partition, so moving rows
+    to the archive leaves a partition's fingerprint unchanged
+    """
+    merged = {}
+    for query in queries:
+        for partition, count, last_update, checksum in db.session.execute(query):
+            total = merged.setdefault(partition, [0, None, 0])
+            total[0] += count
+            total[2] += int(checksum or 0)
+            if last_update is not None and (total[1] is None or last_update > total[1]):
+                total[1] = last_update
+    return {partition: [count, str(last_update), checksum] for partition, (count, last_update, checksum) in merged.items()}
+
+class SnapshotTable:
+    """
+    One exported table: its columns, partition column and source table.
+    Tables with an archive (loans, payments) are read from both, so
+    archiving does not drop rows from the snapshot.
+    """
+
+    def __init__(self, name, columns, partition_column, source):
+        self.name = name
+        self.columns = columns
+        self.partition_column = partition_column
+        self.source = source
+
+    @property
+    def schema(self):
+        import pyarrow as pa
+        return pa.schema([(column.name, arrow_type(column)) for column in self.columns])
+
+    def sources(self):
+        """(columns, partition column, table) of the source table and of its archive, if any"""
+        sources = [(self.columns, self.partition_column, self.source)]
+        if self.source.name in ARCHIVES:
+            archive = ARCHIVES[self.source.name][1]
+            sources.append(([archive.c[column.name] for column in self.columns],
+                            archive.c[self.partition_column.name], archive))
+        return sources
+
+    def fingerprint_queries(self):
+        """Groups of fingerprint queries; each group's results are merged into one entry per partition"""
+        return [[self.base_fingerprint(columns, partition_column, source)
+                 for columns, partition_column, source in self.sources()]]
+
+    def fingerprints(self):
+        """Get a fingerprint per partition month in one grouped query per source"""
+        fingerprints = {}
+        for queries in self.fingerprint_queries():
+            for partition, fingerprint in merged_fingerprints(queries).items():
+                fingerprints.setdefault(partition, []).append(fingerprint)
+        return fingerprints
+
+    def base_fingerprint(self, columns, partition_column, source):
+        month = month_of(partition_column)
+        id_column = columns[0]
+        updated_at = source.c.get('updated_at', id_column)
+        return select(
+            month, func.count(), func.max(updated_at), func.sum(id_column)
+        ).select_from(source).group_by(month)
+
+    def read_partition(self, partition):
+        """Read the rows of one partition into an Arrow table"""
+        import pyarrow as pa
+
+        rows = []
+        for columns, partition_column, source in self.sources():
+            rows += db.session.execute(select(*columns).select_from(source).where(
+                month_of(partition_column) == partition
+            )).all()
+        rows.sort(key=lambda row: row[0])
+        data = {column.name: [row[i] for row in rows] for i, column in enumerate(self.columns)}
+        return pa.Table.from_pydict(data, schema=self.schema)
+
+def loan_tables():
+    """The (loans, payments, installments) tables of the hot book and of the archive"""
+    models = (Loan, Payment, Installment)
+    return [tuple(model.__table__ for model in models), tuple(archive_of(model) for model in models)]
+
+class InstallmentsSnapshotTable(SnapshotTable):
+    """Installments with the amount paid against each.
+
+    Installments are partitioned by the month their loan started, so a
+    partition only changes when one of its loans or their payments does.
+    """
+
+    def __init__(self):
+        loans = Loan.__table__
+        super().__init__('installments', [loans.c.id], loans.c.start_date, loans)
+
+    def fingerprint_queries(self):
+        """Loans by start month, then their payments by the loan's start month"""
+        return super().fingerprint_queries() + [[
+            select(
+                month_of(loans.c.start_date), func.count(payments.c.id), func.max(payments.c.updated_at),
+                func.sum(payments.c.id)
+            ).select_from(payments.join(loans, payments.c.loan_id == loans.c.id)).group_by(month_of(loans.c.start_date))
+            for loans, payments, _ in loan_tables()
+        ]]
+
+    @property
+    def schema(self):
+        import pyarrow as pa
+        return pa.schema([
+            ('loan_id', pa.int64()),
+            ('day', pa.int64()),
+            ('due_date', pa.date32()),
+            ('expected_amount', pa.decimal128(10, 2)),
+            ('paid_amount', pa.decimal128(10, 2))
+        ])
+
+    def read_partition(self, partition):
+        import pyarrow as pa
+
+        rows = []
+        for loans, _, installments in loan_tables():
+            rows += db.session.execute(select(
+                installments.c.loan_id,
+                installments.c.day,
+                installments.c.due_date,
+                installments.c.expected_amount,
+                installments.c.paid_amount
+            ).join_from(installments, loans, installments.c.loan_id == loans.c.id).where(
+                month_of(loans.c.start_date) == partition
+            )).all()
+        rows.sort(key=lambda row: (row[0], row[1]))
+        data = {name: [row[i] for row in rows] for i, name in enumerate(self.schema.names)}
+        return pa.Table.from_pydict(data, schema=self.schema)
+
+def snapshot_tables():
+    """All tables written to the analytics snapshot"""
+    loans, payments, borrowers = Loan.__table__, Payment.__table__, Borrower.__table__
+    return [
+        SnapshotTable('loans', list(loans.columns), loans.c.start_date, loans),
+        SnapshotTable('payments', list(payments.columns), payments.c.payment_date, payments),
+        SnapshotTable('borrowers', [borrowers.c[name] for name in BORROWER_COLUMNS], borrowers.c.created_at, borrowers),
+        InstallmentsSnapshotTable()
+    ]
+
+def get_analytics_folder(app=None):
+    """Get the folder the analytics snapshot is written to"""
+    app = app or current_app
+    return app.config.get('ANALYTICS_FOLDER') or os.path.join(app.instance_path, 'analytics')
+
+def export_table(table, folder, full=False):
+    """Write the new or changed partitions of one table"""
+    import pyarrow.parquet as pq
+
+    table_folder = os.path.join(folder, table.name)
+    manifest_path = os.path.join(table_folder, '_manifest.json')  # '_' keeps it out of dataset reads
+    os.makedirs(table_folder, exist_ok=True)
+
+    manifest = {}
+    if not full and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    fingerprints = table.fingerprints()
+    fingerprints.pop(None, None)  # Rows without a partition date
+    written = []
+    for partition, fingerprint in sorted(fingerprints.items()):
+        if manifest.get(partition) == fingerprint:
+            continue
+        partition_folder = os.path.join(table_folder, f'month={partition}')
+        os.makedirs(partition_folder, exist_ok=True)
+        path = os.path.join(partition_folder, 'part.parquet')
+        pq.write_table(table.read_partition(partition), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        written.append(partition)
+
+    # Partitions whose rows have all been deleted
+    removed = [partition for partition in manifest if partition not in fingerprints]
+    for partition in removed:
+        path = os.path.join(table_folder, f'month={partition}', 'part.parquet')
+        if os.path.exists(path):
+            os.remove(path)
+
+    with open(manifest_path, 'w') as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+
+    return {'written': written, 'removed': removed, 'partitions': len(fingerprints)}
+
+def export_analytics_snapshot(folder=None, full=False):
+    """
+    Export the analytics snapshot. Only new or changed partitions are
+    written unless ``full`` is set.
+    """
+    folder = folder or get_analytics_folder()
+    started = datetime.utcnow()
+    backfill_installments()
+    results = {table.name: export_table(table, folder, full) for table in snapshot_tables()}
+    db.session.rollback()  # Release the read transaction
+
+    return {
+        'folder': folder,
+        'started_at': started.isoformat(),
+        'completed_at': datetime.utcnow().isoformat(),
+        'tables': results
+    }
+
+if __name__ == '__main__':
+    # Usage: python analytics.py [folder] [--full]
+    from main import app
+
+    folders = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    with app.app_context():
+        print(json.dumps(export_analytics_snapshot(
+            folders[0] if folders else None,
+            full='--full' in sys.argv
+        ), indent=2))
@@ -0,0 +1,134 @@
+from user import db
+from loans import Loan
+from payments import Payment
+from installments import Installment
+from allocations import PaymentAllocation
+from penalties import PenaltyAccrual
+from settings import SystemSetting
+from changes import record_changes
+from events import resync_on_commit
+import audit
+from cache import mark_stale
+from sqlalchemy import select, insert, delete, union_all, literal
+from dateutil.relativedelta import relativedelta
+from datetime import datetime, date
+
+# Loans moved per transaction
+ARCHIVE_CHUNK_SIZE = 200
+
+def archive_table(table):
+    """
+    Cold copy of a hot table: the same columns and ids, no foreign keys
+    (the rows they point to may be archived or deleted later) and an
+    archived_at stamp. Former foreign key columns stay indexed.
+    """
+    columns = [
+        db.Column(column.name, column.type.copy(), primary_key=column.primary_key, nullable=column.nullable,
+                  autoincrement=False, index=bool(column.foreign_keys) and not column.primary_key)
+        for column in table.columns
+    ]
+    return db.Table(f'archived_{table.name}', *columns, db.Column('archived_at', db.DateTime, nullable=False))
+
+# Hot tables and their archives, parents first
+ARCHIVES = {
+    table.name: (table, archive_table(table))
+    for table in (Loan.__table__, Installment.__table__, Payment.__table__,
+                  PaymentAllocation.__table__, PenaltyAccrual.__table__)
+}
+
+def archive_cutoff(months=None, today=None):
+    """Loans completed before this date are archived"""
+    if months is None:
+        months = int(SystemSetting.get_setting('archive_after_months', '12'))
+    return (today or date.today()) - relativedelta(months=months)
+
+def archivable_loans_query(cutoff):
+    """Ids of the loans completed before ``cutoff``"""
+    return Loan.query.filter(Loan.status == 'completed', Loan.actual_end_date < cutoff) \
+        .with_entities(Loan.id).order_by(Loan.id)
+
+def archive_loans(loan_ids):
+    """
+    Move loans with their installments, payments, allocations and penalty
+    accruals to the archive tables in one transaction. Rows keep their ids,
+    so references from snapshots, reminders and statement lines still
+    resolve against the archive. Returns the number of payments moved.
+    """
+    loan_ids = list(loan_ids)
+    payment_ids = db.session.scalars(select(Payment.id).where(Payment.loan_id.in_(loan_ids))).all()
+
+    # Downstream consumers see the move as deletes; the outbox rows need the hot rows
+    record_changes(Loan, loan_ids, 'delete')
+    record_changes(Payment, payment_ids, 'delete')
+    for model, ids in ((Loan, loan_ids), (Payment, payment_ids)):
+        audit.record(model, {
+            row.id: {name: (value, None) for name, value in row._mapping.items() if value is not None}
+            for row in db.session.execute(select(model.__table__).where(model.__table__.c.id.in_(ids)))
+        }, 'delete')
+    resync_on_commit(db.session, db.session.scalars(
+        select(Loan.account_officer_id).where(Loan.id.in_(loan_ids)).distinct()).all())
+
+    archived_at = datetime.utcnow()
+    for table, archive in ARCHIVES.values():
+        key = table.c.id if table is Loan.__table__ else table.c.loan_id
+        names = [column.name for column in table.columns]
+        db.session.execute(insert(archive).from_select(
+            names + ['archived_at'],
+            select(*table.columns, literal(archived_at)).where(key.in_(loan_ids))
+        ))
+    for table, _ in reversed(ARCHIVES.values()):
+        key = table.c.id if table is Loan.__table__ else table.c.loan_id
+        db.session.execute(delete(table).where(key.in_(loan_ids)))
+
+    # The moves bypass the session events, so borrowers' running risk aggregates keep their history
+    mark_stale(db.session, Loan, Payment)
+    db.session.commit()
+    return len(payment_ids)
+
+def archive_completed_loans(months=None, dry_run=False):
+    """
+    Move loans completed more than ``months`` months ago (the
+    archive_after_months setting by default) to the archive, committing
+    every ARCHIVE_CHUNK_SIZE loans so no transaction holds the tables for long.
+    """
+    cutoff = archive_cutoff(months)
+    loan_ids = [loan_id for (loan_id,) in archivable_loans_query(cutoff)]
+    result = {'cutoff': cutoff.isoformat(), 'loans': len(loan_ids), 'payments': 0}
+    if dry_run:
+        result['payments'] = Payment.query.filter(Payment.loan_id.in_(loan_ids)).count() if loan_ids else 0
+        return result
+
+    for position in range(0, len(loan_ids), ARCHIVE_CHUNK_SIZE):
+        result['payments'] += archive_loans(loan_ids[position:position + ARCHIVE_CHUNK_SIZE])
+    return result
+
+def archive_of(model):
+    """The archive table of a hot model"""
+    return ARCHIVES[model.__tablename__][1]
+
+def paginate_with_archive(hot, cold, model, page, per_page, *order_by):
+    """
+    Paginate the union of a hot query on ``model`` and the same query on its
+    archive. Rows carry the model's columns and an ``archived`` flag;
+    ``order_by`` names columns, with a leading '-' for descending.
+    """
+    names = [column.name for column in model.__table__.columns]
+    archived_model = ARCHIVED_MODELS[model]
+    combined = union_all(
+        hot.with_entities(*[getattr(model, name) for name in names], literal(False).label('archived')).statement,
+        cold.with_entities(*[getattr(archived_model, name) for name in names], literal(True).label('archived')).statement
+    ).subquery()
+    ordering = [combined.c[name[1:]].desc() if name.startswith('-') else combined.c[name] for name in order_by]
+    return db.session.query(combined).order_by(*ordering).paginate(page=page, per_page=per_page)
+
+
+# Model Definition
+class ArchivedLoan(db.Model):
+    """A loan moved out of the hot tables; read only"""
+    __table__ = ARCHIVES['loans'][1]
+
+class ArchivedPayment(db.Model):
+    """A payment of an archived loan; read only"""
+    __table__ = ARCHIVES['payments'][1]
+
+ARCHIVED_MODELS = {Loan: ArchivedLoan, Payment: ArchivedPayment}
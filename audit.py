@@ -0,0 +1,281 @@
+from flask import Blueprint, request, jsonify, current_app, has_request_context
+from flask_login import login_required, current_user
+from user import db, User
+from auth import admin_required
+from borrowers import Borrower
+from loans import Loan
+from payments import Payment
+from settings import SystemSetting
+from changes import to_json_value
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+audit_bp = Blueprint('audit', __name__)
+
+# Models whose writes are audited
+AUDITED_MODELS = (Borrower, Loan, Payment, User, SystemSetting)
+
+# Columns never written to the audit log, and columns that change on every write
+REDACTED_COLUMNS = {'password_hash'}
+IGNORED_COLUMNS = {'updated_at'}
+
+# Entries held in memory; when the writer falls this far behind, commits write their own entries
+AUDIT_QUEUE_SIZE = 10000
+
+# Entries per INSERT, and the longest an entry waits for its batch to fill
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 1.0
+
+def column_diff(instance, operation):
+    """Before and after values of the audited columns a flush wrote, as {column: [before, after]}"""
+    state = inspect(instance)
+    diff = {}
+    for column in state.mapper.column_attrs:
+        key = column.key
+        if key in IGNORED_COLUMNS:
+            continue
+        if operation == 'insert':
+            before, after = None, state.dict.get(key)
+        elif operation == 'delete':
+            if key not in state.dict:
+                continue
+            before, after = state.dict[key], None
+        else:
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            before = history.deleted[0] if history.deleted else None
+            after = history.added[0] if history.added else None
+        if before is None and after is None:
+            continue
+        if key in REDACTED_COLUMNS:
+            before, after = before and '***', after and '***'
+        diff[key] = [to_json_value(before), to_json_value(after)]
+    return diff
+
+def audit_entry(instance, operation):
+    """Audit log row for a flushed write, or None when nothing audited changed"""
+    diff = column_diff(instance, operation)
+    if not diff and operation == 'update':
+        return None
+    return {
+        'entity': instance.__tablename__,
+        'entity_id': instance.id,
+        'operation': operation,
+        'changes': json.dumps(diff),
+        'created_at': datetime.utcnow()
+    }
+
+def request_origin():
+    """Id of the logged in user and the request making a change, where there is one"""
+    if not has_request_context():
+        return None, None
+    user_id = current_user.id if current_user.is_authenticated else None
+    return user_id, f'{request.method} {request.path}'
+
+@event.listens_for(Session, 'after_flush')
+def _collect_audit(session, flush_context):
+    """
+    Diff the flushed writes, held until the transaction commits. Who made
+    them is read here: after the commit the session can no longer load the user.
+    """
+    entries = [audit_entry(instance, 'insert') for instance in session.new if isinstance(instance, AUDITED_MODELS)]
+    entries += [
+        audit_entry(instance, 'update') for instance in session.dirty
+        if isinstance(instance, AUDITED_MODELS) and session.is_modified(instance, include_collections=False)
+    ]
+    entries += [audit_entry(instance, 'delete') for instance in session.deleted if isinstance(instance, AUDITED_MODELS)]
+    entries = [entry for entry in entries if entry]
+    if not entries:
+        return
+    user_id, source = request_origin()
+    for entry in entries:
+        entry['user_id'], entry['source'] = user_id, source
+    session.info.setdefault('pending_audit', []).extend(entries)
+
+def record(model, changes, operation='update'):
+    """
+    Audit rows written by a bulk UPDATE or DELETE, which bypass the session
+    events. ``changes`` maps each affected id to its {column: (before, after)}.
+    Call it in the same transaction; the entries are submitted when it commits.
+    """
+    user_id, source = request_origin()
+    created_at = datetime.utcnow()
+    entries = []
+    for entity_id, diff in changes.items():
+        diff = {
+            column: [before and '***', after and '***'] if column in REDACTED_COLUMNS
+            else [to_json_value(before), to_json_value(after)]
+            for column, (before, after) in diff.items() if column not in IGNORED_COLUMNS
+        }
+        if not diff and operation == 'update':
+            continue
+        entries.append({
+            'entity': model.__tablename__,
+            'entity_id': entity_id,
+            'operation': operation,
+            'changes': json.dumps(diff),
+            'user_id': user_id,
+            'source': source,
+            'created_at': created_at
+        })
+    db.session.info.setdefault('pending_audit', []).extend(entries)
+    return len(entries)
+
+@event.listens_for(Session, 'after_commit')
+def _submit_audit(session):
+    """Hand the committed transaction's entries to the writer"""
+    entries = session.info.pop('pending_audit', None)
+    if entries:
+        audit_writer.submit(current_app._get_current_object(), entries)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_audit(session):
+    """Nothing was written"""
+    session.info.pop('pending_audit', None)
+
+def write_entries(entries):
+    """Append entries to the audit log in one INSERT on a connection of its own"""
+    with db.engine.begin() as connection:
+        connection.execute(insert(AuditLog.__table__), entries)
+
+class AuditWriter:
+    """
+    Background writer for audit entries. Commits only enqueue their entries;
+    a daemon thread writes them in batches. The queue is bounded: when it is
+    full, or AUDIT_ASYNC is off, entries are written synchronously instead.
+    The thread is started on first use in each process, so forked workers
+    get their own.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, entries):
+        if not app.config.get('AUDIT_ASYNC', True):
+            write_entries(entries)
+            return
+        self._ensure_started(app)
+        for position, entry in enumerate(entries):
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                write_entries(entries[position:])
+                return
+
+    def _ensure_started(self, app):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # A forked worker does not inherit the writer thread, nor a usable queue
+                self.queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(app,), name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Block for an entry, then take more until the batch is full or AUDIT_FLUSH_SECONDS pass"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + AUDIT_FLUSH_SECONDS
+        while len(batch) < AUDIT_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, app):
+        while True:
+            batch = self._next_batch()
+            try:
+                with app.app_context():
+                    write_entries(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} audit entries: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self, timeout=5):
+        """Wait up to ``timeout`` seconds for queued entries to be written"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.queue.unfinished_tasks
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.flush)
+
+@audit_bp.route('/', methods=['GET'])
+@login_required
+@admin_required
+def get_audit_log():
+    """
+    Get audit entries, newest first, optionally for one ?entity= (table
+    name) and ?entity_id=, or one ?user_id=
+    """
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 500)
+
+        query = AuditLog.query
+        if request.args.get('entity'):
+            query = query.filter(AuditLog.entity == request.args['entity'])
+        if request.args.get('entity_id'):
+            query = query.filter(AuditLog.entity_id == request.args.get('entity_id', type=int))
+        if request.args.get('user_id'):
+            query = query.filter(AuditLog.user_id == request.args.get('user_id', type=int))
+
+        entries = query.order_by(AuditLog.id.desc()).paginate(page=page, per_page=per_page)
+        return jsonify({
+            'entries': [entry.to_dict() for entry in entries.items],
+            'total_pages': entries.pages,
+            'current_page': entries.page,
+            'total_items': entries.total
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Model Definition
+class AuditLog(db.Model):
+    """Append-only: rows are only ever inserted, by the audit writer"""
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_log_entity', 'entity', 'entity_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.Enum('insert', 'update', 'delete', name='audit_operation'), nullable=False)
+    changes = db.Column(db.Text, nullable=False)  # JSON encoded {column: [before, after]}
+    user_id = db.Column(db.Integer, index=True)  # No foreign key, entries outlive deleted users
+    source = db.Column(db.String(255))  # Request method and path
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'operation': self.operation,
+            'changes': json.loads(self.changes),
+            'user_id': self.user_id,
+            'source': self.source,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<AuditLog {self.id} {self.operation} {self.entity} {self.entity_id}>'
@@ -1,4 +1,5 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
+from flask_login import login_required, current_user
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, date, timedelta
 
@@ -6,6 +7,15 @@ from user import db, User
 from loans import Loan
 from payments import Payment
 from settings import SystemSetting
+from auth import admin_required
+from jobs import enqueue_job, job_handler
+from analytics import export_analytics_snapshot
+from aging import compute_aging_snapshot
+from penalties import accrue_penalties
+from changes import compact_changes
+from reminders import generate_reminders, drain_outbox
+from collections_sheet import precompute_collection_sheets
+from archive import archive_completed_loans
 
 automation_bp = Blueprint('automation', __name__)
 
@@ -14,31 +24,132 @@ def update_loan_statuses():
     Job to automatically update loan statuses from 'active' to 'overdue'
     if the expected end date has passed.
     """
-    with db.app.app_context():
-        try:
-            today = date.today()
+    try:
+        today = date.today()
 
-            # Get active loans where the expected end date is in the past
-            overdue_loans = Loan.query.filter(
-                Loan.status == 'active',
-                Loan.expected_end_date < today
-            ).all()
-            
-            for loan in overdue_loans:
-                loan.status = 'overdue'
-                loan.updated_at = datetime.utcnow()
+        # Get active loans where the expected end date is in the past
+        overdue_loans = Loan.query.filter(
+            Loan.status == 'active',
+            Loan.expected_end_date < today
+        ).all()
+        
+        for loan in overdue_loans:
+            loan.status = 'overdue'
+            loan.updated_at = datetime.utcnow()
+        
+        if overdue_loans:
+            db.session.commit()
+            print(f"Successfully updated {len(overdue_loans)} loans to 'overdue'.")
+        else:
+            print("No active loans to mark as overdue.")
             
-            if overdue_loans:
-                db.session.commit()
-                print(f"Successfully updated {len(overdue_loans)} loans to 'overdue'.")
-            else:
-                print("No active loans to mark as overdue.")
-                
-        except Exception as e:
-            db.session.rollback()
-            print(f"Error in update_loan_statuses job: {e}")
-
-def setup_scheduler():
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in update_loan_statuses job: {e}")
+
+def accrue_daily_penalties():
+    """
+    Job to accrue today's late penalties on overdue installments.
+    """
+    try:
+        result = accrue_penalties()
+        print(f"Accrued {result['total_penalty']:.2f} in penalties on {result['loans']} loans.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in accrue_daily_penalties job: {e}")
+
+def refresh_collection_sheets():
+    """
+    Job to precompute today's collection sheet for every officer.
+    """
+    try:
+        officers = precompute_collection_sheets()
+        print(f"Collection sheets built for {officers} officers.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in refresh_collection_sheets job: {e}")
+
+def compact_change_feed():
+    """
+    Job to compact change feed history older than the retention period.
+    """
+    try:
+        removed = compact_changes()
+        print(f"Change feed compacted, {removed} events removed.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in compact_change_feed job: {e}")
+
+def archive_old_loans():
+    """
+    Job to move long completed loans and their payments to the archive.
+    """
+    try:
+        result = archive_completed_loans()
+        print(f"Archived {result['loans']} loans and {result['payments']} payments completed before {result['cutoff']}.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in archive_old_loans job: {e}")
+
+def queue_daily_reminders():
+    """
+    Job to queue reminders for installments due on the next business day and missed ones.
+    """
+    try:
+        result = generate_reminders()
+        print(f"Queued {result['queued']} reminders ({result['due']} due, {result['missed']} missed).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in queue_daily_reminders job: {e}")
+
+def send_queued_reminders():
+    """
+    Job to send queued reminders within the rate limit.
+    """
+    try:
+        result = drain_outbox()
+        if any(result.values()):
+            print(f"Reminders: {result['sent']} sent, {result['retrying']} retrying, {result['failed']} failed.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in send_queued_reminders job: {e}")
+
+def refresh_analytics_snapshot():
+    """
+    Job to append new and changed partitions to the analytics snapshot.
+    """
+    try:
+        result = export_analytics_snapshot()
+        written = sum(len(table['written']) for table in result['tables'].values())
+        print(f"Analytics snapshot refreshed, {written} partitions written.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in refresh_analytics_snapshot job: {e}")
+
+def refresh_portfolio_aging():
+    """
+    Job to store today's portfolio-at-risk aging snapshot.
+    """
+    try:
+        result = compute_aging_snapshot()
+        print(f"Portfolio aging snapshot stored for {result['loans']} loans.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in refresh_portfolio_aging job: {e}")
+
+@job_handler('analytics_snapshot')
+def run_analytics_snapshot_job(job, output_folder):
+    """Background job for an on-demand analytics snapshot"""
+    export_analytics_snapshot(full=job.get_params().get('full', False))
+
+def in_app_context(app, job):
+    """Wrap a scheduled job so it runs inside an application context"""
+    def run():
+        with app.app_context():
+            job()
+    return run
+
+def setup_scheduler(app):
     """
     Initializes and starts the background scheduler.
     """
@@ -46,7 +157,7 @@ def setup_scheduler():
     
     # Schedule the job to run once every day at midnight
     scheduler.add_job(
-        update_loan_statuses,
+        in_app_context(app, update_loan_statuses),
         'cron',
         hour=0,
         minute=5,
@@ -54,6 +165,82 @@ def setup_scheduler():
         replace_existing=True
     )
     
+    scheduler.add_job(
+        in_app_context(app, accrue_daily_penalties),
+        'cron',
+        hour=0,
+        minute=10,
+        id='accrue_daily_penalties_job',
+        replace_existing=True
+    )
+    
+    # Aging runs after the status update so it sees today's overdue loans
+    scheduler.add_job(
+        in_app_context(app, refresh_portfolio_aging),
+        'cron',
+        hour=0,
+        minute=15,
+        id='refresh_portfolio_aging_job',
+        replace_existing=True
+    )
+    
+    # Sheets are built once statuses and penalties are up to date
+    scheduler.add_job(
+        in_app_context(app, refresh_collection_sheets),
+        'cron',
+        hour=0,
+        minute=20,
+        id='refresh_collection_sheets_job',
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        in_app_context(app, refresh_analytics_snapshot),
+        'cron',
+        hour=1,
+        minute=0,
+        id='refresh_analytics_snapshot_job',
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        in_app_context(app, compact_change_feed),
+        'cron',
+        hour=2,
+        minute=0,
+        id='compact_change_feed_job',
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        in_app_context(app, archive_old_loans),
+        'cron',
+        hour=2,
+        minute=30,
+        id='archive_old_loans_job',
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        in_app_context(app, queue_daily_reminders),
+        'cron',
+        hour=8,
+        minute=0,
+        id='queue_daily_reminders_job',
+        replace_existing=True
+    )
+    
+    # One drain at a time; a drain that overruns just delays the next
+    scheduler.add_job(
+        in_app_context(app, send_queued_reminders),
+        'interval',
+        minutes=1,
+        max_instances=1,
+        coalesce=True,
+        id='send_queued_reminders_job',
+        replace_existing=True
+    )
+    
     try:
         scheduler.start()
         print("Scheduler started successfully.")
@@ -73,8 +260,90 @@ def trigger_overdue_check():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Initialize the scheduler when the app starts
-# This should be called from the main app factory if using one,
-# or directly in the main script.
-# For this example, we'll assume it's called from main.py.
-# setup_scheduler()
+@automation_bp.route('/analytics-snapshot', methods=['POST'])
+@login_required
+@admin_required
+def trigger_analytics_snapshot():
+    """
+    Starts an on-demand analytics snapshot in the background.
+    Pass ?full=1 to rewrite every partition.
+    """
+    try:
+        full = request.args.get('full') == '1'
+        job = enqueue_job('analytics_snapshot', {'full': full}, current_user.id)
+        return jsonify({
+            'message': 'Analytics snapshot started',
+            'job': job.to_dict(),
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@automation_bp.route('/risk-scores/recompute', methods=['POST'])
+@login_required
+@admin_required
+def trigger_risk_score_recompute():
+    """
+    Starts a full rebuild of every borrower's risk score in the background.
+    """
+    try:
+        job = enqueue_job('risk_score_recompute', {}, current_user.id)
+        return jsonify({
+            'message': 'Risk score recompute started',
+            'job': job.to_dict(),
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@automation_bp.route('/penalties/accrue', methods=['POST'])
+@login_required
+@admin_required
+def trigger_penalty_accrual():
+    """
+    Accrues late penalties for a date (?date=YYYY-MM-DD, default today).
+    Pass ?dry_run=1 to preview the accruals without writing them.
+    """
+    try:
+        as_of = None
+        if request.args.get('date'):
+            try:
+                as_of = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+            if as_of > date.today():
+                return jsonify({'error': 'Penalties cannot be accrued for a future date'}), 400
+
+        dry_run = request.args.get('dry_run') == '1'
+        result = accrue_penalties(as_of=as_of, dry_run=dry_run)
+        return jsonify({
+            'message': 'Penalty accrual preview' if dry_run else 'Penalties accrued',
+            'accrual': result
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@automation_bp.route('/archive', methods=['POST'])
+@login_required
+@admin_required
+def trigger_archive():
+    """
+    Archives loans completed more than ?months= months ago (default the
+    archive_after_months setting) with their payments.
+    Pass ?dry_run=1 to count what would move.
+    """
+    try:
+        months = request.args.get('months', type=int)
+        if months is not None and months < 0:
+            return jsonify({'error': 'months cannot be negative'}), 400
+
+        dry_run = request.args.get('dry_run') == '1'
+        result = archive_completed_loans(months=months, dry_run=dry_run)
+        return jsonify({
+            'message': 'Archive preview' if dry_run else 'Completed loans archived',
+            'archive': result
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
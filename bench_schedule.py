@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch payment schedule generation against the per-loan loop
+
+Usage: python bench_schedule.py [number_of_loans]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import random
+import time
+from datetime import date, timedelta
+
+from schedules import schedule_arrays
+
+def legacy_schedule(start_date, duration, daily_repayment):
+    """The day-by-day loop Loan.get_payment_schedule used to run"""
+    schedule = []
+    current_date = start_date
+
+    for day in range(1, duration + 1):
+        # Skip weekends by moving to next business day
+        while current_date.weekday() >= 5:  # Saturday=5, Sunday=6
+            current_date += timedelta(days=1)
+
+        schedule.append({
+            'day': day,
+            'date': current_date,
+            'expected_amount': float(daily_repayment)
+        })
+
+        current_date += timedelta(days=1)
+
+    return schedule
+
+def make_loans(count):
+    """Random loans over two years of start dates and 10-90 day durations"""
+    random.seed(42)
+    first_day = date(2024, 1, 1)
+    return [
+        (
+            loan_id,
+            first_day + timedelta(days=random.randrange(730)),
+            random.randrange(10, 91),
+            round(random.uniform(500, 50000), 2)
+        )
+        for loan_id in range(1, count + 1)
+    ]
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    loans = make_loans(count)
+
+    started = time.perf_counter()
+    legacy = [legacy_schedule(start, duration, amount) for _, start, duration, amount in loans]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    loan_ids, starts, durations, amounts = zip(*loans)
+    batch = schedule_arrays(loan_ids, starts, durations, amounts)
+    batch_seconds = time.perf_counter() - started
+
+    # Both must produce the same due dates
+    legacy_dates = [installment['date'] for schedule in legacy for installment in schedule]
+    assert legacy_dates == batch.date.astype(object).tolist(), "schedules differ"
+
+    print(f"Loans:         {count}")
+    print(f"Installments:  {len(batch)}")
+    print(f"Per-loan loop: {legacy_seconds * 1000:.1f} ms")
+    print(f"Batch:         {batch_seconds * 1000:.1f} ms")
+    print(f"Speedup:       {legacy_seconds / batch_seconds:.1f}x")
+
+if __name__ == '__main__':
+    main()
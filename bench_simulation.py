@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Monte Carlo loss simulation on a synthetic book
+
+Usage: python bench_simulation.py [number_of_loans] [scenarios] [workers]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import time
+
+import numpy as np
+
+from simulation import estimate_probabilities, simulate_losses_parallel, loss_summary
+
+def make_book(count, officers=20, purposes=12):
+    """Random loans with 0-60 installments of history and a few bad payers"""
+    rng = np.random.default_rng(42)
+    due = rng.integers(0, 61, count)
+    missed = rng.binomial(due, rng.beta(1, 15, count))
+    late = rng.binomial(due - missed, rng.beta(2, 10, count))
+    exposure = rng.uniform(5000, 200000, count)
+
+    groups = np.zeros((count, 1 + officers + purposes), dtype=np.float32)
+    groups[:, 0] = 1
+    groups[np.arange(count), 1 + rng.integers(0, officers, count)] = 1
+    groups[np.arange(count), 1 + officers + rng.integers(0, purposes, count)] = 1
+    return due, missed, late, exposure, groups
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    scenarios = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    due, missed, late, exposure, groups = make_book(count)
+    default_probability, late_probability = estimate_probabilities(due, missed, late, 0.05)
+
+    started = time.perf_counter()
+    losses = simulate_losses_parallel(
+        default_probability, late_probability, exposure, groups, scenarios, workers=workers, seed=1
+    )
+    seconds = time.perf_counter() - started
+
+    portfolio = loss_summary(losses[:, 0])
+    print(f"Loans:         {count}")
+    print(f"Scenarios:     {scenarios}")
+    print(f"Workers:       {workers}")
+    print(f"Exposure:      {exposure.sum():,.2f}")
+    print(f"EL:            {portfolio['expected_loss']:,.2f}")
+    print(f"VaR95:         {portfolio['var_95']:,.2f}")
+    print(f"VaR99:         {portfolio['var_99']:,.2f}")
+    print(f"Simulation:    {seconds:.1f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark application start-up: a cold start in a fresh interpreter (what
+every worker pays without preloading), and a worker forked from a preloaded
+app serving its first request
+
+Usage: python bench_startup.py [runs]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import statistics
+import subprocess
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Run in a fresh interpreter: import the app, serve one request, print both times
+COLD_START = """
+import time
+started = time.perf_counter()
+from main import app
+imported = time.perf_counter()
+with app.test_client() as client:
+    client.get('/api/auth/check-auth')
+print(imported - started, time.perf_counter() - started)
+"""
+
+def cold_start(runs):
+    """Median seconds to import the app, and to serve the first request, in a new process"""
+    imports, first_requests = [], []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', COLD_START], cwd=HERE,
+                                capture_output=True, text=True, check=True)
+        imported, served = map(float, result.stdout.split()[-2:])
+        imports.append(imported)
+        first_requests.append(served)
+    return statistics.median(imports), statistics.median(first_requests)
+
+def fork_cost(runs):
+    """
+    Median seconds from fork to a worker's first response, with the app
+    imported in the parent beforehand as gunicorn --preload does
+    """
+    from main import app
+
+    timings = []
+    for _ in range(runs):
+        read, write = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            with app.test_client() as client:
+                client.get('/api/auth/check-auth')
+            os.write(write, b'1')
+            os._exit(0)
+        os.close(write)
+        os.read(read, 1)
+        timings.append(time.perf_counter() - started)
+        os.close(read)
+        os.waitpid(pid, 0)
+    return statistics.median(timings)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    imported, served = cold_start(runs)
+    forked = fork_cost(runs)
+
+    print(f"Runs:                {runs}")
+    print(f"Cold import:         {imported * 1000:.0f} ms")
+    print(f"Cold first reply:    {served * 1000:.0f} ms")
+    print(f"Forked first reply:  {forked * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,24 @@ from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 
 borrowers_bp = Blueprint('borrowers', __name__)
 
+def build_borrowers_query(args):
+    """Build the borrowers query for the current user from list filters"""
+    query = Borrower.query
+
+    # Filter by user role
+    if not current_user.is_admin():
+        query = query.filter_by(created_by=current_user.id)
+
+    # Search
+    search_term = args.get('search')
+    if search_term:
+        query = query.filter(
+            Borrower.name.ilike(f'%{search_term}%') |
+            Borrower.phone.ilike(f'%{search_term}%')
+        )
+
+    return query
+
 @borrowers_bp.route('/', methods=['GET'])
 @login_required
 @account_officer_required
@@ -16,19 +34,7 @@ def get_borrowers():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
 
-        query = Borrower.query
-
-        # Filter by user role
-        if not current_user.is_admin():
-            query = query.filter_by(created_by=current_user.id)
-
-        # Search
-        search_term = request.args.get('search')
-        if search_term:
-            query = query.filter(
-                Borrower.name.ilike(f'%{search_term}%') |
-                Borrower.phone.ilike(f'%{search_term}%')
-            )
+        query = build_borrowers_query(request.args)
 
         borrowers = query.paginate(page=page, per_page=per_page)
         
@@ -102,6 +108,26 @@ def get_borrower(borrower_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@borrowers_bp.route('/<int:borrower_id>/risk-score', methods=['GET'])
+@login_required
+@account_officer_required
+def get_borrower_risk_score(borrower_id):
+    """Get a borrower's repayment risk score and its components"""
+    try:
+        from risk_scores import get_borrower_score
+        borrower = Borrower.query.get_or_404(borrower_id)
+        
+        # Check permissions
+        if not current_user.is_admin() and borrower.created_by != current_user.id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        risk_score = get_borrower_score(borrower_id)
+        return jsonify({
+            'risk_score': risk_score.to_dict() if risk_score else {'borrower_id': borrower_id, 'score': None}
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @borrowers_bp.route('/<int:borrower_id>', methods=['PUT'])
 @login_required
 @account_officer_required
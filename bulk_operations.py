@@ -0,0 +1,269 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from user import db, User
+from auth import admin_required
+from borrowers import Borrower
+from loans import Loan, LOAN_STATUSES, DEFAULT_STATUSES
+from changes import record_changes
+from events import resync_on_commit
+import audit
+from risk_scores import recompute_risk_scores
+from cache import mark_stale
+from collections import Counter
+from sqlalchemy import select, update
+from datetime import datetime
+import json
+
+bulk_bp = Blueprint('bulk', __name__)
+
+# Rows per UPDATE statement, keeping each statement's IN list well under SQLite's variable limit
+BULK_CHUNK_SIZE = 500
+
+# Loan ids listed in a preview
+PREVIEW_SAMPLE = 50
+
+def parse_filters(data):
+    """
+    Validate the loan filters of a bulk operation: loan_ids, statuses and
+    ended_before (expected end date before, YYYY-MM-DD). Raises ValueError.
+    """
+    filters = {}
+    if data.get('loan_ids') is not None:
+        loan_ids = data['loan_ids']
+        if not isinstance(loan_ids, list) or not all(isinstance(loan_id, int) for loan_id in loan_ids):
+            raise ValueError('loan_ids must be a list of loan IDs')
+        filters['loan_ids'] = loan_ids
+    if data.get('statuses'):
+        invalid = set(data['statuses']) - set(LOAN_STATUSES)
+        if invalid:
+            raise ValueError(f"Invalid statuses: {', '.join(sorted(invalid))}")
+        filters['statuses'] = list(data['statuses'])
+    if data.get('ended_before'):
+        try:
+            datetime.strptime(data['ended_before'], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Invalid ended_before date format. Use YYYY-MM-DD')
+        filters['ended_before'] = data['ended_before']
+    return filters
+
+def apply_filters(query, filters, officer_id=None):
+    """Narrow a loans query to a bulk operation's selection"""
+    if officer_id:
+        query = query.filter(Loan.account_officer_id == officer_id)
+    if 'loan_ids' in filters:
+        query = query.filter(Loan.id.in_(filters['loan_ids']))
+    if 'statuses' in filters:
+        query = query.filter(Loan.status.in_(filters['statuses']))
+    if 'ended_before' in filters:
+        query = query.filter(Loan.expected_end_date < datetime.strptime(filters['ended_before'], '%Y-%m-%d').date())
+    return query
+
+def selected_loans(query):
+    """Id, borrower, officer, status and principal of the selected loans, in one query"""
+    return query.with_entities(Loan.id, Loan.borrower_id, Loan.account_officer_id, Loan.status,
+                               Loan.principal_amount).order_by(Loan.id).all()
+
+def update_in_chunks(model, ids, values, *criteria):
+    """
+    Apply one set-based UPDATE per chunk of ids. ``criteria`` repeat the
+    selection so a row changed since the preview is left alone. The updated
+    rows' old and new values go to the audit log. Returns the ids of the rows
+    updated, read back with RETURNING.
+    """
+    columns = [getattr(model, name) for name in values]
+    updated = []
+    for position in range(0, len(ids), BULK_CHUNK_SIZE):
+        chunk = ids[position:position + BULK_CHUNK_SIZE]
+        before = {row[0]: row[1:] for row in db.session.execute(
+            select(model.id, *columns).where(model.id.in_(chunk), *criteria))}
+        chunk_updated = db.session.scalars(
+            update(model).where(model.id.in_(chunk), *criteria)
+            .values(values).returning(model.id).execution_options(synchronize_session=False)
+        ).all()
+        audit.record(model, {
+            row_id: {name: (old, values[name]) for name, old in zip(values, before[row_id])}
+            for row_id in chunk_updated
+        })
+        updated += chunk_updated
+    return updated
+
+def preview(loans, borrower_ids):
+    """What a bulk operation would touch"""
+    return {
+        'loans': len(loans),
+        'borrowers': len(borrower_ids),
+        'principal': float(sum(loan.principal_amount for loan in loans)),
+        'by_status': dict(Counter(loan.status for loan in loans)),
+        'loan_ids': [loan.id for loan in loans[:PREVIEW_SAMPLE]]
+    }
+
+def log_operation(operation, parameters, loan_count, borrower_count):
+    """Record a bulk operation in the operation log, in the caller's transaction"""
+    entry = BulkOperation(
+        operation=operation,
+        parameters=json.dumps(parameters),
+        loan_count=loan_count,
+        borrower_count=borrower_count,
+        performed_by=current_user.id
+    )
+    db.session.add(entry)
+    return entry
+
+@bulk_bp.route('/reassign', methods=['POST'])
+@login_required
+@admin_required
+def reassign_portfolio():
+    """
+    Move loans and borrowers from one officer to another:
+    {"from_officer_id", "to_officer_id", optional loan filters}. Without
+    filters every loan and borrower of the officer moves; with filters the
+    selected loans and their borrowers do. ?dry_run=1 previews.
+    """
+    try:
+        data = request.get_json() or {}
+        from_id, to_id = data.get('from_officer_id'), data.get('to_officer_id')
+        if not from_id or not to_id:
+            return jsonify({'error': 'from_officer_id and to_officer_id are required'}), 400
+        if from_id == to_id:
+            return jsonify({'error': 'Cannot reassign an officer to themselves'}), 400
+        User.query.get_or_404(from_id)
+        to_officer = User.query.get_or_404(to_id)
+        if not to_officer.is_active:
+            return jsonify({'error': 'Cannot reassign to an inactive user'}), 400
+
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        loans = selected_loans(apply_filters(Loan.query, filters, officer_id=from_id))
+        borrowers = Borrower.query.filter(Borrower.created_by == from_id)
+        if filters:
+            borrowers = borrowers.filter(Borrower.id.in_({loan.borrower_id for loan in loans}))
+        borrower_ids = [borrower_id for (borrower_id,) in borrowers.with_entities(Borrower.id).order_by(Borrower.id)]
+
+        if request.args.get('dry_run') == '1':
+            return jsonify({'dry_run': True, 'preview': preview(loans, borrower_ids)}), 200
+
+        now = datetime.utcnow()
+        moved_loans = update_in_chunks(Loan, [loan.id for loan in loans],
+                                       {'account_officer_id': to_id, 'updated_at': now},
+                                       Loan.account_officer_id == from_id)
+        moved_borrowers = update_in_chunks(Borrower, borrower_ids, {'created_by': to_id, 'updated_at': now},
+                                           Borrower.created_by == from_id)
+
+        # Bulk UPDATEs bypass the session events, so feed the outbox and caches here
+        record_changes(Loan, moved_loans)
+        record_changes(Borrower, moved_borrowers)
+        mark_stale(db.session, Loan, Borrower)
+        if moved_loans or moved_borrowers:
+            resync_on_commit(db.session, {from_id, to_id})
+        entry = log_operation('reassign', dict(filters, from_officer_id=from_id, to_officer_id=to_id),
+                              len(moved_loans), len(moved_borrowers))
+        db.session.commit()
+
+        return jsonify({
+            'message': f'{len(moved_loans)} loans and {len(moved_borrowers)} borrowers reassigned to {to_officer.full_name}',
+            'operation': entry.to_dict()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@bulk_bp.route('/loan-status', methods=['POST'])
+@login_required
+@admin_required
+def set_loans_status():
+    """
+    Mark the selected loans defaulted or written off:
+    {"status", optional "officer_id" and loan filters}. Completed loans and
+    loans already in that status are skipped. ?dry_run=1 previews.
+    """
+    try:
+        data = request.get_json() or {}
+        status = data.get('status')
+        if status not in DEFAULT_STATUSES:
+            return jsonify({'error': f"Status must be one of {', '.join(DEFAULT_STATUSES)}"}), 400
+
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        officer_id = data.get('officer_id')
+        if not filters and not officer_id:
+            return jsonify({'error': 'Select loans with officer_id, loan_ids, statuses or ended_before'}), 400
+
+        eligible = Loan.status.notin_(['completed', status])
+        loans = selected_loans(apply_filters(Loan.query.filter(eligible), filters, officer_id=officer_id))
+        borrower_ids = sorted({loan.borrower_id for loan in loans})
+
+        if request.args.get('dry_run') == '1':
+            return jsonify({'dry_run': True, 'preview': preview(loans, borrower_ids)}), 200
+
+        updated = update_in_chunks(Loan, [loan.id for loan in loans],
+                                   {'status': status, 'updated_at': datetime.utcnow()}, eligible)
+
+        # Bulk UPDATEs bypass the session events, so feed the outbox and caches here
+        record_changes(Loan, updated)
+        mark_stale(db.session, Loan)
+        if updated:
+            updated_ids = set(updated)
+            resync_on_commit(db.session, {loan.account_officer_id for loan in loans if loan.id in updated_ids})
+        parameters = dict(filters, status=status)
+        if officer_id:
+            parameters['officer_id'] = officer_id
+        entry = log_operation('loan_status', parameters, len(updated), len(borrower_ids))
+
+        # Rebuilding the affected borrowers' risk scores commits the whole operation
+        recompute_risk_scores(borrower_ids)
+
+        return jsonify({
+            'message': f"{len(updated)} loans marked {status.replace('_', ' ')}",
+            'operation': entry.to_dict()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@bulk_bp.route('/operations', methods=['GET'])
+@login_required
+@admin_required
+def get_operations():
+    """Get the bulk operation log, newest first"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+
+        operations = BulkOperation.query.order_by(BulkOperation.id.desc()).paginate(page=page, per_page=per_page)
+        return jsonify({
+            'operations': [operation.to_dict() for operation in operations.items],
+            'total_pages': operations.pages,
+            'current_page': operations.page,
+            'total_items': operations.total
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Model Definition
+class BulkOperation(db.Model):
+    __tablename__ = 'bulk_operations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    operation = db.Column(db.Enum('reassign', 'loan_status', name='bulk_operation'), nullable=False)
+    parameters = db.Column(db.Text, nullable=False)  # JSON encoded request
+    loan_count = db.Column(db.Integer, default=0, nullable=False)
+    borrower_count = db.Column(db.Integer, default=0, nullable=False)
+    performed_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'operation': self.operation,
+            'parameters': json.loads(self.parameters),
+            'loan_count': self.loan_count,
+            'borrower_count': self.borrower_count,
+            'performed_by': self.performed_by,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,137 @@
+from user import db
+from settings import SystemSetting
+from datetime import datetime, date
+import time
+
+import numpy as np
+
+# Years before and after the current one covered by the precomputed index
+CALENDAR_YEARS_BACK = 5
+CALENDAR_YEARS_AHEAD = 5
+
+# Seconds a worker keeps its calendar before reloading holidays and settings
+CALENDAR_TTL = 300
+
+class BusinessCalendar:
+    """
+    Business days under a weekmask and a holiday list, with a precomputed
+    ordinal index over a range of years so "n-th business day on or after"
+    and "business days between" are array lookups. Dates outside the range
+    fall back to numpy's busday functions with the same calendar.
+    """
+
+    def __init__(self, holidays=(), weekmask='1111100', first_year=None, last_year=None):
+        today = date.today()
+        first_year = first_year or today.year - CALENDAR_YEARS_BACK
+        last_year = last_year or today.year + CALENDAR_YEARS_AHEAD
+
+        self.weekmask = weekmask
+        self.holidays = np.array(sorted(holidays), dtype='datetime64[D]')
+        self.busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=self.holidays)
+
+        self.start = np.datetime64(f'{first_year}-01-01', 'D')
+        self.end = np.datetime64(f'{last_year + 1}-01-01', 'D')
+        days = np.arange(self.start, self.end)
+        is_business_day = np.is_busday(days, busdaycal=self.busdaycal)
+
+        # before[i] is the number of business days strictly before days[i]
+        self.before = np.concatenate(([0], np.cumsum(is_business_day)))
+        self.business_days = days[is_business_day]
+
+    def _positions(self, dates):
+        return (dates - self.start).astype(np.int64)
+
+    def offset(self, dates, offsets=0):
+        """
+        Get the business day ``offsets`` business days after the first
+        business day on or after each date (offset 0 rolls forward).
+        """
+        dates, offsets = np.broadcast_arrays(
+            np.asarray(dates, dtype='datetime64[D]'), np.asarray(offsets, dtype=np.int64)
+        )
+        positions = self._positions(dates)
+        inside = (positions >= 0) & (dates < self.end)
+        index = np.where(inside, self.before[np.clip(positions, 0, len(self.before) - 1)] + offsets, 0)
+        inside &= (index >= 0) & (index < len(self.business_days))
+
+        result = np.empty(dates.shape, dtype='datetime64[D]')
+        result[inside] = self.business_days[index[inside]]
+        if not inside.all():
+            result[~inside] = np.busday_offset(dates[~inside], offsets[~inside], roll='forward', busdaycal=self.busdaycal)
+        return result
+
+    def business_days_between(self, start, end):
+        """Count business days in [start, end) like np.busday_count"""
+        start, end = np.broadcast_arrays(
+            np.asarray(start, dtype='datetime64[D]'), np.asarray(end, dtype='datetime64[D]')
+        )
+        start_positions = self._positions(start)
+        end_positions = self._positions(end)
+        inside = (start_positions >= 0) & (end_positions >= 0) & (start <= self.end) & (end <= self.end)
+
+        result = np.empty(start.shape, dtype=np.int64)
+        result[inside] = self.before[end_positions[inside]] - self.before[start_positions[inside]]
+        if not inside.all():
+            result[~inside] = np.busday_count(start[~inside], end[~inside], busdaycal=self.busdaycal)
+        return result if result.ndim else int(result)
+
+    def add_business_days(self, day, offset=0):
+        """Scalar version of offset() returning a datetime.date"""
+        return self.offset(day, offset).item()
+
+    def is_business_day(self, day):
+        """Check if a date is a business day"""
+        return bool(np.is_busday(np.datetime64(day, 'D'), busdaycal=self.busdaycal))
+
+_calendar_cache = {}
+
+def get_business_calendar():
+    """
+    Get the business calendar for the current app, built from the holiday
+    table and the weekend_payment_handling setting. It is cached per worker
+    and rebuilt after CALENDAR_TTL seconds or when holidays or settings
+    change here, so other workers use the old calendar for up to
+    CALENDAR_TTL seconds. Stored installments are rescheduled by the
+    holiday and settings endpoints, not here.
+    """
+    cached = _calendar_cache.get('calendar')
+    if cached and time.monotonic() - _calendar_cache['loaded_at'] < CALENDAR_TTL \
+            and _calendar_cache['year'] == date.today().year:
+        return cached
+
+    handling = SystemSetting.get_setting('weekend_payment_handling', 'next_business_day')
+    if handling == 'same_day':
+        # Installments fall due every calendar day, weekends and holidays included
+        calendar = BusinessCalendar(weekmask='1111111')
+    else:
+        calendar = BusinessCalendar(holidays=[holiday for (holiday,) in db.session.query(Holiday.holiday_date)])
+
+    _calendar_cache.update(calendar=calendar, loaded_at=time.monotonic(), year=date.today().year)
+    return calendar
+
+def invalidate_business_calendar():
+    """Drop the cached calendar so the next use reloads holidays"""
+    _calendar_cache.clear()
+
+
+# Model Definition
+class Holiday(db.Model):
+    __tablename__ = 'holidays'
+
+    id = db.Column(db.Integer, primary_key=True)
+    holiday_date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Serialize the holiday for API responses"""
+        return {
+            'id': self.id,
+            'holiday_date': self.holiday_date.isoformat(),
+            'name': self.name,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<Holiday {self.holiday_date} - {self.name}>'
@@ -0,0 +1,70 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import threading
+import time
+
+# name -> {key: (stored_at, value)}
+_caches = {}
+# model class -> names of the caches built from it
+_dependencies = {}
+_lock = threading.Lock()
+
+def cached(name, key, loader, ttl=None):
+    """
+    Get a value from the named in-process cache, calling ``loader`` to build
+    it on a miss. Entries live until the cache is invalidated, or for ``ttl``
+    seconds when given, after which they are dropped on the next store.
+    """
+    with _lock:
+        entry = _caches.get(name, {}).get(key)
+    if entry and (ttl is None or time.monotonic() - entry[0] < ttl):
+        return entry[1]
+
+    value = loader()
+    now = time.monotonic()
+    with _lock:
+        entries = _caches.setdefault(name, {})
+        if ttl is not None:
+            for expired in [k for k, (stored_at, _) in entries.items() if now - stored_at >= ttl]:
+                del entries[expired]
+        entries[key] = (now, value)
+    return value
+
+def invalidate(*names):
+    """Drop every entry of the named caches"""
+    with _lock:
+        for name in names:
+            _caches.pop(name, None)
+
+def invalidate_on_write(name, *models):
+    """Invalidate the named cache whenever rows of the given models are committed"""
+    for model in models:
+        _dependencies.setdefault(model, set()).add(name)
+
+def mark_stale(session, *models):
+    """
+    Invalidate the caches built from the given models when the session
+    commits, for bulk UPDATEs the flush events do not see
+    """
+    stale = session.info.setdefault('stale_caches', set())
+    for model in models:
+        stale.update(_dependencies.get(model, ()))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_written_models(session, flush_context):
+    """Remember which caches the flushed changes make stale"""
+    stale = session.info.setdefault('stale_caches', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        stale.update(_dependencies.get(type(instance), ()))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_written_caches(session):
+    """Invalidate the caches made stale by the committed transaction"""
+    stale = session.info.pop('stale_caches', None)
+    if stale:
+        invalidate(*stale)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_written_caches(session):
+    """Nothing was written, so nothing is stale"""
+    session.info.pop('stale_caches', None)
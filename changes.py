@@ -0,0 +1,266 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from user import db
+from auth import admin_required
+from borrowers import Borrower
+from loans import Loan
+from payments import Payment
+from settings import SystemSetting
+from sqlalchemy import event, inspect, insert, select, func
+from sqlalchemy.orm import Session
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+import json
+import threading
+import time
+
+changes_bp = Blueprint('changes', __name__)
+
+# Models whose writes go to the outbox
+TRACKED_MODELS = (Borrower, Loan, Payment)
+
+# Largest page and longest wait a consumer may ask for
+MAX_CHANGES_LIMIT = 1000
+MAX_WAIT_SECONDS = 30
+
+# How often a long poll re-reads the outbox for writes made by other processes
+POLL_SECONDS = 1
+
+# Signalled when this process commits new change events
+_new_changes = threading.Condition()
+
+def to_json_value(value):
+    """JSON friendly copy of a column value; amounts keep their exact decimal digits"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def row_payload(instance):
+    """The loaded column values of a tracked row"""
+    state = inspect(instance)
+    return {
+        column.key: to_json_value(state.dict[column.key])
+        for column in state.mapper.column_attrs if column.key in state.dict
+    }
+
+def change_row(instance, operation):
+    """Outbox row for a write to a tracked row"""
+    payload = {'id': instance.id} if operation == 'delete' else row_payload(instance)
+    if operation == 'update':
+        state = inspect(instance)
+        payload['changed'] = sorted(
+            column.key for column in state.mapper.column_attrs
+            if state.attrs[column.key].history.has_changes()
+        )
+    return {
+        'entity': instance.__tablename__,
+        'entity_id': instance.id,
+        'operation': operation,
+        'payload': json.dumps(payload),
+        'created_at': datetime.utcnow()
+    }
+
+@event.listens_for(Session, 'after_flush')
+def _write_outbox(session, flush_context):
+    """
+    Write an outbox row for every flushed insert, update and delete of a
+    tracked model, on the flush's own connection so it commits or rolls back
+    with the change itself
+    """
+    rows = [change_row(instance, 'insert') for instance in session.new if isinstance(instance, TRACKED_MODELS)]
+    rows += [
+        change_row(instance, 'update') for instance in session.dirty
+        if isinstance(instance, TRACKED_MODELS) and session.is_modified(instance, include_collections=False)
+    ]
+    rows += [change_row(instance, 'delete') for instance in session.deleted if isinstance(instance, TRACKED_MODELS)]
+    if rows:
+        session.execute(insert(ChangeEvent.__table__), rows)
+        session.info['wrote_changes'] = True
+
+def record_changes(model, ids, operation='update'):
+    """
+    Write outbox rows for rows changed by a bulk UPDATE or DELETE, which
+    bypass the session events. Call it in the same transaction, after the
+    update.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    if operation == 'delete':
+        # A delete carries only the id, so the rows need not be loaded
+        created_at = datetime.utcnow()
+        rows = [{'entity': model.__tablename__, 'entity_id': row_id, 'operation': 'delete',
+                 'payload': json.dumps({'id': row_id}), 'created_at': created_at} for row_id in ids]
+    else:
+        rows = []
+        for instance in model.query.filter(model.id.in_(ids)).execution_options(populate_existing=True):
+            # The changed columns are not known after a bulk UPDATE, so updates carry the whole row
+            rows.append(dict(change_row(instance, 'insert'), operation=operation))
+    db.session.execute(insert(ChangeEvent.__table__), rows)
+    db.session.info['wrote_changes'] = True
+    return len(rows)
+
+@event.listens_for(Session, 'after_commit')
+def _notify_consumers(session):
+    """Wake long polls waiting for new changes"""
+    if session.info.pop('wrote_changes', False):
+        with _new_changes:
+            _new_changes.notify_all()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    """Nothing was written"""
+    session.info.pop('wrote_changes', None)
+
+def read_changes(after, limit):
+    """Change events with a sequence above ``after``, oldest first"""
+    return ChangeEvent.query.filter(ChangeEvent.seq > after).order_by(ChangeEvent.seq).limit(limit).all()
+
+def wait_for_changes(after, limit, wait):
+    """
+    Read changes above ``after``, waiting up to ``wait`` seconds for some to
+    be committed when there are none yet
+    """
+    deadline = time.monotonic() + wait
+    changes = read_changes(after, limit)
+    while not changes and time.monotonic() < deadline:
+        # End the read transaction so the next read sees newly committed rows
+        db.session.commit()
+        with _new_changes:
+            _new_changes.wait(min(POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+        changes = read_changes(after, limit)
+    return changes
+
+def compact_changes(retention_days=None):
+    """
+    Compact the change feed: of the events older than the retention period,
+    keep only the latest per row, so a consumer that falls behind still
+    sees the final state (and deletion) of every row. Returns the number of
+    events removed.
+    """
+    if retention_days is None:
+        retention_days = int(SystemSetting.get_setting('change_retention_days', '30'))
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    latest = select(func.max(ChangeEvent.seq)).group_by(ChangeEvent.entity, ChangeEvent.entity_id)
+    removed = ChangeEvent.query.filter(
+        ChangeEvent.created_at < cutoff,
+        ChangeEvent.seq.not_in(latest)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+class LocalConsumer:
+    """
+    In-process stand-in for a downstream consumer. It mirrors tracked rows
+    into ``state`` and stores its position in change_consumer_offsets in the
+    same transaction as it reads, so each change is applied exactly once
+    across restarts.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = {}
+
+    def apply(self, change):
+        key = (change.entity, change.entity_id)
+        if change.operation == 'delete':
+            self.state.pop(key, None)
+        else:
+            self.state[key] = dict(self.state.get(key, {}), **json.loads(change.payload))
+
+    def poll(self, limit=100):
+        """Apply the next batch of changes and advance the stored offset"""
+        offset = db.session.get(ChangeConsumerOffset, self.name)
+        if not offset:
+            offset = ChangeConsumerOffset(consumer=self.name, last_seq=0)
+            db.session.add(offset)
+
+        changes = read_changes(offset.last_seq, limit)
+        for change in changes:
+            self.apply(change)
+        if changes:
+            offset.last_seq = changes[-1].seq
+            offset.updated_at = datetime.utcnow()
+        db.session.commit()
+        return len(changes)
+
+@changes_bp.route('/', methods=['GET'])
+@login_required
+@admin_required
+def get_changes():
+    """
+    Tail the change feed: changes with a sequence above ?after=, at most
+    ?limit= of them. With ?wait=<seconds> the request is held until a
+    change arrives or the wait runs out.
+    """
+    try:
+        after = request.args.get('after', 0, type=int)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_CHANGES_LIMIT)
+        wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_WAIT_SECONDS)
+
+        changes = wait_for_changes(after, limit, wait)
+        return jsonify({
+            'changes': [change.to_dict() for change in changes],
+            'next_after': changes[-1].seq if changes else after,
+            'has_more': len(changes) == limit
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@changes_bp.route('/compact', methods=['POST'])
+@login_required
+@admin_required
+def trigger_compaction():
+    """Compact change events older than the retention period (?retention_days=, default from settings)"""
+    try:
+        retention_days = request.args.get('retention_days', type=int)
+        if retention_days is not None and retention_days < 0:
+            return jsonify({'error': 'Retention days must be 0 or greater'}), 400
+        removed = compact_changes(retention_days)
+        return jsonify({
+            'message': 'Change feed compacted',
+            'removed': removed
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Model Definition
+class ChangeEvent(db.Model):
+    __tablename__ = 'change_events'
+    # AUTOINCREMENT keeps sequences monotonic even after the newest rows are compacted
+    __table_args__ = (
+        db.Index('ix_change_events_entity', 'entity', 'entity_id'),
+        {'sqlite_autoincrement': True}
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.Enum('insert', 'update', 'delete', name='change_operation'), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON encoded row, or just its id for deletes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'operation': self.operation,
+            'payload': json.loads(self.payload),
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<ChangeEvent {self.seq} {self.operation} {self.entity} {self.entity_id}>'
+
+class ChangeConsumerOffset(db.Model):
+    __tablename__ = 'change_consumer_offsets'
+
+    consumer = db.Column(db.String(100), primary_key=True)
+    last_seq = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
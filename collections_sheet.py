@@ -0,0 +1,219 @@
+from flask import Blueprint, request, jsonify, Response, send_file
+from flask_login import login_required, current_user
+from user import db, User
+from auth import account_officer_required
+from borrowers import Borrower
+from loans import Loan
+from payments import Payment
+from installments import Installment, backfill_installments
+from reports import write_report_xlsx
+from cache import cached, invalidate, invalidate_on_write
+from sqlalchemy import func, case
+from datetime import datetime, date
+import csv
+import io
+
+collections_bp = Blueprint('collections', __name__)
+
+# Today's sheets are rebuilt after loan, payment or installment writes in this
+# process, and at least this often so writes made by other workers show up
+SHEET_TTL_SECONDS = 300
+invalidate_on_write('collection_sheets', Loan, Payment, Installment)
+
+SHEET_HEADERS = ['AREA', 'BORROWER', 'PHONE', 'ADDRESS', 'LOAN', 'EXPECTED TODAY', 'ARREARS',
+                 'DAYS IN ARREARS', 'PENALTY', 'TOTAL DUE', 'LAST PAYMENT DATE', 'LAST PAYMENT AMOUNT']
+
+def last_payments_subquery():
+    """Each loan's most recent payment"""
+    ranked = db.session.query(
+        Payment.loan_id,
+        Payment.payment_date,
+        Payment.actual_amount,
+        func.row_number().over(
+            partition_by=Payment.loan_id,
+            order_by=(Payment.payment_date.desc(), Payment.id.desc())
+        ).label('position')
+    ).subquery()
+    return db.session.query(ranked).filter(ranked.c.position == 1).subquery()
+
+def collection_rows_query(as_of):
+    """
+    One row per active or overdue loan with something due on ``as_of`` or
+    in arrears, for every officer at once: amount due that day, arrears,
+    oldest missed due date, accrued penalties, borrower contact and the last payment
+    """
+    unpaid = Installment.expected_amount - Installment.paid_amount
+    is_arrears = Installment.due_date < as_of
+    dues = db.session.query(
+        Installment.loan_id,
+        func.sum(case((Installment.due_date == as_of, unpaid), else_=0)).label('expected'),
+        func.sum(case((is_arrears, unpaid), else_=0)).label('arrears'),
+        func.min(case((is_arrears, Installment.due_date))).label('oldest_missed')
+    ).filter(
+        Installment.due_date <= as_of,
+        Installment.paid_amount < Installment.expected_amount
+    ).group_by(Installment.loan_id).subquery()
+    last_payment = last_payments_subquery()
+
+    return db.session.query(
+        Loan.account_officer_id,
+        Loan.id,
+        Borrower.name,
+        Borrower.phone,
+        Borrower.address,
+        Borrower.city,
+        dues.c.expected,
+        dues.c.arrears,
+        dues.c.oldest_missed,
+        Loan.penalty_amount,
+        last_payment.c.payment_date,
+        last_payment.c.actual_amount
+    ).join(
+        dues, dues.c.loan_id == Loan.id
+    ).join(
+        Borrower, Loan.borrower_id == Borrower.id
+    ).outerjoin(
+        last_payment, last_payment.c.loan_id == Loan.id
+    ).filter(
+        Loan.status.in_(['active', 'overdue'])
+    ).order_by(
+        Loan.account_officer_id, func.coalesce(Borrower.city, ''), Borrower.address, Borrower.name, Loan.id
+    )
+
+def compute_collection_sheets(as_of):
+    """
+    Build every officer's collection sheet for a date in one batch pass:
+    a single query over the whole book, grouped here by officer and then
+    by borrower city
+    """
+    backfill_installments()
+    officer_names = dict(db.session.query(User.id, User.full_name))
+
+    sheets = {}
+    for (officer_id, loan_id, name, phone, address, city, expected, arrears, oldest_missed, penalty,
+         last_date, last_amount) in collection_rows_query(as_of):
+        sheet = sheets.setdefault(officer_id, {
+            'officer_id': officer_id,
+            'officer_name': officer_names.get(officer_id),
+            'date': as_of.isoformat(),
+            'areas': [],
+            'totals': {'loans': 0, 'expected': 0.0, 'arrears': 0.0, 'penalty': 0.0}
+        })
+        area = (city or '').strip() or 'Unspecified'
+        if not sheet['areas'] or sheet['areas'][-1]['area'] != area:
+            sheet['areas'].append({'area': area, 'rows': [], 'expected': 0.0, 'arrears': 0.0, 'penalty': 0.0})
+
+        expected, arrears = round(float(expected or 0), 2), round(float(arrears or 0), 2)
+        penalty = round(float(penalty or 0), 2)
+        sheet['areas'][-1]['rows'].append({
+            'loan_id': loan_id,
+            'borrower_name': name,
+            'phone': phone,
+            'address': address,
+            'expected': expected,
+            'arrears': arrears,
+            'days_in_arrears': (as_of - oldest_missed).days if oldest_missed else 0,
+            'penalty': penalty,
+            'total_due': round(expected + arrears + penalty, 2),
+            'last_payment_date': last_date.isoformat() if last_date else None,
+            'last_payment_amount': float(last_amount) if last_amount is not None else None
+        })
+        for totals in (sheet['areas'][-1], sheet['totals']):
+            totals['expected'] = round(totals['expected'] + expected, 2)
+            totals['arrears'] = round(totals['arrears'] + arrears, 2)
+            totals['penalty'] = round(totals['penalty'] + penalty, 2)
+        sheet['totals']['loans'] += 1
+
+    return {'generated_at': datetime.utcnow().isoformat(), 'sheets': sheets}
+
+def get_collection_sheets(as_of, refresh=False):
+    """
+    Every officer's sheets for a date. Today's are cached until a loan,
+    payment or installment is written or SHEET_TTL_SECONDS pass; any other
+    date is computed on each request, so callers cannot fill the cache.
+    """
+    if as_of != date.today():
+        return compute_collection_sheets(as_of)
+    if refresh:
+        invalidate('collection_sheets')
+    return cached('collection_sheets', as_of, lambda: compute_collection_sheets(as_of), ttl=SHEET_TTL_SECONDS)
+
+def precompute_collection_sheets(as_of=None):
+    """Rebuild today's sheets for every officer, after the nightly jobs"""
+    as_of = as_of or date.today()
+    return len(get_collection_sheets(as_of, refresh=True)['sheets'])
+
+def sheet_table(sheet, as_of):
+    """Flatten sheets into a title, headers and rows for CSV and XLSX"""
+    officer_names = ', '.join(filter(None, (officer['officer_name'] for officer in sheet)))
+    return {
+        'title': f'COLLECTION SHEET {as_of.isoformat()} {officer_names.upper()}'.strip(),
+        'headers': SHEET_HEADERS,
+        'rows': [
+            [area['area'], row['borrower_name'], row['phone'], row['address'], row['loan_id'], row['expected'],
+             row['arrears'], row['days_in_arrears'], row['penalty'], row['total_due'], row['last_payment_date'],
+             row['last_payment_amount']]
+            for officer in sheet for area in officer['areas'] for row in area['rows']
+        ]
+    }
+
+@collections_bp.route('/sheet', methods=['GET'])
+@login_required
+@account_officer_required
+def get_collection_sheet():
+    """
+    Get the collection sheet for a date (?date=YYYY-MM-DD, default today).
+    Officers get their own sheet; admins get every officer's, or one with
+    ?officer_id=. ?format=csv or xlsx downloads it, ?refresh=1 (admins)
+    rebuilds it.
+    """
+    try:
+        as_of = date.today()
+        if request.args.get('date'):
+            try:
+                as_of = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+        export_format = request.args.get('format', 'json')
+        if export_format not in ('json', 'csv', 'xlsx'):
+            return jsonify({'error': 'Invalid format. Use json, csv or xlsx'}), 400
+
+        refresh = request.args.get('refresh') == '1' and current_user.is_admin()
+        bundle = get_collection_sheets(as_of, refresh=refresh)
+
+        # Filter by user role
+        if current_user.is_admin():
+            officer_id = request.args.get('officer_id', type=int)
+        else:
+            officer_id = current_user.id
+        sheets = [sheet for officer, sheet in sorted(bundle['sheets'].items())
+                  if officer_id is None or officer == officer_id]
+
+        filename = f"collection_sheet_{as_of.isoformat()}.{export_format}"
+        if export_format == 'csv':
+            table = sheet_table(sheets, as_of)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(table['headers'])
+            writer.writerows(table['rows'])
+            return Response(buffer.getvalue(), mimetype='text/csv',
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
+        if export_format == 'xlsx':
+            output = io.BytesIO()
+            write_report_xlsx(output, sheet_table(sheets, as_of))
+            output.seek(0)
+            return send_file(
+                output,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                as_attachment=True,
+                download_name=filename
+            )
+
+        return jsonify({
+            'date': as_of.isoformat(),
+            'generated_at': bundle['generated_at'],
+            'sheets': sheets
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,238 @@
+from flask import Blueprint, Response, jsonify, stream_with_context
+from flask_login import login_required, current_user
+from user import db
+from loans import Loan
+from payments import Payment
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from datetime import date
+import json
+import queue
+import threading
+
+events_bp = Blueprint('events', __name__)
+
+# Seconds of silence after which a comment line keeps the connection alive
+HEARTBEAT_SECONDS = 15
+
+# Events buffered per subscriber; a subscriber that falls this far behind is resynced
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Open streams per process, each holds a worker thread
+MAX_SUBSCRIBERS = 100
+
+class Subscription:
+    """A bounded queue of events for one stream, scoped to an officer (None for admins)"""
+
+    def __init__(self, officer_id):
+        self.officer_id = officer_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, officer_id):
+        return self.officer_id is None or self.officer_id == officer_id
+
+    def put(self, event):
+        """
+        Queue an event without blocking the publisher. When the queue is
+        full the backlog is dropped and replaced by a single resync event,
+        telling the client to reload instead of replaying stale deltas.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait({'type': 'resync', 'data': {}})
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+class EventBroker:
+    """
+    In-process publish/subscribe for live updates. Each process has its own
+    broker, so streams only see writes committed by the same process.
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, officer_id=None):
+        with self._lock:
+            if len(self._subscriptions) >= MAX_SUBSCRIBERS:
+                return None
+            subscription = Subscription(officer_id)
+            self._subscriptions.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event, officer_id):
+        """Deliver an event to admins and to the officer it belongs to"""
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.wants(officer_id)]
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def resync(self, officer_ids):
+        """Tell admins and the given officers to reload, once per stream"""
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions
+                             if subscription.officer_id is None or subscription.officer_id in officer_ids]
+        for subscription in subscriptions:
+            subscription.put({'type': 'resync', 'data': {}})
+
+broker = EventBroker()
+
+def officer_of(session, loan_id):
+    """Account officer of a loan, from the identity map when loaded"""
+    loan = session.get(Loan, loan_id)
+    return loan.account_officer_id if loan else None
+
+def amount_change(payment):
+    """Old and new actual amount of a payment in this flush"""
+    history = inspect(payment).attrs.actual_amount.history
+    old = history.deleted[0] if history.deleted else payment.actual_amount
+    return float(old or 0), float(payment.actual_amount or 0)
+
+def payment_events(session, payment, kind):
+    """The events a payment write produces, with today's totals delta when it is dated today"""
+    if kind == 'payment_updated':
+        old, new = amount_change(payment)
+        if old == new:
+            return []
+        change, count = new - old, 0
+    else:
+        amount = float(payment.actual_amount or 0)
+        change, count = (amount, 1) if kind == 'payment_recorded' else (-amount, -1)
+
+    officer_id = officer_of(session, payment.loan_id)
+    events = [(officer_id, {'type': kind, 'data': {
+        'payment_id': payment.id,
+        'loan_id': payment.loan_id,
+        'payment_day': payment.payment_day,
+        'amount': float(payment.actual_amount or 0),
+        'change': round(change, 2),
+        'payment_date': payment.payment_date.isoformat() if payment.payment_date else None
+    }})]
+    if payment.payment_date == date.today():
+        events.append((officer_id, {'type': 'today_totals', 'data': {
+            'date': payment.payment_date.isoformat(),
+            'collected_change': round(change, 2),
+            'payments_change': count
+        }}))
+    return events
+
+def loan_events(loan, kind):
+    """The events a loan write produces"""
+    if kind == 'loan_created':
+        data = {'loan_id': loan.id, 'status': loan.status, 'principal_amount': float(loan.principal_amount or 0)}
+    elif kind == 'loan_deleted':
+        data = {'loan_id': loan.id, 'status': loan.status}
+    else:
+        history = inspect(loan).attrs.status.history
+        if not history.deleted or history.deleted[0] == loan.status:
+            return []
+        data = {'loan_id': loan.id, 'from': history.deleted[0], 'to': loan.status}
+    return [(loan.account_officer_id, {'type': kind, 'data': data})]
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    """Turn flushed payment and loan writes into events, held until the transaction commits"""
+    pending = []
+    for instance in session.new:
+        if isinstance(instance, Payment):
+            pending += payment_events(session, instance, 'payment_recorded')
+        elif isinstance(instance, Loan):
+            pending += loan_events(instance, 'loan_created')
+    for instance in session.dirty:
+        if isinstance(instance, Payment):
+            pending += payment_events(session, instance, 'payment_updated')
+        elif isinstance(instance, Loan):
+            pending += loan_events(instance, 'loan_status_changed')
+    for instance in session.deleted:
+        if isinstance(instance, Payment):
+            pending += payment_events(session, instance, 'payment_deleted')
+        elif isinstance(instance, Loan):
+            pending += loan_events(instance, 'loan_deleted')
+    if pending:
+        session.info.setdefault('pending_events', []).extend(pending)
+
+def resync_on_commit(session, officer_ids):
+    """
+    Resync the streams of the given officers, and admins', when the session
+    commits, for bulk UPDATEs and DELETEs the flush events do not see
+    """
+    session.info.setdefault('resync_officers', set()).update(officer_ids)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_events(session):
+    """Publish the committed transaction's events"""
+    for officer_id, pending_event in session.info.pop('pending_events', ()):
+        broker.publish(pending_event, officer_id)
+    officer_ids = session.info.pop('resync_officers', None)
+    if officer_ids is not None:
+        broker.resync(officer_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_events(session):
+    """Nothing was written, so there is nothing to publish"""
+    session.info.pop('pending_events', None)
+    session.info.pop('resync_officers', None)
+
+def today_totals(officer_id):
+    """Today's collections and payment count, for an officer or the whole book"""
+    today = date.today()
+    query = db.session.query(
+        func.coalesce(func.sum(Payment.actual_amount), 0),
+        func.count(Payment.id)
+    ).join(Loan, Payment.loan_id == Loan.id).filter(Payment.payment_date == today)
+    if officer_id:
+        query = query.filter(Loan.account_officer_id == officer_id)
+    collected, payments = query.one()
+    return {'date': today.isoformat(), 'collected': float(collected), 'payments': payments}
+
+def format_event(event):
+    """Encode an event in the Server-Sent Events wire format"""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+@events_bp.route('/stream', methods=['GET'])
+@login_required
+def stream_events():
+    """
+    Stream live payment and loan events as Server-Sent Events. The stream
+    opens with a snapshot of today's totals; later events carry deltas.
+    Account officers only receive events for their own loans.
+    """
+    try:
+        officer_id = None if current_user.is_admin() else current_user.id
+        snapshot = {'type': 'snapshot', 'data': today_totals(officer_id)}
+        db.session.remove()
+
+        subscription = broker.subscribe(officer_id)
+        if subscription is None:
+            return jsonify({'error': 'Too many open event streams, try again later'}), 503
+
+        def generate():
+            try:
+                yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+                yield format_event(snapshot)
+                while True:
+                    try:
+                        yield format_event(subscription.get(timeout=HEARTBEAT_SECONDS))
+                    except queue.Empty:
+                        yield ': heartbeat\n\n'
+            finally:
+                broker.unsubscribe(subscription)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,6 +1,6 @@
-import pandas as pd
-
 def analyze_excel(file_path):
+    import pandas as pd
+
     df = pd.read_excel(file_path, header=2) # Data starts from row 3 (index 2)
     df.columns = df.iloc[0] # Set the first row as header
     df = df[1:].reset_index(drop=True) # Remove the first row and reset index
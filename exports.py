@@ -0,0 +1,104 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_login import login_required
+from auth import account_officer_required
+from borrowers import Borrower, build_borrowers_query
+from loans import Loan, build_loans_query
+from payments import Payment, build_payments_query
+from datetime import datetime, date
+from decimal import Decimal
+import csv
+import io
+import json
+
+exports_bp = Blueprint('exports', __name__)
+
+# Rows fetched from the database per round trip while streaming
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def export_value(value):
+    """Convert a column value into a CSV/JSON friendly value"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def stream_rows(query, columns, export_format):
+    """Yield the rows of ``query`` encoded as CSV or NDJSON lines.
+
+    Only the raw column tuples are loaded and they are fetched in batches of
+    EXPORT_BATCH_SIZE, so memory use stays constant however many rows match.
+    """
+    names = [column.name for column in columns]
+    rows = query.with_entities(*columns).yield_per(EXPORT_BATCH_SIZE)
+
+    if export_format == 'ndjson':
+        for row in rows:
+            yield json.dumps(dict(zip(names, map(export_value, row)))) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([export_value(value) for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_response(query, model, name):
+    """Build a streamed download response for ``query``"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Invalid export format. Use csv or ndjson'}), 400
+
+    columns = list(model.__table__.columns)
+    query = query.order_by(model.id)
+    filename = f"{name}_{date.today().isoformat()}.{export_format}"
+
+    return Response(
+        stream_with_context(stream_rows(query, columns, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@exports_bp.route('/loans', methods=['GET'])
+@login_required
+@account_officer_required
+def export_loans():
+    """Stream all loans matching the loan list filters"""
+    try:
+        return export_response(build_loans_query(request.args), Loan, 'loans')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@exports_bp.route('/payments', methods=['GET'])
+@login_required
+@account_officer_required
+def export_payments():
+    """Stream all payments matching the payment list filters"""
+    try:
+        try:
+            query = build_payments_query(request.args)
+        except ValueError:
+            return jsonify({'error': 'Invalid payment date format. Use YYYY-MM-DD'}), 400
+        return export_response(query, Payment, 'payments')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@exports_bp.route('/borrowers', methods=['GET'])
+@login_required
+@account_officer_required
+def export_borrowers():
+    """Stream all borrowers matching the borrower list filters"""
+    try:
+        return export_response(build_borrowers_query(request.args), Borrower, 'borrowers')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,140 @@
+from user import db, User
+from loans import Loan
+from payments import Payment
+from installments import Installment, backfill_installments
+from cache import cached, invalidate_on_write
+from sqlalchemy import func
+from datetime import date, timedelta
+
+# Days of past installments an officer's collection rate is measured over
+COLLECTION_RATE_LOOKBACK_DAYS = 90
+
+# Seconds a forecast is kept. Writes invalidate it in the process that made
+# them; other workers pick the change up once it expires.
+FORECAST_TTL = 300
+
+# The forecast only changes when payments, loans or installments are written
+invalidate_on_write('cash_forecast', Payment, Loan, Installment)
+
+def remaining_amount():
+    """SQL expression for the unpaid part of an installment"""
+    return Installment.expected_amount - Installment.paid_amount
+
+def officer_collection_rates(as_of, officer_id=None):
+    """
+    Share of the amount due that each officer actually collected on the
+    installments due over the lookback window before ``as_of``
+    """
+    query = db.session.query(
+        Loan.account_officer_id,
+        func.sum(Installment.expected_amount),
+        func.sum(Installment.paid_amount)
+    ).join(Loan, Installment.loan_id == Loan.id).filter(
+        Installment.due_date >= as_of - timedelta(days=COLLECTION_RATE_LOOKBACK_DAYS),
+        Installment.due_date < as_of
+    ).group_by(Loan.account_officer_id)
+
+    if officer_id:
+        query = query.filter(Loan.account_officer_id == officer_id)
+
+    return {
+        officer: float(collected_total) / float(due) if due else None
+        for officer, due, collected_total in query
+    }
+
+def compute_cash_forecast(as_of, days, officer_id=None):
+    """
+    Expected inflows per day and per officer over the next ``days`` days:
+    the unpaid part of every installment of active and overdue loans falling
+    due in the window, summed in one grouped query. The weighted variant
+    scales each officer's inflows by their historical collection rate
+    (officers without history are assumed to collect in full).
+    """
+    backfill_installments()
+    end = as_of + timedelta(days=days)
+
+    remaining = remaining_amount()
+
+    query = db.session.query(
+        Installment.due_date,
+        Loan.account_officer_id,
+        func.sum(remaining),
+        func.count(Installment.id)
+    ).join(Loan, Installment.loan_id == Loan.id).filter(
+        Loan.status.in_(['active', 'overdue']),
+        Installment.due_date >= as_of,
+        Installment.due_date < end,
+        remaining > 0
+    ).group_by(Installment.due_date, Loan.account_officer_id)
+
+    if officer_id:
+        query = query.filter(Loan.account_officer_id == officer_id)
+
+    rows = query.all()
+    rates = officer_collection_rates(as_of, officer_id)
+    officer_names = dict(db.session.query(User.id, User.full_name).filter(
+        User.id.in_({officer for _, officer, _, _ in rows})
+    ))
+
+    daily = {}
+    officers = {}
+    for due_date, officer, expected, installment_count in rows:
+        expected = float(expected)
+        rate = rates.get(officer)
+        weighted = expected * (rate if rate is not None else 1)
+
+        day = daily.setdefault(due_date, {'expected': 0, 'weighted': 0, 'installments': 0})
+        day['expected'] += expected
+        day['weighted'] += weighted
+        day['installments'] += installment_count
+
+        totals = officers.setdefault(officer, {
+            'officer_id': officer,
+            'officer_name': officer_names.get(officer),
+            'collection_rate': round(rate * 100, 2) if rate is not None else None,
+            'expected': 0,
+            'weighted': 0,
+            'daily': []
+        })
+        totals['expected'] += expected
+        totals['weighted'] += weighted
+        totals['daily'].append({
+            'date': due_date.isoformat(),
+            'expected': round(expected, 2),
+            'weighted': round(weighted, 2)
+        })
+
+    for totals in officers.values():
+        totals['expected'] = round(totals['expected'], 2)
+        totals['weighted'] = round(totals['weighted'], 2)
+        totals['daily'].sort(key=lambda day: day['date'])
+
+    return {
+        'as_of': as_of.isoformat(),
+        'days': days,
+        'total_expected': round(sum(day['expected'] for day in daily.values()), 2),
+        'total_weighted': round(sum(day['weighted'] for day in daily.values()), 2),
+        'daily': [
+            {
+                'date': due_date.isoformat(),
+                'expected': round(day['expected'], 2),
+                'weighted': round(day['weighted'], 2),
+                'installments': day['installments']
+            }
+            for due_date, day in sorted(daily.items())
+        ],
+        'officer_breakdown': sorted(officers.values(), key=lambda totals: -totals['expected'])
+    }
+
+def get_cash_forecast(days, officer_id=None, as_of=None):
+    """
+    Get the cash forecast, cached for up to FORECAST_TTL seconds or until
+    this process writes payments, loans or installments
+    """
+    as_of = as_of or date.today()
+    return cached(
+        'cash_forecast',
+        (as_of, days, officer_id),
+        lambda: compute_cash_forecast(as_of, days, officer_id),
+        ttl=FORECAST_TTL
+    )
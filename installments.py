@@ -0,0 +1,93 @@
+from user import db
+from cache import mark_stale
+from schedules import batch_payment_schedule
+from datetime import datetime
+
+def installment_rows(batch):
+    """Convert a PaymentScheduleBatch into installment rows for bulk insert"""
+    return [
+        {
+            'loan_id': int(loan_id),
+            'day': int(day),
+            'due_date': due_date,
+            'expected_amount': float(amount)
+        }
+        for loan_id, day, due_date, amount in zip(batch.loan_id, batch.day, batch.date.astype(object), batch.amount)
+    ]
+
+def write_installments(loan):
+    """
+    (Re)write the installments of a loan from its payment schedule and
+    reapply its payments to them. The loan must already have an id, i.e. be
+    flushed.
+    """
+    from allocations import reallocate_loans
+
+    Installment.query.filter_by(loan_id=loan.id).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(Installment, installment_rows(batch_payment_schedule([loan])))
+    mark_stale(db.session, Installment)
+    db.session.expire(loan, ['installments'])
+    reallocate_loans([loan.id])
+
+def reschedule_loans(loans):
+    """
+    Rewrite the installments and expected end date of many loans in one
+    batch, e.g. after the business calendar changed, and reapply their
+    payments.
+    """
+    from allocations import reallocate_loans
+
+    loans = list(loans)
+    if not loans:
+        return 0
+
+    Installment.query.filter(Installment.loan_id.in_([loan.id for loan in loans])).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(Installment, installment_rows(batch_payment_schedule(loans)))
+    mark_stale(db.session, Installment)
+    for loan in loans:
+        loan.calculate_expected_end_date()
+        db.session.expire(loan, ['installments'])
+    reallocate_loans([loan.id for loan in loans])
+    return len(loans)
+
+def backfill_installments():
+    """
+    Write installments for loans created before installments were stored,
+    and allocate payments recorded before allocations were kept.
+    Returns the number of loans backfilled.
+    """
+    from loans import Loan
+    from allocations import reallocate_loans, unallocated_loan_ids
+
+    missing = Loan.query.filter(
+        ~db.session.query(Installment.id).filter(Installment.loan_id == Loan.id).exists()
+    ).all()
+
+    if missing:
+        db.session.bulk_insert_mappings(Installment, installment_rows(batch_payment_schedule(missing)))
+        mark_stale(db.session, Installment)
+
+    unallocated = unallocated_loan_ids()
+    if missing or unallocated:
+        reallocate_loans(set(unallocated) | {loan.id for loan in missing})
+        db.session.commit()
+    return len(missing)
+
+
+# Model Definition
+class Installment(db.Model):
+    __tablename__ = 'installments'
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'day', name='uq_installments_loan_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    due_date = db.Column(db.Date, nullable=False, index=True)
+    expected_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    paid_amount = db.Column(db.Numeric(10, 2), default=0, server_default='0', nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Installment Loan {self.loan_id} - Day {self.day} - {self.due_date}>'
@@ -0,0 +1,141 @@
+from flask import Blueprint, jsonify, send_file, current_app
+from flask_login import login_required, current_user
+from user import db
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import os
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Long running work (large exports etc.) runs here instead of in the request
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='lookman-jobs')
+
+# Registered job handlers keyed by job kind
+JOB_HANDLERS = {}
+
+def job_handler(kind):
+    """Register ``fn(job, output_folder)`` as the handler for a job kind.
+
+    The handler runs inside an application context and returns the name of
+    the file it wrote into ``output_folder`` (or None if it produced no file).
+    """
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+def get_output_folder(app=None):
+    """Get (and create) the folder background jobs write their files to"""
+    app = app or current_app
+    folder = app.config.get('JOB_OUTPUT_FOLDER') or os.path.join(app.instance_path, 'jobs')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def enqueue_job(kind, params, user_id):
+    """Create a job row and run it on the background executor"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+
+    job = BackgroundJob(kind=kind, params=json.dumps(params), requested_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    executor.submit(run_job, app, job.id)
+    return job
+
+def run_job(app, job_id):
+    """Run a queued job and record its outcome"""
+    with app.app_context():
+        job = db.session.get(BackgroundJob, job_id)
+        try:
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            job.result_file = JOB_HANDLERS[job.kind](job, get_output_folder(app))
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.completed_at = datetime.utcnow()
+            db.session.commit()
+            db.session.remove()
+
+def can_access_job(job):
+    """Check if the current user may see a job"""
+    return current_user.is_admin() or job.requested_by == current_user.id
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Get the status of a background job"""
+    try:
+        job = BackgroundJob.query.get_or_404(job_id)
+
+        # Check permissions
+        if not can_access_job(job):
+            return jsonify({'error': 'Access denied'}), 403
+
+        return jsonify({
+            'job': job.to_dict()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>/download', methods=['GET'])
+@login_required
+def download_job_result(job_id):
+    """Download the file produced by a completed job"""
+    try:
+        job = BackgroundJob.query.get_or_404(job_id)
+
+        # Check permissions
+        if not can_access_job(job):
+            return jsonify({'error': 'Access denied'}), 403
+
+        if job.status != 'completed' or not job.result_file:
+            return jsonify({'error': 'Job has no result to download yet'}), 400
+
+        path = os.path.join(get_output_folder(), job.result_file)
+        return send_file(path, as_attachment=True, download_name=job.result_file)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Model Definition
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text)  # JSON encoded job parameters
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed', name='job_status'), default='queued', nullable=False)
+    result_file = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    def get_params(self):
+        """Get the decoded job parameters"""
+        return json.loads(self.params) if self.params else {}
+
+    def to_dict(self):
+        """Serialize the job for API responses"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'download_url': f'/api/jobs/{self.id}/download' if self.status == 'completed' and self.result_file else None
+        }
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} - {self.kind} - {self.status}>'
@@ -3,44 +3,71 @@ from flask_login import login_required, current_user
 from user import db
 from settings import SystemSetting
 from auth import account_officer_required, admin_required
+from installments import write_installments
+from schedules import batch_payment_schedule
+import pricing
+from products import LoanProduct, plan_for
 from datetime import datetime, date
 from decimal import Decimal
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 
 loans_bp = Blueprint('loans', __name__)
 
+LOAN_STATUSES = ('active', 'completed', 'overdue', 'defaulted', 'written_off')
+
+# Statuses of loans the borrower failed to repay
+DEFAULT_STATUSES = ('defaulted', 'written_off')
+
+def build_loans_query(args, model=None):
+    """Build the loans query for the current user from list filters, on ``model`` (Loan or ArchivedLoan)"""
+    model = model or Loan
+
+    # Get query parameters for filtering
+    status = args.get('status')
+    borrower_id = args.get('borrower_id')
+    
+    # Base query
+    query = model.query
+    
+    # Filter by user role
+    if not current_user.is_admin():
+        query = query.filter_by(account_officer_id=current_user.id)
+    
+    # Apply additional filters
+    if status:
+        query = query.filter_by(status=status)
+    
+    if borrower_id:
+        query = query.filter_by(borrower_id=borrower_id)
+    
+    return query
+
 @loans_bp.route('/', methods=['GET'])
 @login_required
 @account_officer_required
 def get_loans():
-    """Get all loans (filtered by user role and optional filters)"""
+    """
+    Get all loans (filtered by user role and optional filters). Archived
+    loans are left out unless ?include_archived=1.
+    """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
 
-        # Get query parameters for filtering
-        status = request.args.get('status')
-        borrower_id = request.args.get('borrower_id')
-        
-        # Base query
-        query = Loan.query
-        
-        # Filter by user role
-        if not current_user.is_admin():
-            query = query.filter_by(account_officer_id=current_user.id)
-        
-        # Apply additional filters
-        if status:
-            query = query.filter_by(status=status)
-        
-        if borrower_id:
-            query = query.filter_by(borrower_id=borrower_id)
-        
-        loans = query.order_by(Loan.created_at.desc()).paginate(page=page, per_page=per_page)
-        
         loan_schema = LoanSchema(many=True)
+        if request.args.get('include_archived') == '1':
+            from archive import ArchivedLoan, paginate_with_archive
+            loans = paginate_with_archive(build_loans_query(request.args),
+                                          build_loans_query(request.args, ArchivedLoan),
+                                          Loan, page, per_page, '-created_at', '-id')
+            items = [dict(item, archived=row.archived) for item, row in zip(loan_schema.dump(loans.items), loans.items)]
+        else:
+            query = build_loans_query(request.args)
+            loans = query.order_by(Loan.created_at.desc()).paginate(page=page, per_page=per_page)
+            items = loan_schema.dump(loans.items)
+
         return jsonify({
-            'loans': loan_schema.dump(loans.items),
+            'loans': items,
             'total_pages': loans.pages,
             'current_page': loans.page,
             'total_items': loans.total
@@ -83,13 +110,32 @@ def create_loan():
         if active_loan:
             return jsonify({'error': 'Borrower already has an active loan'}), 400
         
+        # Check the borrower's repayment score against the configured minimum
+        min_score = float(SystemSetting.get_setting('min_borrower_score', '0'))
+        if min_score > 0:
+            from risk_scores import get_borrower_score
+            risk_score = get_borrower_score(borrower_id)
+            if risk_score and risk_score.score is not None and float(risk_score.score) < min_score:
+                return jsonify({
+                    'error': f'Borrower risk score {float(risk_score.score):.2f} is below the minimum of {min_score:.2f}'
+                }), 400
+        
         # Parse start date
         try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
         except ValueError:
             return jsonify({'error': 'Invalid start date format. Use YYYY-MM-DD'}), 400
         
-        # Get default values from system settings if not provided
+        # Validate the repayment product, if any
+        product = None
+        if data.get('product_id'):
+            product = LoanProduct.query.get(data['product_id'])
+            if not product or not product.is_active:
+                return jsonify({'error': 'Invalid or inactive loan product'}), 400
+        
+        # Get default values from the product or system settings if not provided
+        if interest_rate is None and product and product.interest_rate is not None:
+            interest_rate = float(product.interest_rate)
         if interest_rate is None:
             interest_rate = float(SystemSetting.get_setting('default_interest_rate', '10.00'))
         
@@ -104,12 +150,13 @@ def create_loan():
             interest_rate=Decimal(str(interest_rate)),
             expenses=Decimal(str(expenses)),
             loan_duration_days=loan_duration_days,
-            start_date=start_date
+            start_date=start_date,
+            product=product
         )
         
         # Add optional fields
         for field in data:
-            if hasattr(new_loan, field) and field not in ['borrower_id', 'principal_amount', 'interest_rate', 'expenses', 'loan_duration_days', 'start_date']:
+            if hasattr(new_loan, field) and field not in ['borrower_id', 'principal_amount', 'interest_rate', 'expenses', 'loan_duration_days', 'start_date', 'product_id', 'product']:
                 if field == 'collateral_value' and not data.get('has_collateral'):
                     continue
                 setattr(new_loan, field, data[field])
@@ -121,6 +168,8 @@ def create_loan():
         new_loan.calculate_expected_end_date()
         
         db.session.add(new_loan)
+        db.session.flush()
+        write_installments(new_loan)
         db.session.commit()
         
         loan_schema = LoanSchema()
@@ -133,13 +182,91 @@ def create_loan():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Largest grid a single quote request may price
+MAX_QUOTE_COMBINATIONS = 10000
+
+@loans_bp.route('/quote', methods=['POST'])
+@login_required
+@account_officer_required
+def quote_loans():
+    """
+    Price a grid of loan options without creating loans. Each of
+    principal_amounts, interest_rates and loan_duration_days may be a number
+    or a list; every combination is quoted.
+    """
+    try:
+        data = request.get_json() or {}
+
+        def as_list(name):
+            value = data.get(name)
+            if value is None:
+                return None
+            return value if isinstance(value, list) else [value]
+
+        principal_amounts = as_list('principal_amounts') or as_list('principal_amount')
+        interest_rates = as_list('interest_rates') or as_list('interest_rate')
+        durations = as_list('loan_duration_days')
+        expenses = data.get('expenses', 0)
+
+        if not principal_amounts or not interest_rates or not durations:
+            return jsonify({'error': 'principal_amounts, interest_rates and loan_duration_days are required'}), 400
+
+        try:
+            if any(float(amount) <= 0 for amount in principal_amounts):
+                return jsonify({'error': 'Principal amount must be greater than 0'}), 400
+            if any(float(rate) < 0 for rate in interest_rates) or float(expenses) < 0:
+                return jsonify({'error': 'Interest rates and expenses must be 0 or greater'}), 400
+            if any(int(days) != days or days < 1 for days in durations):
+                return jsonify({'error': 'Loan duration must be a whole number of days, 1 or greater'}), 400
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Quote inputs must be numbers'}), 400
+
+        combinations = len(principal_amounts) * len(interest_rates) * len(durations)
+        if combinations > MAX_QUOTE_COMBINATIONS:
+            return jsonify({'error': f'At most {MAX_QUOTE_COMBINATIONS} combinations can be quoted at once'}), 400
+
+        grid = pricing.quote_grid(principal_amounts, interest_rates, durations, expenses)
+        rate_units = pricing.RATE_UNITS_PER_PERCENT
+        quotes = [
+            {
+                'principal_amount': principal / 100,
+                'interest_rate': rate / rate_units,
+                'loan_duration_days': int(days),
+                'expenses': expense / 100,
+                'interest_amount': interest / 100,
+                'total_amount': total / 100,
+                'daily_repayment': regular / 100,
+                'last_repayment': last / 100
+            }
+            for principal, rate, days, expense, interest, total, regular, last in zip(*(
+                grid[name].tolist() for name in (
+                    'principal_amount', 'interest_rate', 'loan_duration_days', 'expenses',
+                    'interest_amount', 'total_amount', 'daily_repayment', 'last_repayment'
+                )
+            ))
+        ]
+
+        return jsonify({
+            'quotes': quotes,
+            'count': len(quotes)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @loans_bp.route('/<int:loan_id>', methods=['GET'])
 @login_required
 @account_officer_required
 def get_loan(loan_id):
-    """Get a specific loan"""
+    """Get a specific loan, looking in the archive too with ?include_archived=1"""
     try:
-        loan = Loan.query.get_or_404(loan_id)
+        loan = Loan.query.get(loan_id)
+        archived = False
+        if loan is None and request.args.get('include_archived') == '1':
+            from archive import ArchivedLoan
+            loan, archived = ArchivedLoan.query.get(loan_id), True
+        if loan is None:
+            return jsonify({'error': 'Loan not found'}), 404
         
         # Check permissions
         if not current_user.is_admin() and loan.account_officer_id != current_user.id:
@@ -147,7 +274,7 @@ def get_loan(loan_id):
         
         loan_schema = LoanSchema()
         return jsonify({
-            'loan': loan_schema.dump(loan)
+            'loan': dict(loan_schema.dump(loan), archived=archived)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -182,6 +309,7 @@ def update_loan(loan_id):
         if 'expenses' in data or 'interest_rate' in data:
             loan.calculate_total_amount()
             loan.calculate_daily_repayment()
+            write_installments(loan)
         
         loan.updated_at = datetime.utcnow()
         db.session.commit()
@@ -232,7 +360,7 @@ def update_loan_status(loan_id):
         data = request.get_json()
         new_status = data.get('status')
         
-        if new_status not in ['active', 'completed', 'overdue', 'defaulted']:
+        if new_status not in LOAN_STATUSES:
             return jsonify({'error': 'Invalid status'}), 400
         
         loan.status = new_status
@@ -293,6 +421,7 @@ def get_loans_summary():
         completed_loans = len([loan for loan in loans if loan.status == 'completed'])
         overdue_loans = len([loan for loan in loans if loan.status == 'overdue'])
         defaulted_loans = len([loan for loan in loans if loan.status == 'defaulted'])
+        written_off_loans = len([loan for loan in loans if loan.status == 'written_off'])
         
         total_principal = sum(loan.principal_amount for loan in loans)
         total_expected = sum(loan.total_amount for loan in loans)
@@ -306,6 +435,7 @@ def get_loans_summary():
                 'completed_loans': completed_loans,
                 'overdue_loans': overdue_loans,
                 'defaulted_loans': defaulted_loans,
+                'written_off_loans': written_off_loans,
                 'total_principal': float(total_principal),
                 'total_expected': float(total_expected),
                 'total_collected': float(total_collected),
@@ -328,19 +458,21 @@ class Loan(db.Model):
     interest_rate = db.Column(db.Numeric(5, 2), default=0.00)
     interest_amount = db.Column(db.Numeric(10, 2), default=0.00)
     expenses = db.Column(db.Numeric(10, 2), default=0.00)
+    penalty_amount = db.Column(db.Numeric(10, 2), default=0, server_default='0', nullable=False)  # Accrued late penalties, on top of total_amount
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     daily_repayment = db.Column(db.Numeric(10, 2), nullable=False)
     loan_duration_days = db.Column(db.Integer, default=15)
     start_date = db.Column(db.Date, nullable=False)
     expected_end_date = db.Column(db.Date, nullable=False)
     actual_end_date = db.Column(db.Date)
-    status = db.Column(db.Enum('active', 'completed', 'overdue', 'defaulted', name='loan_status'), default='active')
+    status = db.Column(db.Enum(*LOAN_STATUSES, name='loan_status'), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     # Loan Application Details
     loan_purpose = db.Column(db.String(100))
     loan_term = db.Column(db.Integer)  # in months
+    product_id = db.Column(db.Integer, db.ForeignKey('loan_products.id'))
 
     # Collateral Information
     has_collateral = db.Column(db.Boolean, default=False)
@@ -356,47 +488,37 @@ class Loan(db.Model):
 
     # Relationships
     payments = db.relationship('Payment', backref='loan', lazy=True, cascade='all, delete-orphan')
+    installments = db.relationship('Installment', backref='loan', lazy=True, cascade='all, delete-orphan',
+                                   order_by='Installment.day')
     
     def calculate_interest(self):
         """Calculate interest amount"""
-        self.interest_amount = (self.principal_amount * self.interest_rate) / 100
+        self.interest_amount = pricing.from_cents(plan_for(self).interest_cents(self))
     
     def calculate_total_amount(self):
         """Calculate total amount to be repaid"""
-        self.total_amount = self.principal_amount + self.interest_amount + self.expenses
+        self.total_amount = pricing.total_amount(self.principal_amount, self.interest_amount, self.expenses)
     
     def calculate_daily_repayment(self):
-        """Calculate daily repayment amount"""
-        if self.loan_duration_days > 0:
-            self.daily_repayment = self.total_amount / self.loan_duration_days
-        else:
-            self.daily_repayment = self.total_amount
+        """Calculate the regular installment amount (daily for daily products)"""
+        _, amounts = plan_for(self).schedule_arrays([self])
+        self.daily_repayment = pricing.from_cents(amounts[0]) if len(amounts) else self.total_amount
     
     def calculate_expected_end_date(self):
-        """Calculate expected end date"""
-        from datetime import timedelta
-        self.expected_end_date = self.start_date + timedelta(days=self.loan_duration_days - 1)
+        """Calculate expected end date (the due date of the last installment)"""
+        schedule = batch_payment_schedule([self])
+        self.expected_end_date = schedule.date[-1].item() if len(schedule) else self.start_date
     
     def get_payment_schedule(self):
-        """Get payment schedule for this loan"""
-        from datetime import timedelta
-        schedule = []
-        current_date = self.start_date
-        
-        for day in range(1, self.loan_duration_days + 1):
-            # Skip weekends by moving to next business day
-            while current_date.weekday() >= 5:  # Saturday=5, Sunday=6
-                current_date += timedelta(days=1)
-            
-            schedule.append({
-                'day': day,
-                'date': current_date,
-                'expected_amount': float(self.daily_repayment)
-            })
-            
-            current_date += timedelta(days=1)
-        
-        return schedule
+        """Get payment schedule for this loan, from its stored installments when written"""
+        if self.id and self.installments:
+            return [
+                {'day': installment.day, 'date': installment.due_date,
+                 'expected_amount': float(installment.expected_amount),
+                 'paid_amount': float(installment.paid_amount or 0)}
+                for installment in self.installments
+            ]
+        return batch_payment_schedule([self]).to_dicts()
     
     def get_total_payments(self):
         """Get total payments made for this loan"""
@@ -404,7 +526,7 @@ class Loan(db.Model):
     
     def get_outstanding_balance(self):
         """Get outstanding balance"""
-        return self.total_amount - self.get_total_payments()
+        return self.total_amount + (self.penalty_amount or 0) - self.get_total_payments()
     
     def update_status(self):
         """Update loan status based on payments and dates"""
@@ -414,10 +536,13 @@ class Loan(db.Model):
         total_paid = self.get_total_payments()
         
         # Check if loan is completed
-        if total_paid >= self.total_amount:
+        if total_paid >= self.total_amount + (self.penalty_amount or 0):
             self.status = 'completed'
             if not self.actual_end_date:
                 self.actual_end_date = today
+        elif self.status in DEFAULT_STATUSES:
+            # Defaulted and written off loans stay so until repaid in full
+            return
         elif today > self.expected_end_date:
             self.status = 'overdue'
         else:
@@ -445,6 +570,7 @@ class LoanSchema(SQLAlchemySchema):
     interest_rate = auto_field()
     interest_amount = auto_field()
     expenses = auto_field()
+    penalty_amount = auto_field(dump_only=True)
     total_amount = auto_field()
     daily_repayment = auto_field()
     loan_duration_days = auto_field()
@@ -456,6 +582,7 @@ class LoanSchema(SQLAlchemySchema):
     updated_at = auto_field()
     loan_purpose = auto_field()
     loan_term = auto_field()
+    product_id = auto_field()
     has_collateral = auto_field()
     collateral_type = auto_field()
     collateral_value = auto_field()
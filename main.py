@@ -4,32 +4,99 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 import json
-from flask import Flask, send_from_directory, jsonify
+import click
+from flask import Flask, send_from_directory, current_app, g
+from flask.cli import FlaskGroup, ScriptInfo, with_appcontext
 from flask_login import LoginManager
 from werkzeug.exceptions import HTTPException
 from flask_cors import CORS
-from flask_migrate import Migrate
 from user import db, User, user_bp
 from borrowers import Borrower, borrowers_bp
 from loans import Loan, loans_bp
 from payments import Payment, payments_bp
-from salary import SalaryCalculation, salary_bp
+from salary import SalaryCalculation, OfficerCompensation, salary_bp
 from settings import SystemSetting
 from auth import auth_bp
 from admin import admin_bp
 from automation import automation_bp
 from reports import reports_bp
 from profile import profile_bp
+from exports import exports_bp
+from jobs import BackgroundJob, jobs_bp
+from installments import Installment
+from aging import LoanAgingSnapshot, PortfolioAgingSnapshot
+from vintages import VintageCohort
+from business_calendar import Holiday
+from risk_scores import BorrowerRiskScore
+from products import LoanProduct, products_bp
+from allocations import PaymentAllocation
+from penalties import PenaltyAccrual
+from events import events_bp
+from changes import ChangeEvent, ChangeConsumerOffset, changes_bp
+from reminders import ReminderMessage, reminders_bp
+from collections_sheet import collections_bp
+from reconciliation import BankStatement, StatementLine, reconciliation_bp
+from bulk_operations import BulkOperation, bulk_bp
+from audit import AuditLog, audit_bp
+from archive import ArchivedLoan, ArchivedPayment
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'lookman-loan-management-secret-key-2024'
+BASE_DIR = os.path.dirname(__file__)
 
-# Initialize CORS
-CORS(app, supports_credentials=True)
+# Configuration defaults, overridden by the config passed to create_app
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'lookman-loan-management-secret-key-2024',
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}",
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'JOB_OUTPUT_FOLDER': os.path.join(BASE_DIR, 'database', 'exports'),
+    'ANALYTICS_FOLDER': os.path.join(BASE_DIR, 'database', 'analytics'),
+    'REMINDER_SENDER': 'log',
+    'REMINDER_LOG_FILE': os.path.join(BASE_DIR, 'database', 'reminders', 'outbox.log'),
+    'AUDIT_ASYNC': True
+}
+
+# Blueprints and their URL prefixes
+BLUEPRINTS = [
+    (user_bp, '/api'),
+    (auth_bp, '/api/auth'),
+    (admin_bp, '/api/admin'),
+    (borrowers_bp, '/api/borrowers'),
+    (loans_bp, '/api/loans'),
+    (payments_bp, '/api/payments'),
+    (automation_bp, '/api/automation'),
+    (salary_bp, '/api/salary'),
+    (reports_bp, '/api/reports'),
+    (profile_bp, '/api/profile'),
+    (exports_bp, '/api/exports'),
+    (jobs_bp, '/api/jobs'),
+    (products_bp, '/api/products'),
+    (events_bp, '/api/events'),
+    (changes_bp, '/api/changes'),
+    (reminders_bp, '/api/reminders'),
+    (collections_bp, '/api/collections'),
+    (reconciliation_bp, '/api/reconciliation'),
+    (bulk_bp, '/api/admin/bulk'),
+    (audit_bp, '/api/audit')
+]
+
+# System settings created by init-db when missing: key, value, description
+DEFAULT_SETTINGS = [
+    ('default_loan_duration', '15', 'Default loan duration in days'),
+    ('default_interest_rate', '10.00', 'Default interest rate percentage'),
+    ('weekend_payment_handling', 'next_business_day', 'How to handle weekend payments'),
+    ('base_salary_default', '50000.00', 'Default base salary amount'),
+    ('commission_rate_default', '5.00', 'Default commission rate percentage'),
+    ('min_borrower_score', '0', 'Minimum borrower risk score (0-100) for a new loan, 0 to disable'),
+    ('penalty_daily_rate', '0.00', 'Daily late penalty, percent of the overdue amount'),
+    ('penalty_grace_days', '0', 'Days past due before an installment accrues penalties'),
+    ('penalty_cap_percent', '0', 'Maximum accrued penalties per loan, percent of principal, 0 for no cap'),
+    ('change_retention_days', '30', 'Days of change feed history kept before it is compacted'),
+    ('reminder_rate_per_minute', '60', 'Maximum reminder messages sent per minute'),
+    ('reminder_burst', '10', 'Reminder messages sent back to back before the per minute rate applies'),
+    ('archive_after_months', '12', 'Months after completion before a loan and its payments are archived')
+]
 
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 
@@ -37,28 +104,10 @@ login_manager.login_message = 'Please log in to access this page.'
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(admin_bp, url_prefix='/api/admin')
-app.register_blueprint(borrowers_bp, url_prefix='/api/borrowers')
-app.register_blueprint(loans_bp, url_prefix='/api/loans')
-app.register_blueprint(payments_bp, url_prefix='/api/payments')
-app.register_blueprint(automation_bp, url_prefix='/api/automation')
-app.register_blueprint(salary_bp, url_prefix='/api/salary')
-app.register_blueprint(reports_bp, url_prefix='/api/reports')
-app.register_blueprint(profile_bp, url_prefix='/api/profile')
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-migrate = Migrate(app, db)
-
-# Create tables and initialize default data
-with app.app_context():
+def init_db():
+    """Create missing tables, the default admin user and missing system settings"""
     db.create_all()
-    
+
     # Create default admin user if it doesn't exist
     admin_user = User.query.filter_by(username='admin').first()
     if not admin_user:
@@ -71,25 +120,51 @@ with app.app_context():
         db.session.add(admin_user)
         db.session.commit()
         print("Default admin user created: username='admin', password='admin123'")
-    
+
     # Initialize default system settings
-    default_settings = [
-        ('default_loan_duration', '15', 'Default loan duration in days'),
-        ('default_interest_rate', '10.00', 'Default interest rate percentage'),
-        ('weekend_payment_handling', 'next_business_day', 'How to handle weekend payments'),
-        ('base_salary_default', '50000.00', 'Default base salary amount'),
-        ('commission_rate_default', '5.00', 'Default commission rate percentage')
-    ]
-    
-    for key, value, description in default_settings:
-        existing_setting = SystemSetting.query.filter_by(setting_key=key).first()
-        if not existing_setting:
+    existing = {key for (key,) in db.session.query(SystemSetting.setting_key)}
+    for key, value, description in DEFAULT_SETTINGS:
+        if key not in existing:
             SystemSetting.set_setting(key, value, description, admin_user.id)
 
-@app.route('/user_profile.html')
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database tables and seed the admin user and default settings."""
+    init_db()
+    click.echo('Database initialized.')
+
+class MigrateGroup(click.Group):
+    """
+    Flask-Migrate's commands, set up when a `flask db` command is looked up.
+    Flask-Migrate imports alembic, which takes about as long as the rest of
+    the app, and only the CLI needs it.
+    """
+
+    def migrate_commands(self, ctx):
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            from flask_migrate import Migrate
+            Migrate(app, db)
+        from flask_migrate.cli import db as db_group
+        return db_group
+
+    def list_commands(self, ctx):
+        return self.migrate_commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.migrate_commands(ctx).get_command(ctx, name)
+
+@click.group('db', cls=MigrateGroup)
+@click.option('-x', '--x-arg', multiple=True, help='Additional arguments consumed by custom env.py scripts')
+@with_appcontext
+def db_command(x_arg):
+    """Perform database migrations."""
+    g.x_arg = x_arg
+
 def serve_user_profile():
     """Serve user profile management page"""
-    static_folder_path = app.static_folder
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
         return "Static folder not configured", 404
     
@@ -99,10 +174,8 @@ def serve_user_profile():
     else:
         return "user_profile.html not found", 404
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
         return "Static folder not configured", 404
 
@@ -115,7 +188,6 @@ def serve(path):
         else:
             return "index.html not found", 404
 
-@app.errorhandler(HTTPException)
 def handle_exception(e):
     """Return JSON instead of HTML for HTTP errors."""
     # start with the correct headers and status code from the error
@@ -129,5 +201,45 @@ def handle_exception(e):
     response.content_type = "application/json"
     return response
 
+def create_app(config=None):
+    """
+    Build the application; ``config`` overrides DEFAULT_CONFIG. Nothing here
+    touches the database, so workers start fast: create the tables and seed
+    the defaults once with `python main.py init-db`.
+    """
+    app = Flask(__name__, static_folder=os.path.join(BASE_DIR, 'static'))
+    app.config.from_mapping(DEFAULT_CONFIG)
+    if config:
+        app.config.from_mapping(config)
+
+    # Initialize CORS
+    CORS(app, supports_credentials=True)
+
+    login_manager.init_app(app)
+    db.init_app(app)
+
+    # Register blueprints
+    for blueprint, url_prefix in BLUEPRINTS:
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    app.add_url_rule('/user_profile.html', view_func=serve_user_profile)
+    app.add_url_rule('/', view_func=serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', view_func=serve)
+    app.register_error_handler(HTTPException, handle_exception)
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(db_command)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    if len(sys.argv) > 1:
+        # Commands, e.g. `python main.py init-db` or `python main.py db upgrade`
+        FlaskGroup(create_app=lambda: app).main()
+
+    # The reloader runs this block twice in debug mode, only schedule in the worker
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from automation import setup_scheduler
+        setup_scheduler(app)
+    app.run(host='0.0.0.0', port=5001, debug=True)
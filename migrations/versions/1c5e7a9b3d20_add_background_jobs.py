@@ -0,0 +1,39 @@
+"""Add background jobs
+
+Revision ID: 1c5e7a9b3d20
+Revises: a460de563207
+Create Date: 2026-10-18 09:05:17.402816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c5e7a9b3d20'
+down_revision = 'a460de563207'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'background_jobs' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('background_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('params', sa.Text(), nullable=True),
+        sa.Column('status', sa.Enum('queued', 'running', 'completed', 'failed', name='job_status'), nullable=False),
+        sa.Column('result_file', sa.String(length=255), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('requested_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['requested_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('background_jobs')
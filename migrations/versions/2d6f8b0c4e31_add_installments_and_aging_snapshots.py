@@ -0,0 +1,75 @@
+"""Add installments and portfolio aging snapshots
+
+Revision ID: 2d6f8b0c4e31
+Revises: 1c5e7a9b3d20
+Create Date: 2026-10-18 11:22:40.915233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d6f8b0c4e31'
+down_revision = '1c5e7a9b3d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the tables may already exist
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'installments' not in tables:
+        op.create_table('installments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Integer(), nullable=False),
+        sa.Column('due_date', sa.Date(), nullable=False),
+        sa.Column('expected_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('loan_id', 'day', name='uq_installments_loan_day')
+        )
+        with op.batch_alter_table('installments', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_installments_due_date'), ['due_date'], unique=False)
+
+    if 'loan_aging_snapshots' not in tables:
+        op.create_table('loan_aging_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('account_officer_id', sa.Integer(), nullable=False),
+        sa.Column('days_past_due', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.String(length=10), nullable=False),
+        sa.Column('outstanding_balance', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['account_officer_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('loan_aging_snapshots', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_loan_aging_snapshots_account_officer_id'), ['account_officer_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_loan_aging_snapshots_loan_id'), ['loan_id'], unique=False)
+
+    if 'portfolio_aging_snapshots' not in tables:
+        op.create_table('portfolio_aging_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('account_officer_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.String(length=10), nullable=False),
+        sa.Column('loan_count', sa.Integer(), nullable=False),
+        sa.Column('outstanding_balance', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['account_officer_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('snapshot_date', 'account_officer_id', 'bucket', name='uq_portfolio_aging_bucket')
+        )
+        with op.batch_alter_table('portfolio_aging_snapshots', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_portfolio_aging_snapshots_snapshot_date'), ['snapshot_date'], unique=False)
+
+
+def downgrade():
+    op.drop_table('portfolio_aging_snapshots')
+    op.drop_table('loan_aging_snapshots')
+    op.drop_table('installments')
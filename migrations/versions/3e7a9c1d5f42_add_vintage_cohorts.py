@@ -0,0 +1,34 @@
+"""Add vintage cohorts
+
+Revision ID: 3e7a9c1d5f42
+Revises: 2d6f8b0c4e31
+Create Date: 2026-10-18 13:48:06.270591
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e7a9c1d5f42'
+down_revision = '2d6f8b0c4e31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'vintage_cohorts' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('vintage_cohorts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cohort', sa.String(length=7), nullable=False),
+        sa.Column('fingerprint', sa.Text(), nullable=False),
+        sa.Column('curve', sa.Text(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cohort')
+        )
+
+
+def downgrade():
+    op.drop_table('vintage_cohorts')
@@ -0,0 +1,48 @@
+"""Add loan products
+
+Revision ID: 3f9b2c7d41e8
+Revises: 5a9c1e3f7b64
+Create Date: 2026-10-19 10:12:41.308215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9b2c7d41e8'
+down_revision = '5a9c1e3f7b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'loan_products' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('loan_products',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('frequency', sa.Enum('daily', 'weekly', 'monthly', name='product_frequency'), nullable=False),
+        sa.Column('interest_method', sa.Enum('flat', 'reducing_balance', name='product_interest_method'), nullable=False),
+        sa.Column('interest_rate', sa.Numeric(precision=5, scale=2), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('product_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_loans_product_id', 'loan_products', ['product_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_loans_product_id', type_='foreignkey')
+        batch_op.drop_column('product_id')
+
+    op.drop_table('loan_products')
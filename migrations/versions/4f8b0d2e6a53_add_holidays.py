@@ -0,0 +1,35 @@
+"""Add holidays
+
+Revision ID: 4f8b0d2e6a53
+Revises: 3e7a9c1d5f42
+Create Date: 2026-10-18 15:31:59.644102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8b0d2e6a53'
+down_revision = '3e7a9c1d5f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'holidays' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('holidays',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('holiday_date', sa.Date(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('holiday_date')
+        )
+
+
+def downgrade():
+    op.drop_table('holidays')
@@ -0,0 +1,41 @@
+"""Add borrower risk scores
+
+Revision ID: 5a9c1e3f7b64
+Revises: 4f8b0d2e6a53
+Create Date: 2026-10-18 17:09:24.835517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9c1e3f7b64'
+down_revision = '4f8b0d2e6a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'borrower_risk_scores' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('borrower_risk_scores',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('borrower_id', sa.Integer(), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.Column('on_time_count', sa.Integer(), nullable=False),
+        sa.Column('days_late_total', sa.Integer(), nullable=False),
+        sa.Column('partial_count', sa.Integer(), nullable=False),
+        sa.Column('loan_count', sa.Integer(), nullable=False),
+        sa.Column('completed_loans', sa.Integer(), nullable=False),
+        sa.Column('defaulted_loans', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Numeric(precision=5, scale=2), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['borrower_id'], ['borrowers.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('borrower_id')
+        )
+
+
+def downgrade():
+    op.drop_table('borrower_risk_scores')
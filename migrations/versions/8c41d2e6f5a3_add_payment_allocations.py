@@ -0,0 +1,58 @@
+"""Add payment allocations
+
+Revision ID: 8c41d2e6f5a3
+Revises: 3f9b2c7d41e8
+Create Date: 2026-10-19 13:27:05.914402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2e6f5a3'
+down_revision = '3f9b2c7d41e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the tables may already exist
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'installments' in tables and 'paid_amount' not in [
+            column['name'] for column in inspector.get_columns('installments')]:
+        with op.batch_alter_table('installments', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('paid_amount', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.alter_column('payment_day', existing_type=sa.Integer(), nullable=True)
+
+    if 'payment_allocations' not in tables:
+        op.create_table('payment_allocations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('payment_id', sa.Integer(), nullable=False),
+        sa.Column('installment_id', sa.Integer(), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['installment_id'], ['installments.id'], ),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+        sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('payment_allocations', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_payment_allocations_installment_id'), ['installment_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_payment_allocations_loan_id'), ['loan_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_payment_allocations_payment_id'), ['payment_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('payment_allocations')
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.alter_column('payment_day', existing_type=sa.Integer(), nullable=False)
+
+    with op.batch_alter_table('installments', schema=None) as batch_op:
+        batch_op.drop_column('paid_amount')
@@ -0,0 +1,63 @@
+"""Add bank statements
+
+Revision ID: a3d5f7b9c1e2
+Revises: f1b4d8e27a95
+Create Date: 2026-10-19 21:02:44.318905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5f7b9c1e2'
+down_revision = 'f1b4d8e27a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the tables may already exist
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'bank_statements' not in tables:
+        op.create_table('bank_statements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('line_count', sa.Integer(), nullable=False),
+        sa.Column('uploaded_by', sa.Integer(), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'statement_lines' not in tables:
+        op.create_table('statement_lines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('statement_id', sa.Integer(), nullable=False),
+        sa.Column('line_number', sa.Integer(), nullable=False),
+        sa.Column('transaction_date', sa.Date(), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('account_number', sa.String(length=10), nullable=True),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('reference', sa.String(length=255), nullable=True),
+        sa.Column('line_hash', sa.String(length=40), nullable=False),
+        sa.Column('status', sa.Enum('matched', 'review', 'unmatched', 'duplicate', 'posted', 'ignored', name='statement_line_status'), nullable=False),
+        sa.Column('candidates', sa.Text(), nullable=False),
+        sa.Column('note', sa.String(length=255), nullable=True),
+        sa.Column('loan_id', sa.Integer(), nullable=True),
+        sa.Column('payment_id', sa.Integer(), nullable=True),
+        sa.Column('resolved_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+        sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+        sa.ForeignKeyConstraint(['resolved_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['statement_id'], ['bank_statements.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('statement_lines', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_statement_lines_line_hash'), ['line_hash'], unique=False)
+            batch_op.create_index('ix_statement_lines_queue', ['status', 'statement_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('statement_lines')
+    op.drop_table('bank_statements')
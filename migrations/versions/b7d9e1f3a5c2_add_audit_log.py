@@ -0,0 +1,42 @@
+"""Add the audit log
+
+Revision ID: b7d9e1f3a5c2
+Revises: c8e2a4d6f1b3
+Create Date: 2026-10-19 23:41:52.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d9e1f3a5c2'
+down_revision = 'c8e2a4d6f1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'audit_log' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('audit_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=50), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.Enum('insert', 'update', 'delete', name='audit_operation'), nullable=False),
+        sa.Column('changes', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('source', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('audit_log', schema=None) as batch_op:
+            batch_op.create_index('ix_audit_log_entity', ['entity', 'entity_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_audit_log_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('audit_log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_audit_log_user_id'))
+        batch_op.drop_index('ix_audit_log_entity')
+    op.drop_table('audit_log')
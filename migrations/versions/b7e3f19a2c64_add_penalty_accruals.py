@@ -0,0 +1,48 @@
+"""Add penalty accruals
+
+Revision ID: b7e3f19a2c64
+Revises: 8c41d2e6f5a3
+Create Date: 2026-10-19 15:02:48.531760
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f19a2c64'
+down_revision = '8c41d2e6f5a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('penalty_amount', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    if 'penalty_accruals' not in tables:
+        op.create_table('penalty_accruals',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('accrual_date', sa.Date(), nullable=False),
+        sa.Column('overdue_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('overdue_installments', sa.Integer(), nullable=False),
+        sa.Column('daily_rate', sa.Numeric(precision=5, scale=2), nullable=False),
+        sa.Column('penalty_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('loan_id', 'accrual_date', name='uq_penalty_accruals_loan_date')
+        )
+        with op.batch_alter_table('penalty_accruals', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_penalty_accruals_accrual_date'), ['accrual_date'], unique=False)
+
+
+def downgrade():
+    op.drop_table('penalty_accruals')
+
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_column('penalty_amount')
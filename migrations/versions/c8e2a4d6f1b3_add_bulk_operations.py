@@ -0,0 +1,47 @@
+"""Add bulk operations and the written off loan status
+
+Revision ID: c8e2a4d6f1b3
+Revises: a3d5f7b9c1e2
+Create Date: 2026-10-19 22:14:07.652391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a4d6f1b3'
+down_revision = 'a3d5f7b9c1e2'
+branch_labels = None
+depends_on = None
+
+OLD_STATUSES = sa.Enum('active', 'completed', 'overdue', 'defaulted', name='loan_status')
+NEW_STATUSES = sa.Enum('active', 'completed', 'overdue', 'defaulted', 'written_off', name='loan_status')
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'bulk_operations' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('bulk_operations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.Enum('reassign', 'loan_status', name='bulk_operation'), nullable=False),
+        sa.Column('parameters', sa.Text(), nullable=False),
+        sa.Column('loan_count', sa.Integer(), nullable=False),
+        sa.Column('borrower_count', sa.Integer(), nullable=False),
+        sa.Column('performed_by', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['performed_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    # SQLite stores the status as plain text, other databases need the new value added
+    if op.get_bind().dialect.name != 'sqlite':
+        with op.batch_alter_table('loans', schema=None) as batch_op:
+            batch_op.alter_column('status', existing_type=OLD_STATUSES, type_=NEW_STATUSES, existing_nullable=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        with op.batch_alter_table('loans', schema=None) as batch_op:
+            batch_op.alter_column('status', existing_type=NEW_STATUSES, type_=OLD_STATUSES, existing_nullable=True)
+    op.drop_table('bulk_operations')
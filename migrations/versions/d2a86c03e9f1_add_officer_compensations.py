@@ -0,0 +1,43 @@
+"""Add officer compensations
+
+Revision ID: d2a86c03e9f1
+Revises: b7e3f19a2c64
+Create Date: 2026-10-19 16:40:12.207934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a86c03e9f1'
+down_revision = 'b7e3f19a2c64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'officer_compensations' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('officer_compensations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('base_salary', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('commission_rate', sa.Numeric(precision=5, scale=2), nullable=True),
+        sa.Column('updated_by', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id')
+        )
+
+    with op.batch_alter_table('salary_calculations', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_salary_calculations_user_period', ['user_id', 'calculation_period'])
+
+
+def downgrade():
+    with op.batch_alter_table('salary_calculations', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_salary_calculations_user_period', type_='unique')
+
+    op.drop_table('officer_compensations')
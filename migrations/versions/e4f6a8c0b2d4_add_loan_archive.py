@@ -0,0 +1,137 @@
+"""Add archive tables for completed loans and their payments, index payments by loan
+
+Revision ID: e4f6a8c0b2d4
+Revises: b7d9e1f3a5c2
+Create Date: 2026-10-20 09:12:33.508117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4f6a8c0b2d4'
+down_revision = 'b7d9e1f3a5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Archiving moves payments by loan; so do the per-loan payment reads
+    payment_indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('payments')}
+    if 'ix_payments_loan_id' not in payment_indexes:
+        with op.batch_alter_table('payments', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_payments_loan_id'), ['loan_id'], unique=False)
+
+    # The app creates missing tables on start-up, so the tables may already exist
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'archived_loans' not in existing:
+        op.create_table('archived_loans',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('borrower_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('account_officer_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('principal_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('interest_rate', sa.Numeric(precision=5, scale=2), autoincrement=False, nullable=True),
+        sa.Column('interest_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=True),
+        sa.Column('expenses', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=True),
+        sa.Column('penalty_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('daily_repayment', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('loan_duration_days', sa.Integer(), autoincrement=False, nullable=True),
+        sa.Column('start_date', sa.Date(), autoincrement=False, nullable=False),
+        sa.Column('expected_end_date', sa.Date(), autoincrement=False, nullable=False),
+        sa.Column('actual_end_date', sa.Date(), autoincrement=False, nullable=True),
+        sa.Column('status', sa.Enum('active', 'completed', 'overdue', 'defaulted', 'written_off', name='loan_status'), autoincrement=False, nullable=True),
+        sa.Column('created_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('updated_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('loan_purpose', sa.String(length=100), autoincrement=False, nullable=True),
+        sa.Column('loan_term', sa.Integer(), autoincrement=False, nullable=True),
+        sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=True),
+        sa.Column('has_collateral', sa.Boolean(), autoincrement=False, nullable=True),
+        sa.Column('collateral_type', sa.String(length=50), autoincrement=False, nullable=True),
+        sa.Column('collateral_value', sa.Numeric(precision=15, scale=2), autoincrement=False, nullable=True),
+        sa.Column('collateral_description', sa.Text(), autoincrement=False, nullable=True),
+        sa.Column('guarantor_name', sa.String(length=100), autoincrement=False, nullable=True),
+        sa.Column('guarantor_phone', sa.String(length=20), autoincrement=False, nullable=True),
+        sa.Column('guarantor_address', sa.Text(), autoincrement=False, nullable=True),
+        sa.Column('guarantor_relationship', sa.String(length=50), autoincrement=False, nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'archived_loans' not in existing:
+        op.create_index(op.f('ix_archived_loans_account_officer_id'), 'archived_loans', ['account_officer_id'], unique=False)
+        op.create_index(op.f('ix_archived_loans_borrower_id'), 'archived_loans', ['borrower_id'], unique=False)
+        op.create_index(op.f('ix_archived_loans_product_id'), 'archived_loans', ['product_id'], unique=False)
+    if 'archived_installments' not in existing:
+        op.create_table('archived_installments',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('loan_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('day', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('due_date', sa.Date(), autoincrement=False, nullable=False),
+        sa.Column('expected_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('paid_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('created_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'archived_installments' not in existing:
+        op.create_index(op.f('ix_archived_installments_loan_id'), 'archived_installments', ['loan_id'], unique=False)
+    if 'archived_payments' not in existing:
+        op.create_table('archived_payments',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('loan_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('payment_date', sa.Date(), autoincrement=False, nullable=False),
+        sa.Column('expected_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('actual_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=True),
+        sa.Column('payment_day', sa.Integer(), autoincrement=False, nullable=True),
+        sa.Column('is_weekend_adjusted', sa.Boolean(), autoincrement=False, nullable=True),
+        sa.Column('recorded_by', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('notes', sa.Text(), autoincrement=False, nullable=True),
+        sa.Column('created_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('updated_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'archived_payments' not in existing:
+        op.create_index(op.f('ix_archived_payments_loan_id'), 'archived_payments', ['loan_id'], unique=False)
+        op.create_index(op.f('ix_archived_payments_recorded_by'), 'archived_payments', ['recorded_by'], unique=False)
+    if 'archived_payment_allocations' not in existing:
+        op.create_table('archived_payment_allocations',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('payment_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('installment_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('loan_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('created_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'archived_payment_allocations' not in existing:
+        op.create_index(op.f('ix_archived_payment_allocations_installment_id'), 'archived_payment_allocations', ['installment_id'], unique=False)
+        op.create_index(op.f('ix_archived_payment_allocations_loan_id'), 'archived_payment_allocations', ['loan_id'], unique=False)
+        op.create_index(op.f('ix_archived_payment_allocations_payment_id'), 'archived_payment_allocations', ['payment_id'], unique=False)
+    if 'archived_penalty_accruals' not in existing:
+        op.create_table('archived_penalty_accruals',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('loan_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('accrual_date', sa.Date(), autoincrement=False, nullable=False),
+        sa.Column('overdue_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('overdue_installments', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('daily_rate', sa.Numeric(precision=5, scale=2), autoincrement=False, nullable=False),
+        sa.Column('penalty_amount', sa.Numeric(precision=10, scale=2), autoincrement=False, nullable=False),
+        sa.Column('created_at', sa.DateTime(), autoincrement=False, nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'archived_penalty_accruals' not in existing:
+        op.create_index(op.f('ix_archived_penalty_accruals_loan_id'), 'archived_penalty_accruals', ['loan_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('archived_penalty_accruals')
+    op.drop_table('archived_payment_allocations')
+    op.drop_table('archived_payments')
+    op.drop_table('archived_installments')
+    op.drop_table('archived_loans')
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payments_loan_id'))
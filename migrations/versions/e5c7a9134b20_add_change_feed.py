@@ -0,0 +1,49 @@
+"""Add change feed
+
+Revision ID: e5c7a9134b20
+Revises: d2a86c03e9f1
+Create Date: 2026-10-19 18:11:53.664018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c7a9134b20'
+down_revision = 'd2a86c03e9f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the tables may already exist
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'change_events' not in tables:
+        op.create_table('change_events',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=50), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('operation', sa.Enum('insert', 'update', 'delete', name='change_operation'), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True
+        )
+        with op.batch_alter_table('change_events', schema=None) as batch_op:
+            batch_op.create_index('ix_change_events_entity', ['entity', 'entity_id'], unique=False)
+            batch_op.create_index(batch_op.f('ix_change_events_created_at'), ['created_at'], unique=False)
+
+    if 'change_consumer_offsets' not in tables:
+        op.create_table('change_consumer_offsets',
+        sa.Column('consumer', sa.String(length=100), nullable=False),
+        sa.Column('last_seq', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('consumer')
+        )
+
+
+def downgrade():
+    op.drop_table('change_consumer_offsets')
+    op.drop_table('change_events')
@@ -0,0 +1,48 @@
+"""Add reminder messages
+
+Revision ID: f1b4d8e27a95
+Revises: e5c7a9134b20
+Create Date: 2026-10-19 19:36:20.481157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b4d8e27a95'
+down_revision = 'e5c7a9134b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app creates missing tables on start-up, so the table may already exist
+    if 'reminder_messages' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('reminder_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('loan_id', sa.Integer(), nullable=False),
+        sa.Column('borrower_id', sa.Integer(), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('kind', sa.Enum('due', 'missed', name='reminder_kind'), nullable=False),
+        sa.Column('reminder_date', sa.Date(), nullable=False),
+        sa.Column('installment_day', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('status', sa.Enum('queued', 'sent', 'failed', name='reminder_status'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['borrower_id'], ['borrowers.id'], ),
+        sa.ForeignKeyConstraint(['loan_id'], ['loans.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('loan_id', 'reminder_date', name='uq_reminder_messages_loan_date')
+        )
+        with op.batch_alter_table('reminder_messages', schema=None) as batch_op:
+            batch_op.create_index('ix_reminder_messages_queue', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_table('reminder_messages')
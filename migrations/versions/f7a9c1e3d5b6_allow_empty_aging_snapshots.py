@@ -0,0 +1,27 @@
+"""Allow a portfolio aging row without an officer, marking a day without open loans
+
+Revision ID: f7a9c1e3d5b6
+Revises: e4f6a8c0b2d4
+Create Date: 2026-10-21 10:04:51.274630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a9c1e3d5b6'
+down_revision = 'e4f6a8c0b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('portfolio_aging_snapshots', schema=None) as batch_op:
+        batch_op.alter_column('account_officer_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    op.execute('DELETE FROM portfolio_aging_snapshots WHERE account_officer_id IS NULL')
+    with op.batch_alter_table('portfolio_aging_snapshots', schema=None) as batch_op:
+        batch_op.alter_column('account_officer_id', existing_type=sa.Integer(), nullable=False)
@@ -2,49 +2,153 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from user import db
 from loans import Loan
+from installments import Installment, backfill_installments, write_installments
+from business_calendar import get_business_calendar
 from auth import account_officer_required, admin_required
 from datetime import datetime, date
 from decimal import Decimal
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from sqlalchemy.orm import selectinload
 
 payments_bp = Blueprint('payments', __name__)
 
+def build_payments_query(args, payment_model=None, loan_model=None):
+    """Build the payments query for the current user from list filters, on
+    ``payment_model`` and ``loan_model`` (Payment and Loan, or their archives).
+
+    Raises ValueError if ``payment_date`` is not in YYYY-MM-DD format.
+    """
+    payment_model, loan_model = payment_model or Payment, loan_model or Loan
+
+    # Get query parameters for filtering
+    loan_id = args.get('loan_id')
+    payment_date_str = args.get('payment_date')
+    
+    # Base query
+    query = payment_model.query.join(loan_model, payment_model.loan_id == loan_model.id)
+    
+    # Filter by user role
+    if not current_user.is_admin():
+        query = query.filter(loan_model.account_officer_id == current_user.id)
+    
+    # Apply additional filters
+    if loan_id:
+        query = query.filter(payment_model.loan_id == loan_id)
+    
+    if payment_date_str:
+        payment_date = datetime.strptime(payment_date_str, '%Y-%m-%d').date()
+        query = query.filter(payment_model.payment_date == payment_date)
+    
+    return query
+
+def record_payments(entries, recorded_by):
+    """
+    Record many payments at once, e.g. from a bank statement. Each entry is
+    a dict with loan_id, payment_date, actual_amount and optionally notes.
+    Payments are applied in the order given, each to its loan's oldest
+    outstanding installments as record_payment does, with one query for
+    the loans, one for their open installments, one allocation pass per
+    loan and a single flush.
+    Returns the new payments; the caller commits.
+    """
+    from allocations import PaymentAllocation, apply_payments, split_allocations
+
+    entries = list(entries)
+    loan_ids = {entry['loan_id'] for entry in entries}
+    loans = {loan.id: loan for loan in Loan.query.filter(Loan.id.in_(loan_ids))}
+    missing = loan_ids - set(loans)
+    if missing:
+        raise ValueError(f'Loan {min(missing)} not found')
+
+    # Loans created before installments were stored get them now
+    for loan in Loan.query.filter(
+            Loan.id.in_(loan_ids),
+            ~db.session.query(Installment.id).filter(Installment.loan_id == Loan.id).exists()):
+        write_installments(loan)
+
+    installments = {}
+    for installment in Installment.query.filter(
+            Installment.loan_id.in_(loan_ids),
+            Installment.paid_amount < Installment.expected_amount).order_by(Installment.loan_id, Installment.day):
+        installments.setdefault(installment.loan_id, []).append(installment)
+
+    calendar = get_business_calendar()
+    payments, by_loan = [], {}
+    for entry in entries:
+        loan = loans[entry['loan_id']]
+        payment = Payment(
+            loan_id=loan.id,
+            payment_date=entry['payment_date'],
+            expected_amount=loan.daily_repayment,
+            actual_amount=Decimal(str(entry['actual_amount'])),
+            is_weekend_adjusted=not calendar.is_business_day(entry['payment_date']),
+            recorded_by=recorded_by,
+            notes=entry.get('notes')
+        )
+        payments.append(payment)
+        by_loan.setdefault(loan.id, []).append(payment)
+
+    # Allocate each loan's payments in one pass over its open installments
+    allocations = []
+    for loan_id, loan_payments in by_loan.items():
+        open_installments = installments.get(loan_id, [])
+        days = {installment.id: installment.day for installment in open_installments}
+        rows = split_allocations(loan_payments, apply_payments(loan_payments, open_installments))
+
+        # A payment is for the oldest installment it pays; one that pays none, for the next still unpaid
+        next_day = next((installment.day for installment in open_installments
+                         if installment.paid_amount < installment.expected_amount), None)
+        for payment, payment_rows in reversed(list(zip(loan_payments, rows))):
+            if payment_rows:
+                next_day = days[payment_rows[0]['installment_id']]
+            payment.payment_day = next_day
+            allocations.append((payment, payment_rows))
+
+    db.session.add_all(payments)
+    db.session.flush()
+    db.session.bulk_insert_mappings(PaymentAllocation, [
+        dict(row, payment_id=payment.id) for payment, rows in allocations for row in rows
+    ])
+
+    # Reload the loans with their payments, new ones included, to update their statuses
+    for loan in Loan.query.options(selectinload(Loan.payments)).filter(
+            Loan.id.in_(loan_ids)).execution_options(populate_existing=True):
+        loan.update_status()
+    return payments
+
 @payments_bp.route('/', methods=['GET'])
 @login_required
 @account_officer_required
 def get_payments():
-    """Get all payments (filtered by user role and optional filters)"""
+    """
+    Get all payments (filtered by user role and optional filters). Payments
+    of archived loans are left out unless ?include_archived=1.
+    """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
 
-        # Get query parameters for filtering
-        loan_id = request.args.get('loan_id')
-        payment_date_str = request.args.get('payment_date')
-        
-        # Base query
-        query = Payment.query.join(Loan)
-        
-        # Filter by user role
-        if not current_user.is_admin():
-            query = query.filter(Loan.account_officer_id == current_user.id)
-        
-        # Apply additional filters
-        if loan_id:
-            query = query.filter(Payment.loan_id == loan_id)
-        
-        if payment_date_str:
-            try:
-                payment_date = datetime.strptime(payment_date_str, '%Y-%m-%d').date()
-                query = query.filter(Payment.payment_date == payment_date)
-            except ValueError:
-                return jsonify({'error': 'Invalid payment date format. Use YYYY-MM-DD'}), 400
-        
-        payments = query.order_by(Payment.payment_date.desc()).paginate(page=page, per_page=per_page)
+        include_archived = request.args.get('include_archived') == '1'
+
+        try:
+            query = build_payments_query(request.args)
+            if include_archived:
+                from archive import ArchivedLoan, ArchivedPayment, paginate_with_archive
+                archived_query = build_payments_query(request.args, ArchivedPayment, ArchivedLoan)
+        except ValueError:
+            return jsonify({'error': 'Invalid payment date format. Use YYYY-MM-DD'}), 400
         
         payment_schema = PaymentSchema(many=True)
+        if include_archived:
+            payments = paginate_with_archive(query, archived_query, Payment, page, per_page, '-payment_date', '-id')
+            dumped = payment_schema.dump(payments.items)
+            items = [dict(item, archived=row.archived) for item, row in zip(dumped, payments.items)]
+        else:
+            payments = query.order_by(Payment.payment_date.desc()).paginate(page=page, per_page=per_page)
+            items = payment_schema.dump(payments.items)
+
         return jsonify({
-            'payments': payment_schema.dump(payments.items),
+            'payments': items,
             'total_pages': payments.pages,
             'current_page': payments.page,
             'total_items': payments.total
@@ -57,6 +161,7 @@ def get_payments():
 @account_officer_required
 def record_payment():
     """Record a new payment"""
+    from allocations import allocate_payment, oldest_outstanding_day, payment_allocations
     try:
         data = request.get_json()
         loan_id = data.get('loan_id')
@@ -75,7 +180,7 @@ def record_payment():
         if not payment_date_str:
             return jsonify({'error': 'Payment date is required'}), 400
         
-        if not payment_day or payment_day < 1:
+        if payment_day is not None and payment_day < 1:
             return jsonify({'error': 'Payment day must be 1 or greater'}), 400
         
         # Validate loan exists and user has permission
@@ -89,20 +194,28 @@ def record_payment():
         except ValueError:
             return jsonify({'error': 'Invalid payment date format. Use YYYY-MM-DD'}), 400
         
-        # Check if payment already exists for this loan and day
-        existing_payment = Payment.query.filter_by(
-            loan_id=loan_id, 
-            payment_day=payment_day
-        ).first()
+        # Loans created before installments were stored get them now
+        if not Installment.query.filter_by(loan_id=loan.id).first():
+            write_installments(loan)
         
-        if existing_payment:
-            return jsonify({'error': f'Payment for day {payment_day} already exists'}), 400
+        # Check if payment already exists for this loan and day
+        if payment_day is not None:
+            existing_payment = Payment.query.filter_by(
+                loan_id=loan_id, 
+                payment_day=payment_day
+            ).first()
+            
+            if existing_payment:
+                return jsonify({'error': f'Payment for day {payment_day} already exists'}), 400
+        else:
+            # Without a day the payment is recorded against the oldest unpaid installment
+            payment_day = oldest_outstanding_day(loan.id)
         
         # Calculate expected amount (daily repayment)
         expected_amount = loan.daily_repayment
         
-        # Check for weekend adjustment
-        is_weekend_adjusted = payment_date.weekday() >= 5  # Saturday=5, Sunday=6
+        # Check for weekend/holiday adjustment
+        is_weekend_adjusted = not get_business_calendar().is_business_day(payment_date)
         
         # Create new payment
         new_payment = Payment(
@@ -117,6 +230,10 @@ def record_payment():
         )
         
         db.session.add(new_payment)
+        db.session.flush()
+        
+        # Apply the payment to the outstanding installments, oldest first
+        allocate_payment(new_payment)
         
         # Update loan status based on payments
         loan.update_status()
@@ -126,7 +243,8 @@ def record_payment():
         payment_schema = PaymentSchema()
         return jsonify({
             'message': 'Payment recorded successfully',
-            'payment': payment_schema.dump(new_payment)
+            'payment': payment_schema.dump(new_payment),
+            'allocations': payment_allocations(new_payment.id)
         }), 201
         
     except Exception as e:
@@ -156,6 +274,7 @@ def get_payment(payment_id):
 @login_required
 def update_payment(payment_id):
     """Update a payment"""
+    from allocations import reallocate_loans
     try:
         payment = Payment.query.get_or_404(payment_id)
         
@@ -176,6 +295,11 @@ def update_payment(payment_id):
         
         payment.updated_at = datetime.utcnow()
         
+        # A changed amount shifts the allocations of the loan's later payments
+        if 'actual_amount' in data:
+            db.session.flush()
+            reallocate_loans([payment.loan_id])
+        
         # Update loan status based on updated payments
         payment.loan.update_status()
         
@@ -196,6 +320,7 @@ def update_payment(payment_id):
 @admin_required
 def delete_payment(payment_id):
     """Delete a payment"""
+    from allocations import reallocate_loans
     try:
         payment = Payment.query.get_or_404(payment_id)
         
@@ -206,6 +331,10 @@ def delete_payment(payment_id):
         loan = payment.loan
         
         db.session.delete(payment)
+        db.session.flush()
+        
+        # Reapply the remaining payments
+        reallocate_loans([loan.id])
         
         # Update loan status after deleting payment
         loan.update_status()
@@ -257,46 +386,36 @@ def get_today_payments():
 @login_required
 @account_officer_required
 def get_overdue_payments():
-    """Get overdue payments (expected payments not made)"""
+    """Get overdue payments (installments due before today and not paid in full)"""
     try:
+        from borrowers import Borrower
         today = date.today()
-        
-        # Get all active loans
-        query = Loan.query.filter_by(status='active')
+        backfill_installments()
+        
+        query = db.session.query(Installment, Borrower.name).join(
+            Loan, Installment.loan_id == Loan.id
+        ).join(Borrower, Loan.borrower_id == Borrower.id).filter(
+            Loan.status == 'active',
+            Installment.due_date < today,
+            Installment.paid_amount < Installment.expected_amount
+        )
         
         # Filter by user role
         if not current_user.is_admin():
-            query = query.filter_by(account_officer_id=current_user.id)
-        
-        active_loans = query.all()
-        overdue_info = []
+            query = query.filter(Loan.account_officer_id == current_user.id)
         
-        for loan in active_loans:
-            # Get payment schedule
-            schedule = loan.get_payment_schedule()
-            
-            for day_info in schedule:
-                payment_date = day_info['date']
-                payment_day = day_info['day']
-                
-                # Check if this payment date has passed
-                if payment_date < today:
-                    # Check if payment was made
-                    payment = Payment.query.filter_by(
-                        loan_id=loan.id,
-                        payment_day=payment_day
-                    ).first()
-                    
-                    if not payment or payment.actual_amount < payment.expected_amount:
-                        overdue_info.append({
-                            'loan_id': loan.id,
-                            'borrower_name': loan.borrower.name,
-                            'payment_day': payment_day,
-                            'expected_date': payment_date.isoformat(),
-                            'expected_amount': float(loan.daily_repayment),
-                            'actual_amount': float(payment.actual_amount) if payment else 0,
-                            'days_overdue': (today - payment_date).days
-                        })
+        overdue_info = [
+            {
+                'loan_id': installment.loan_id,
+                'borrower_name': borrower_name,
+                'payment_day': installment.day,
+                'expected_date': installment.due_date.isoformat(),
+                'expected_amount': float(installment.expected_amount),
+                'actual_amount': float(installment.paid_amount),
+                'days_overdue': (today - installment.due_date).days
+            }
+            for installment, borrower_name in query.order_by(Installment.due_date, Installment.loan_id)
+        ]
         
         return jsonify({
             'overdue_payments': overdue_info,
@@ -305,17 +424,16 @@ def get_overdue_payments():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-
 # Model Definition
 class Payment(db.Model):
     __tablename__ = 'payments'
     
     id = db.Column(db.Integer, primary_key=True)
-    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False, index=True)
     payment_date = db.Column(db.Date, nullable=False)
     expected_amount = db.Column(db.Numeric(10, 2), nullable=False)
     actual_amount = db.Column(db.Numeric(10, 2), default=0.00)
-    payment_day = db.Column(db.Integer, nullable=False)
+    payment_day = db.Column(db.Integer)  # Oldest installment the payment was applied to
     is_weekend_adjusted = db.Column(db.Boolean, default=False)
     recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     notes = db.Column(db.Text)
@@ -0,0 +1,198 @@
+from user import db
+from loans import Loan
+from borrowers import Borrower
+from installments import Installment, backfill_installments
+from settings import SystemSetting
+from changes import record_changes
+from cache import mark_stale
+from events import resync_on_commit
+import audit
+from pricing import to_cents, to_rate_units, interest_cents, from_cents
+from sqlalchemy import func, update, bindparam
+from datetime import datetime, date, timedelta
+
+import numpy as np
+
+# Settings the accrual reads, with their defaults
+PENALTY_SETTINGS = {
+    'penalty_daily_rate': '0.00',
+    'penalty_grace_days': '0',
+    'penalty_cap_percent': '0'
+}
+
+def penalty_settings():
+    """Daily penalty rate (percent of the overdue amount), grace days and cap (percent of principal, 0 for none)"""
+    values = {key: SystemSetting.get_setting(key, default) for key, default in PENALTY_SETTINGS.items()}
+    return {
+        'daily_rate': float(values['penalty_daily_rate']),
+        'grace_days': int(values['penalty_grace_days']),
+        'cap_percent': float(values['penalty_cap_percent'])
+    }
+
+def overdue_balances_query(as_of, grace_days):
+    """
+    Per loan, the unpaid amount and count of installments more than
+    ``grace_days`` past due on ``as_of``, for active and overdue loans not yet
+    accrued for that date
+    """
+    cutoff = as_of - timedelta(days=grace_days)
+    overdue = db.session.query(
+        Installment.loan_id,
+        func.sum(Installment.expected_amount - Installment.paid_amount).label('overdue_amount'),
+        func.count(Installment.id).label('overdue_installments')
+    ).filter(
+        Installment.due_date < cutoff,
+        Installment.paid_amount < Installment.expected_amount
+    ).group_by(Installment.loan_id).subquery()
+
+    already_accrued = db.session.query(PenaltyAccrual.id).filter(
+        PenaltyAccrual.loan_id == Loan.id,
+        PenaltyAccrual.accrual_date == as_of
+    ).exists()
+
+    return db.session.query(
+        Loan.id,
+        Loan.account_officer_id,
+        Borrower.name,
+        Loan.principal_amount,
+        Loan.penalty_amount,
+        overdue.c.overdue_amount,
+        overdue.c.overdue_installments
+    ).join(
+        overdue, overdue.c.loan_id == Loan.id
+    ).join(
+        Borrower, Loan.borrower_id == Borrower.id
+    ).filter(
+        Loan.status.in_(['active', 'overdue']),
+        ~already_accrued
+    ).order_by(Loan.id)
+
+def compute_penalties(overdue_amounts, principal_amounts, accrued_amounts, daily_rate, cap_percent):
+    """
+    One day's penalty per loan, in cents: the daily rate on the overdue
+    amount, limited so a loan's accrued penalties never exceed the cap
+    """
+    penalties = interest_cents(to_cents(overdue_amounts), to_rate_units(daily_rate))
+    if cap_percent:
+        room = interest_cents(to_cents(principal_amounts), to_rate_units(cap_percent)) - to_cents(accrued_amounts)
+        penalties = np.minimum(penalties, np.maximum(room, 0))
+    return penalties
+
+def accrue_penalties(as_of=None, dry_run=False, officer_id=None):
+    """
+    Accrue one day of penalties on every loan with overdue installments in
+    a single pass: one query for the overdue balances, one bulk insert of
+    accrual rows and one bulk update of the loans' penalty balances. A loan
+    is accrued at most once per date, so reruns are safe. With ``dry_run``
+    the report is returned without writing anything.
+    """
+    as_of = as_of or date.today()
+    settings = penalty_settings()
+    backfill_installments()
+
+    query = overdue_balances_query(as_of, settings['grace_days'])
+    if officer_id:
+        query = query.filter(Loan.account_officer_id == officer_id)
+    rows = query.all()
+
+    report = {
+        'as_of': as_of.isoformat(),
+        'dry_run': dry_run,
+        'settings': settings,
+        'loans': 0,
+        'total_penalty': 0.0,
+        'accruals': []
+    }
+    if not rows or not settings['daily_rate']:
+        return report
+
+    loan_ids, officers, names, principals, accrued, overdue_amounts, counts = zip(*rows)
+    accrued = [value or 0 for value in accrued]
+    overdue_amounts = [from_cents(cents) for cents in to_cents(overdue_amounts)]
+    penalties = compute_penalties(overdue_amounts, principals, accrued,
+                                  settings['daily_rate'], settings['cap_percent'])
+
+    accruals = [
+        {
+            'loan_id': loan_id,
+            'accrual_date': as_of,
+            'overdue_amount': overdue_amount,
+            'overdue_installments': count,
+            'daily_rate': settings['daily_rate'],
+            'penalty_amount': from_cents(penalty)
+        }
+        for loan_id, overdue_amount, count, penalty in zip(loan_ids, overdue_amounts, counts, penalties)
+        if penalty > 0
+    ]
+
+    report['loans'] = len(accruals)
+    report['total_penalty'] = round(float(penalties.sum()) / 100, 2)
+    report['accruals'] = [
+        {
+            'loan_id': loan_id,
+            'borrower_name': name,
+            'account_officer_id': officer,
+            'overdue_amount': float(overdue_amount),
+            'overdue_installments': count,
+            'penalty_amount': penalty / 100,
+            'penalty_balance': float(previous + from_cents(penalty))
+        }
+        for loan_id, officer, name, previous, overdue_amount, count, penalty in zip(
+            loan_ids, officers, names, accrued, overdue_amounts, counts, penalties.tolist())
+        if penalty > 0
+    ]
+    if dry_run or not accruals:
+        return report
+
+    # The unique (loan, date) constraint stops a concurrent run from accruing twice
+    db.session.bulk_insert_mappings(PenaltyAccrual, accruals)
+    db.session.execute(
+        update(Loan.__table__).where(Loan.__table__.c.id == bindparam('accrued_loan_id')).values(
+            penalty_amount=Loan.__table__.c.penalty_amount + bindparam('accrued_penalty', type_=db.Numeric(10, 2)),
+            updated_at=datetime.utcnow()
+        ),
+        [{'accrued_loan_id': row['loan_id'], 'accrued_penalty': row['penalty_amount']} for row in accruals]
+    )
+    record_changes(Loan, [row['loan_id'] for row in accruals])
+    balances = dict(zip(loan_ids, accrued))
+    audit.record(Loan, {
+        row['loan_id']: {'penalty_amount': (balances[row['loan_id']], balances[row['loan_id']] + row['penalty_amount'])}
+        for row in accruals
+    })
+    resync_on_commit(db.session, {officer for officer, penalty in zip(officers, penalties.tolist()) if penalty > 0})
+    mark_stale(db.session, Loan)
+    db.session.commit()
+    return report
+
+
+# Model Definition
+class PenaltyAccrual(db.Model):
+    __tablename__ = 'penalty_accruals'
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'accrual_date', name='uq_penalty_accruals_loan_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
+    accrual_date = db.Column(db.Date, nullable=False, index=True)
+    overdue_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    overdue_installments = db.Column(db.Integer, nullable=False)
+    daily_rate = db.Column(db.Numeric(5, 2), nullable=False)
+    penalty_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    loan = db.relationship('Loan', backref=db.backref('penalty_accruals', lazy=True, cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'loan_id': self.loan_id,
+            'accrual_date': self.accrual_date.isoformat(),
+            'overdue_amount': float(self.overdue_amount),
+            'overdue_installments': self.overdue_installments,
+            'daily_rate': float(self.daily_rate),
+            'penalty_amount': float(self.penalty_amount)
+        }
+
+    def __repr__(self):
+        return f'<PenaltyAccrual Loan {self.loan_id} - {self.accrual_date} - {self.penalty_amount}>'
@@ -0,0 +1,107 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# Interest rates are percentages with two decimals, held as hundredths of a percent
+RATE_UNITS_PER_PERCENT = 100
+
+def to_units(values, units):
+    """
+    Convert amounts (scalars, sequences, arrays, Decimals or strings) to
+    exact integers of 1/``units``, rounding half up. Going through Decimal
+    avoids binary float error, e.g. 1.005 becomes 101 cents, not 100.
+    """
+    def convert(value):
+        return int((Decimal(str(value)) * units).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    array = np.asarray(values, dtype=object)
+    return np.vectorize(convert, otypes=[np.int64])(array) if array.ndim else np.int64(convert(array.item()))
+
+def to_cents(amounts):
+    """Convert amounts to integer cents"""
+    return to_units(amounts, 100)
+
+def to_rate_units(rates):
+    """Convert percentage rates to integer hundredths of a percent"""
+    return to_units(rates, RATE_UNITS_PER_PERCENT)
+
+def from_cents(cents):
+    """Convert a scalar number of cents back to a Decimal amount"""
+    return Decimal(int(cents)).scaleb(-2)
+
+def divide_half_up(numerator, denominator):
+    """Integer division of non-negative integers rounding half up"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+def interest_cents(principal_cents, rate_units):
+    """Flat interest on the principal at a percentage rate"""
+    return divide_half_up(principal_cents * rate_units, 100 * RATE_UNITS_PER_PERCENT)
+
+def installment_cents(total_cents, installments):
+    """
+    Regular installment for a total spread over a number of installments,
+    and the last installment, which takes the rounding remainder so the
+    installments add up to the total exactly
+    """
+    total_cents, installments = np.broadcast_arrays(np.asarray(total_cents, dtype=np.int64),
+                                                    np.asarray(installments, dtype=np.int64))
+    count = np.maximum(installments, 1)
+    regular = divide_half_up(total_cents, count)
+    last = total_cents - regular * (count - 1)
+    return regular, last
+
+def quote(principal_amounts, interest_rates, durations, expenses=0):
+    """
+    Price loans on integer cents. Inputs broadcast against each other like
+    numpy arrays; outputs are int64 cent arrays of the broadcast shape.
+    """
+    principal = to_cents(principal_amounts)
+    rate = to_rate_units(interest_rates)
+    expense = to_cents(expenses)
+    duration = np.asarray(durations, dtype=np.int64)
+
+    interest = interest_cents(principal, rate)
+    total = principal + interest + expense
+    regular, last = installment_cents(total, duration)
+
+    principal, rate, expense, duration, interest, total, regular, last = np.broadcast_arrays(
+        principal, rate, expense, duration, interest, total, regular, last
+    )
+    return {
+        'principal_amount': principal,
+        'interest_rate': rate,
+        'expenses': expense,
+        'loan_duration_days': duration,
+        'interest_amount': interest,
+        'total_amount': total,
+        'daily_repayment': regular,
+        'last_repayment': last
+    }
+
+def quote_grid(principal_amounts, interest_rates, durations, expenses=0):
+    """
+    Price every principal x rate x duration combination, flattened in that
+    order (principal varies slowest)
+    """
+    principal, rate, duration = np.meshgrid(
+        np.asarray(principal_amounts, dtype=object),
+        np.asarray(interest_rates, dtype=object),
+        np.asarray(durations, dtype=np.int64),
+        indexing='ij'
+    )
+    return {
+        name: values.ravel()
+        for name, values in quote(principal, rate, duration, expenses).items()
+    }
+
+def interest_amount(principal_amount, interest_rate):
+    """Flat interest on a principal at a percentage rate, as a Decimal"""
+    return from_cents(interest_cents(to_cents(principal_amount), to_rate_units(interest_rate)))
+
+def total_amount(principal_amount, interest_amount, expenses):
+    """Total amount to be repaid, as a Decimal"""
+    return from_cents(to_cents(principal_amount) + to_cents(interest_amount) + to_cents(expenses or 0))
+
+def installment_amount(total_amount, installments):
+    """Regular installment for a total over a number of installments, as a Decimal"""
+    regular, _ = installment_cents(to_cents(total_amount), installments)
+    return from_cents(regular)
@@ -0,0 +1,372 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from user import db
+from auth import admin_required
+from business_calendar import BusinessCalendar
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+import pricing
+
+import numpy as np
+
+products_bp = Blueprint('products', __name__)
+
+@products_bp.route('/', methods=['GET'])
+@login_required
+def get_products():
+    """Get loan products"""
+    try:
+        query = LoanProduct.query
+        if request.args.get('include_inactive') != '1':
+            query = query.filter_by(is_active=True)
+
+        products = query.order_by(LoanProduct.name).all()
+        return jsonify({
+            'products': [product.to_dict() for product in products]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/', methods=['POST'])
+@login_required
+@admin_required
+def create_product():
+    """Create a loan product"""
+    try:
+        data = request.get_json()
+
+        error = validate_product_data(data, required=True)
+        if error:
+            return jsonify({'error': error}), 400
+
+        if LoanProduct.query.filter_by(name=data['name']).first():
+            return jsonify({'error': 'A product with this name already exists'}), 400
+
+        product = LoanProduct(
+            name=data['name'],
+            description=data.get('description'),
+            frequency=data['frequency'],
+            interest_method=data['interest_method'],
+            interest_rate=Decimal(str(data['interest_rate'])) if data.get('interest_rate') is not None else None,
+            is_active=data.get('is_active', True),
+            created_by=current_user.id
+        )
+        db.session.add(product)
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Product created successfully',
+            'product': product.to_dict()
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/<int:product_id>', methods=['PUT'])
+@login_required
+@admin_required
+def update_product(product_id):
+    """
+    Update a loan product. Frequency and interest method cannot change once
+    loans use the product, as their schedules were priced with them.
+    """
+    try:
+        product = LoanProduct.query.get_or_404(product_id)
+        data = request.get_json()
+
+        error = validate_product_data(data, required=False)
+        if error:
+            return jsonify({'error': error}), 400
+
+        changes_plan = any(
+            field in data and data[field] != getattr(product, field)
+            for field in ('frequency', 'interest_method')
+        )
+        if changes_plan and product.loans.count():
+            return jsonify({'error': 'Cannot change the repayment plan of a product with loans'}), 400
+
+        for field in ('name', 'description', 'frequency', 'interest_method', 'is_active'):
+            if field in data:
+                setattr(product, field, data[field])
+        if 'interest_rate' in data:
+            product.interest_rate = Decimal(str(data['interest_rate'])) if data['interest_rate'] is not None else None
+
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Product updated successfully',
+            'product': product.to_dict()
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def validate_product_data(data, required):
+    """Validate product fields, returning an error message or None"""
+    if not data:
+        return 'No data provided'
+    if required:
+        for field in ('name', 'frequency', 'interest_method'):
+            if not data.get(field):
+                return f'{field} is required'
+    if 'frequency' in data and data['frequency'] not in FREQUENCIES:
+        return f"frequency must be one of {', '.join(FREQUENCIES)}"
+    if 'interest_method' in data and data['interest_method'] not in INTEREST_METHODS:
+        return f"interest_method must be one of {', '.join(INTEREST_METHODS)}"
+    if data.get('interest_rate') is not None and float(data['interest_rate']) < 0:
+        return 'interest_rate must be 0 or greater'
+    return None
+
+
+# Repayment frequencies
+#
+# A frequency decides how many installments a loan has and when each falls
+# due. Due dates are computed for whole arrays of installments at once.
+
+class Frequency:
+    """Base class for repayment frequencies"""
+
+    name = None
+    periods_per_year = None
+
+    def installment_counts(self, durations, terms):
+        """Number of installments for loans of the given durations (days) and terms (months)"""
+        raise NotImplementedError
+
+    def due_dates(self, starts, periods, calendar):
+        """Due dates of installments ``periods`` (0-based) of loans starting on ``starts``"""
+        raise NotImplementedError
+
+class DailyFrequency(Frequency):
+    """One installment per business day, the first on the start date"""
+
+    name = 'daily'
+    periods_per_year = 365
+
+    def installment_counts(self, durations, terms):
+        return np.maximum(durations, 0)
+
+    def due_dates(self, starts, periods, calendar):
+        return calendar.offset(starts, periods)
+
+class WeeklyFrequency(Frequency):
+    """One installment a week after the start date and weekly after that"""
+
+    name = 'weekly'
+    periods_per_year = 52
+
+    def installment_counts(self, durations, terms):
+        return np.maximum(-(-durations // 7), 0)
+
+    def due_dates(self, starts, periods, calendar):
+        return calendar.offset(starts + 7 * (periods + 1), 0)
+
+class MonthlyFrequency(Frequency):
+    """
+    One installment a month after the start date and monthly after that, on
+    the same day of the month (or the month's last day). The loan term in
+    months sets the count, falling back to the duration in 30-day months.
+    """
+
+    name = 'monthly'
+    periods_per_year = 12
+
+    def installment_counts(self, durations, terms):
+        return np.where(terms > 0, terms, np.maximum(-(-durations // 30), 0))
+
+    def due_dates(self, starts, periods, calendar):
+        months = starts.astype('datetime64[M]') + periods + 1
+        day_of_month = (starts - starts.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+        month_end = (months + 1).astype('datetime64[D]') - 1
+        return calendar.offset(np.minimum(months.astype('datetime64[D]') + day_of_month, month_end), 0)
+
+FREQUENCIES = {frequency.name: frequency for frequency in (DailyFrequency(), WeeklyFrequency(), MonthlyFrequency())}
+
+
+# Interest methods
+#
+# An interest method prices a loan and splits what is owed into installment
+# amounts on integer cents. Amounts are exact: rounding remainders go on the
+# last installment, so the installments always add up to the total.
+
+class InterestMethod:
+    """Base class for interest methods"""
+
+    name = None
+
+    def interest_cents(self, principal, rate, count, periods_per_year):
+        """Total interest in cents of one loan"""
+        raise NotImplementedError
+
+    def installment_amounts(self, principal, rate, expenses, totals, counts, periods_per_year):
+        """Flat array of installment amounts in cents, loan after loan"""
+        raise NotImplementedError
+
+def spread_evenly(totals, counts):
+    """Split totals into ``counts`` equal installments, the remainder on the last"""
+    regular, last = pricing.installment_cents(totals, counts)
+    amounts = np.repeat(regular, counts)
+    ends = np.cumsum(counts) - 1
+    amounts[ends[counts > 0]] = last[counts > 0]
+    return amounts
+
+class FlatInterest(InterestMethod):
+    """Interest is the rate on the principal for the whole term, spread evenly"""
+
+    name = 'flat'
+
+    def interest_cents(self, principal, rate, count, periods_per_year):
+        return int(pricing.interest_cents(principal, rate))
+
+    def installment_amounts(self, principal, rate, expenses, totals, counts, periods_per_year):
+        return spread_evenly(totals, counts)
+
+class ReducingBalanceInterest(InterestMethod):
+    """
+    The rate is a monthly percentage charged on the outstanding principal.
+    Installments are level (annuity) payments plus an even share of the
+    expenses; the last installment settles whatever is left.
+    """
+
+    name = 'reducing_balance'
+
+    def interest_cents(self, principal, rate, count, periods_per_year):
+        return amortize(int(principal), int(rate), int(count), periods_per_year)[0]
+
+    def installment_amounts(self, principal, rate, expenses, totals, counts, periods_per_year):
+        if not len(counts):
+            return np.zeros(0, dtype=np.int64)
+        amounts = np.concatenate([
+            np.array(amortize(int(p), int(r), int(n), periods_per_year)[1], dtype=np.int64)
+            for p, r, n in zip(principal, rate, counts)
+        ])
+        return amounts + spread_evenly(expenses, counts)
+
+@lru_cache(maxsize=4096)
+def amortize(principal, rate, count, periods_per_year):
+    """
+    Level-payment amortization of ``principal`` cents at ``rate`` hundredths
+    of a percent a month over ``count`` installments. Returns the total
+    interest and the installment amounts, both in cents. Cached, so loans
+    sharing terms are only amortized once.
+    """
+    if count <= 0:
+        return 0, ()
+
+    periodic_rate = Decimal(rate) / (100 * pricing.RATE_UNITS_PER_PERCENT) * 12 / periods_per_year
+    balance = Decimal(principal)
+    if periodic_rate:
+        payment = balance * periodic_rate / (1 - (1 + periodic_rate) ** -count)
+    else:
+        payment = balance / count
+    payment = payment.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+
+    amounts = []
+    total_interest = 0
+    for period in range(count):
+        interest = (balance * periodic_rate).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        amount = balance + interest if period == count - 1 else min(payment, balance + interest)
+        balance -= amount - interest
+        total_interest += int(interest)
+        amounts.append(int(amount))
+    return total_interest, tuple(amounts)
+
+INTEREST_METHODS = {method.name: method for method in (FlatInterest(), ReducingBalanceInterest())}
+
+
+class RepaymentPlan:
+    """A frequency and an interest method, i.e. how a product is repaid"""
+
+    def __init__(self, frequency, interest_method):
+        self.frequency = FREQUENCIES[frequency]
+        self.interest = INTEREST_METHODS[interest_method]
+
+    @property
+    def key(self):
+        return (self.frequency.name, self.interest.name)
+
+    def installment_count(self, loan):
+        """Number of installments of a loan"""
+        return int(self.frequency.installment_counts(
+            np.array([loan.loan_duration_days or 0]), np.array([loan.loan_term or 0])
+        )[0])
+
+    def interest_cents(self, loan):
+        """Total interest of a loan in cents"""
+        return self.interest.interest_cents(
+            pricing.to_cents(loan.principal_amount), pricing.to_rate_units(loan.interest_rate or 0),
+            self.installment_count(loan), self.frequency.periods_per_year
+        )
+
+    def schedule_arrays(self, loans):
+        """
+        Installment counts and flat installment amounts (cents) of many loans.
+        Flat loans are split from their stored total, so existing loans keep
+        what they were priced at.
+        """
+        counts = self.frequency.installment_counts(
+            np.array([loan.loan_duration_days or 0 for loan in loans], dtype=np.int64),
+            np.array([loan.loan_term or 0 for loan in loans], dtype=np.int64)
+        )
+        amounts = self.interest.installment_amounts(
+            pricing.to_cents([loan.principal_amount or 0 for loan in loans]),
+            pricing.to_rate_units([loan.interest_rate or 0 for loan in loans]),
+            pricing.to_cents([loan.expenses or 0 for loan in loans]),
+            pricing.to_cents([loan.total_amount or 0 for loan in loans]),
+            counts,
+            self.frequency.periods_per_year
+        )
+        return counts, amounts
+
+    def due_dates(self, starts, periods, calendar=None):
+        """Due dates of installments on a business calendar (weekends only by default)"""
+        return self.frequency.due_dates(starts, periods, calendar or BusinessCalendar())
+
+# Loans without a product: flat interest, one installment per business day
+DEFAULT_PLAN = RepaymentPlan('daily', 'flat')
+
+def plan_for(loan):
+    """Get the repayment plan of a loan"""
+    return loan.product.plan if loan.product else DEFAULT_PLAN
+
+
+# Model Definition
+class LoanProduct(db.Model):
+    __tablename__ = 'loan_products'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    description = db.Column(db.Text)
+    frequency = db.Column(db.Enum('daily', 'weekly', 'monthly', name='product_frequency'), nullable=False)
+    interest_method = db.Column(db.Enum('flat', 'reducing_balance', name='product_interest_method'), nullable=False)
+    interest_rate = db.Column(db.Numeric(5, 2))  # Default rate for loans of this product
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    loans = db.relationship('Loan', backref='product', lazy='dynamic')
+
+    @property
+    def plan(self):
+        """The repayment plan of this product"""
+        return RepaymentPlan(self.frequency, self.interest_method)
+
+    def to_dict(self):
+        """Serialize the product for API responses"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'frequency': self.frequency,
+            'interest_method': self.interest_method,
+            'interest_rate': float(self.interest_rate) if self.interest_rate is not None else None,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<LoanProduct {self.name}>'
@@ -0,0 +1,495 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from user import db
+from auth import admin_required
+from borrowers import Borrower
+from loans import Loan
+from payments import record_payments
+from installments import Installment, backfill_installments
+from pricing import to_cents
+from sqlalchemy import func, insert, update, bindparam
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import csv
+import hashlib
+import io
+import json
+import re
+
+reconciliation_bp = Blueprint('reconciliation', __name__)
+
+# Days a transfer may land before or after the installment it pays
+MATCH_WINDOW_DAYS = 3
+
+# Hashes looked up per query when checking for lines already imported
+HASH_LOOKUP_CHUNK = 500
+
+# Statement columns, by the header names banks use for them
+COLUMN_ALIASES = {
+    'date': ('date', 'transaction_date', 'value_date', 'posting_date'),
+    'amount': ('amount', 'credit', 'credit_amount'),
+    'account_number': ('account_number', 'account', 'account_no', 'sender_account'),
+    'phone': ('phone', 'phone_number', 'sender_phone'),
+    'reference': ('reference', 'narration', 'description', 'remarks')
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')
+
+LINE_STATUSES = ('matched', 'review', 'unmatched', 'duplicate', 'posted', 'ignored')
+
+def normalize_header(name):
+    """Lower-case a header and join its words with underscores"""
+    return re.sub(r'[^a-z0-9]+', '_', (name or '').strip().lower()).strip('_')
+
+def normalize_phone(phone):
+    """The last ten digits of a phone number, so 0803..., 234803... and +234 803... agree"""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if len(digits) >= 10 else None
+
+def normalize_account(account_number):
+    """A 10 digit account number, or None"""
+    digits = re.sub(r'\D', '', account_number or '')
+    return digits if len(digits) == 10 else None
+
+def identities(account_number, phone):
+    """The keys a borrower or a statement line is known by, account number first"""
+    keys = []
+    if account_number:
+        keys.append(('account', account_number))
+    if phone:
+        keys.append(('phone', phone))
+    return keys
+
+def parse_date(value):
+    """A statement date in any of the accepted formats, or None"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_amount(value):
+    """A statement amount without currency signs or separators, or None"""
+    try:
+        return Decimal(re.sub(r'[^\d.\-]', '', value or ''))
+    except InvalidOperation:
+        return None
+
+def read_statement(stream):
+    """
+    Parse a statement CSV row by row into line dicts. The rows are decoded
+    as they are read, but import_statement collects them all, as it needs
+    the statement's date range before matching. Rows with an unreadable
+    date or amount are kept, with a note, so the line count stays complete.
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    headers = [normalize_header(header) for header in next(reader, [])]
+    positions = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        position = next((headers.index(alias) for alias in aliases if alias in headers), None)
+        if position is not None:
+            positions[column] = position
+    if 'date' not in positions or 'amount' not in positions:
+        raise ValueError('Statement needs a date and an amount column')
+
+    for line_number, row in enumerate(reader, start=1):
+        if not any(cell.strip() for cell in row):
+            continue
+        def cell(column):
+            position = positions.get(column)
+            return row[position].strip() if position is not None and position < len(row) else ''
+
+        yield {
+            'line_number': line_number,
+            'transaction_date': parse_date(cell('date')),
+            'amount': parse_amount(cell('amount')),
+            'account_number': normalize_account(cell('account_number')),
+            'phone': normalize_phone(cell('phone')),
+            'reference': cell('reference')[:255] or None
+        }
+
+def line_hash(line, occurrence=0):
+    """
+    Fingerprint of a statement line, the same whichever statement it arrives
+    in. ``occurrence`` counts earlier identical lines in the same statement,
+    so two equal transfers on one day are told apart while a re-import of
+    the statement still matches both.
+    """
+    key = '|'.join(str(line[field] or '') for field in
+                   ('transaction_date', 'amount', 'account_number', 'phone', 'reference'))
+    if occurrence:
+        key += f'|{occurrence}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def build_installment_index(start, end):
+    """
+    Hash index of the open installments of active and overdue loans due
+    between two dates, built from one query:
+
+    - (identity, amount in cents) -> [(due date, loan id)], for both the
+      installment's full and outstanding amount
+    - identity -> loan ids, to tell a wrong amount from an unknown payer
+    """
+    index, loans_by_identity = {}, {}
+    rows = db.session.query(
+        Installment.loan_id,
+        Installment.due_date,
+        Installment.expected_amount,
+        Installment.paid_amount,
+        Borrower.account_number,
+        Borrower.phone
+    ).join(Loan, Installment.loan_id == Loan.id).join(Borrower, Loan.borrower_id == Borrower.id).filter(
+        Loan.status.in_(['active', 'overdue']),
+        Installment.paid_amount < Installment.expected_amount,
+        Installment.due_date.between(start, end)
+    )
+    for loan_id, due_date, expected, paid, account_number, phone in rows:
+        expected_cents = int(to_cents(expected))
+        outstanding_cents = expected_cents - int(to_cents(paid or 0))
+        for identity in identities(normalize_account(account_number), normalize_phone(phone)):
+            loans_by_identity.setdefault(identity, set()).add(loan_id)
+            for cents in {expected_cents, outstanding_cents}:
+                index.setdefault((identity, cents), []).append((due_date, loan_id))
+    return index, loans_by_identity
+
+def match_line(line, index, loans_by_identity):
+    """
+    Match a statement line against the index by account number, then by
+    phone. Returns its status, the candidate loan ids and a note.
+    """
+    if line['transaction_date'] is None or line['amount'] is None:
+        return 'unmatched', [], 'Unreadable date or amount'
+    if line['amount'] <= 0:
+        return 'ignored', [], 'Not a credit'
+
+    keys = identities(line['account_number'], line['phone'])
+    cents = int(to_cents(line['amount']))
+    for identity in keys:
+        candidates = sorted({
+            loan_id for due_date, loan_id in index.get((identity, cents), ())
+            if abs((due_date - line['transaction_date']).days) <= MATCH_WINDOW_DAYS
+        })
+        if len(candidates) == 1:
+            return 'matched', candidates, None
+        if candidates:
+            return 'review', candidates, 'Several loans match'
+
+    known = sorted(set().union(*(loans_by_identity.get(identity, ()) for identity in keys)))
+    if known:
+        return 'review', known, 'Amount or date does not match an open installment'
+    return 'unmatched', [], 'No open loan for this account or phone'
+
+def imported_hashes(hashes):
+    """The given line hashes already stored by an earlier import"""
+    hashes = list(hashes)
+    found = set()
+    for position in range(0, len(hashes), HASH_LOOKUP_CHUNK):
+        chunk = hashes[position:position + HASH_LOOKUP_CHUNK]
+        found.update(value for (value,) in db.session.query(StatementLine.line_hash).filter(
+            StatementLine.line_hash.in_(chunk),
+            StatementLine.status != 'duplicate'
+        ))
+    return found
+
+def import_statement(stream, filename, uploaded_by):
+    """
+    Import and reconcile a statement: read its lines, index the open
+    installments they could pay in one pass, and match each line by hash
+    lookup, so matching is linear in lines plus installments. Lines seen
+    in an earlier statement are marked duplicate; identical lines within
+    the statement are not. The caller commits.
+    """
+    backfill_installments()
+    lines = list(read_statement(stream))
+    occurrences = Counter()
+    for line in lines:
+        base = line_hash(line)
+        line['line_hash'] = line_hash(line, occurrences[base])
+        occurrences[base] += 1
+
+    dates = [line['transaction_date'] for line in lines if line['transaction_date']]
+    index, loans_by_identity = build_installment_index(
+        min(dates) - timedelta(days=MATCH_WINDOW_DAYS), max(dates) + timedelta(days=MATCH_WINDOW_DAYS)
+    ) if dates else ({}, {})
+
+    seen = imported_hashes({line['line_hash'] for line in lines})
+    statement = BankStatement(filename=filename, uploaded_by=uploaded_by, line_count=len(lines))
+    db.session.add(statement)
+    db.session.flush()
+
+    for line in lines:
+        if line['line_hash'] in seen:
+            status, candidates, note = 'duplicate', [], 'Already imported'
+        else:
+            status, candidates, note = match_line(line, index, loans_by_identity)
+        line.update(
+            statement_id=statement.id,
+            status=status,
+            loan_id=candidates[0] if status == 'matched' else None,
+            candidates=json.dumps(candidates),
+            note=note,
+            created_at=datetime.utcnow()
+        )
+    if lines:
+        db.session.execute(insert(StatementLine.__table__), lines)
+    return statement
+
+def post_lines(lines, recorded_by):
+    """
+    Record the payments of matched statement lines through the bulk payment
+    path, oldest transfer first, and mark the lines posted. Each line is a
+    (line id, loan id, date, amount, reference) tuple. The caller commits.
+    """
+    lines = sorted(lines, key=lambda line: (line[2], line[0]))
+    payments = record_payments([
+        {
+            'loan_id': loan_id,
+            'payment_date': transaction_date,
+            'actual_amount': amount,
+            'notes': f'Bank transfer {reference}' if reference else 'Bank transfer'
+        }
+        for _, loan_id, transaction_date, amount, reference in lines
+    ], recorded_by)
+    if lines:
+        db.session.execute(
+            update(StatementLine.__table__).where(StatementLine.__table__.c.id == bindparam('line_id')).values(
+                status='posted', loan_id=bindparam('posted_loan_id'), payment_id=bindparam('posted_payment_id')),
+            [
+                {'line_id': line[0], 'posted_loan_id': line[1], 'posted_payment_id': payment.id}
+                for line, payment in zip(lines, payments)
+            ]
+        )
+    return len(payments)
+
+def post_statement(statement_id, recorded_by):
+    """Post every matched line of a statement. The caller commits."""
+    return post_lines(db.session.query(
+        StatementLine.id,
+        StatementLine.loan_id,
+        StatementLine.transaction_date,
+        StatementLine.amount,
+        StatementLine.reference
+    ).filter(StatementLine.statement_id == statement_id, StatementLine.status == 'matched').all(), recorded_by)
+
+def statement_summary(statement):
+    """A statement with its line counts and amounts per status"""
+    summary = statement.to_dict()
+    summary['lines'] = {
+        status: {'count': count, 'amount': float(amount or 0)}
+        for status, count, amount in db.session.query(
+            StatementLine.status, func.count(StatementLine.id), func.sum(StatementLine.amount)
+        ).filter(StatementLine.statement_id == statement.id).group_by(StatementLine.status)
+    }
+    return summary
+
+@reconciliation_bp.route('/statements', methods=['POST'])
+@login_required
+@admin_required
+def upload_statement():
+    """
+    Import a bank statement CSV (multipart field ``file``) and match its
+    credits to loans. Matched lines are posted as payments with ?post=1,
+    otherwise they wait for POST /statements/<id>/post.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No statement file provided'}), 400
+        if not upload.filename.lower().endswith('.csv'):
+            return jsonify({'error': 'Statement must be a CSV file'}), 400
+
+        try:
+            statement = import_statement(upload.stream, upload.filename, current_user.id)
+        except (ValueError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            return jsonify({'error': f'Could not read statement: {e}'}), 400
+
+        posted = post_statement(statement.id, current_user.id) if request.args.get('post') == '1' else 0
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Statement imported successfully',
+            'statement': statement_summary(statement),
+            'posted': posted
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@reconciliation_bp.route('/statements', methods=['GET'])
+@login_required
+@admin_required
+def get_statements():
+    """Get imported statements, newest first"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+
+        statements = BankStatement.query.order_by(BankStatement.id.desc()).paginate(page=page, per_page=per_page)
+        return jsonify({
+            'statements': [statement_summary(statement) for statement in statements.items],
+            'total_pages': statements.pages,
+            'current_page': statements.page,
+            'total_items': statements.total
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reconciliation_bp.route('/statements/<int:statement_id>', methods=['GET'])
+@login_required
+@admin_required
+def get_statement(statement_id):
+    """Get a statement's line counts"""
+    try:
+        statement = BankStatement.query.get_or_404(statement_id)
+        return jsonify({'statement': statement_summary(statement)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reconciliation_bp.route('/statements/<int:statement_id>/post', methods=['POST'])
+@login_required
+@admin_required
+def post_matched_lines(statement_id):
+    """Record payments for the statement's matched lines"""
+    try:
+        statement = BankStatement.query.get_or_404(statement_id)
+        posted = post_statement(statement.id, current_user.id)
+        db.session.commit()
+
+        return jsonify({
+            'message': f'{posted} payments recorded',
+            'statement': statement_summary(statement),
+            'posted': posted
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@reconciliation_bp.route('/lines', methods=['GET'])
+@login_required
+@admin_required
+def get_review_queue():
+    """
+    Get statement lines waiting for a person: those in review by default,
+    or another status with ?status=, optionally for one ?statement_id=
+    """
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        status = request.args.get('status', 'review')
+        if status not in LINE_STATUSES:
+            return jsonify({'error': f"Invalid status. Use one of {', '.join(LINE_STATUSES)}"}), 400
+
+        query = StatementLine.query.filter(StatementLine.status == status)
+        if request.args.get('statement_id'):
+            query = query.filter(StatementLine.statement_id == request.args.get('statement_id', type=int))
+
+        lines = query.order_by(StatementLine.transaction_date, StatementLine.id).paginate(page=page, per_page=per_page)
+        return jsonify({
+            'lines': [line.to_dict() for line in lines.items],
+            'total_pages': lines.pages,
+            'current_page': lines.page,
+            'total_items': lines.total
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reconciliation_bp.route('/lines/<int:line_id>/resolve', methods=['POST'])
+@login_required
+@admin_required
+def resolve_line(line_id):
+    """
+    Resolve a line from the review queue: {"loan_id": ...} records its
+    payment against that loan, {"ignore": true} sets it aside
+    """
+    try:
+        line = StatementLine.query.get_or_404(line_id)
+        if line.status not in ('review', 'unmatched', 'matched'):
+            return jsonify({'error': f'Line is already {line.status}'}), 400
+
+        data = request.get_json() or {}
+        if data.get('ignore'):
+            line.status = 'ignored'
+            line.resolved_by = current_user.id
+            db.session.commit()
+            return jsonify({'message': 'Line ignored', 'line': line.to_dict()}), 200
+
+        loan_id = data.get('loan_id')
+        if not loan_id:
+            return jsonify({'error': 'Loan ID is required'}), 400
+        if line.transaction_date is None or line.amount is None:
+            return jsonify({'error': 'Line has no readable date or amount to record'}), 400
+        Loan.query.get_or_404(loan_id)
+
+        post_lines([(line.id, loan_id, line.transaction_date, line.amount, line.reference)], current_user.id)
+        db.session.expire(line)
+        line.resolved_by = current_user.id
+        db.session.commit()
+
+        return jsonify({'message': 'Payment recorded', 'line': line.to_dict()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+# Model Definition
+class BankStatement(db.Model):
+    __tablename__ = 'bank_statements'
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    line_count = db.Column(db.Integer, default=0, nullable=False)
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'line_count': self.line_count,
+            'uploaded_by': self.uploaded_by,
+            'uploaded_at': self.uploaded_at.isoformat()
+        }
+
+class StatementLine(db.Model):
+    __tablename__ = 'statement_lines'
+    __table_args__ = (
+        db.Index('ix_statement_lines_queue', 'status', 'statement_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    statement_id = db.Column(db.Integer, db.ForeignKey('bank_statements.id'), nullable=False)
+    line_number = db.Column(db.Integer, nullable=False)
+    transaction_date = db.Column(db.Date)
+    amount = db.Column(db.Numeric(10, 2))
+    account_number = db.Column(db.String(10))
+    phone = db.Column(db.String(20))  # Last ten digits
+    reference = db.Column(db.String(255))
+    line_hash = db.Column(db.String(40), nullable=False, index=True)
+    status = db.Column(db.Enum(*LINE_STATUSES, name='statement_line_status'), nullable=False)
+    candidates = db.Column(db.Text, nullable=False, default='[]')  # JSON list of loan ids
+    note = db.Column(db.String(255))
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'))
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'))
+    resolved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'statement_id': self.statement_id,
+            'line_number': self.line_number,
+            'transaction_date': self.transaction_date.isoformat() if self.transaction_date else None,
+            'amount': float(self.amount) if self.amount is not None else None,
+            'account_number': self.account_number,
+            'phone': self.phone,
+            'reference': self.reference,
+            'status': self.status,
+            'candidates': json.loads(self.candidates),
+            'note': self.note,
+            'loan_id': self.loan_id,
+            'payment_id': self.payment_id,
+            'resolved_by': self.resolved_by
+        }
@@ -0,0 +1,410 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from user import db
+from auth import admin_required
+from loans import Loan
+from borrowers import Borrower
+from installments import Installment, backfill_installments
+from business_calendar import get_business_calendar
+from settings import SystemSetting
+from jobs import enqueue_job, job_handler
+from sqlalchemy import func, case, update
+from abc import ABC, abstractmethod
+from datetime import datetime, date, timedelta
+import json
+import logging
+import os
+import threading
+import time
+
+reminders_bp = Blueprint('reminders', __name__)
+
+logger = logging.getLogger(__name__)
+
+# Message templates, filled per loan
+DUE_TEMPLATE = 'Dear {name}, your installment of {due_amount:,.2f} on loan #{loan_id} is due on {due_date:%d %b %Y}.'
+MISSED_TEMPLATE = 'Dear {name}, {missed_count} installment(s) totalling {missed_amount:,.2f} on loan #{loan_id} are overdue. Please pay as soon as possible.'
+
+# Attempts before a message is marked failed, and the first retry delay (doubled each attempt)
+MAX_ATTEMPTS = 5
+RETRY_DELAY_SECONDS = 60
+
+# Messages sent per drain of the outbox
+DRAIN_BATCH = 500
+
+# How long a drain holds a claimed message before another drain may send it
+CLAIM_SECONDS = 300
+
+class SendError(Exception):
+    """A message could not be delivered; it will be retried"""
+
+class ReminderSender(ABC):
+    """Interface of an outbound channel for reminder messages"""
+
+    @abstractmethod
+    def send(self, phone, body):
+        """Deliver one message, raising SendError on failure"""
+
+class LogSender(ReminderSender):
+    """Writes messages as JSON lines to a file and the log instead of sending them"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, phone, body):
+        line = json.dumps({'phone': phone, 'body': body, 'sent_at': datetime.utcnow().isoformat()})
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as outbox:
+                outbox.write(line + '\n')
+        logger.info('Reminder to %s: %s', phone, body)
+
+def log_sender(app):
+    """LogSender writing to the REMINDER_LOG_FILE config path"""
+    path = app.config.get('REMINDER_LOG_FILE') or os.path.join(app.instance_path, 'reminders.log')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return LogSender(path)
+
+# Sender factories selectable through the REMINDER_SENDER config key
+SENDERS = {
+    'log': log_sender
+}
+
+def get_sender(app=None):
+    """Build the sender configured for the app"""
+    app = app or current_app
+    return SENDERS[app.config.get('REMINDER_SENDER', 'log')](app)
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: ``rate`` tokens per second up to ``capacity``,
+    the burst let through back to back. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('Token bucket rate must be positive')
+        if capacity < 1:
+            raise ValueError('Token bucket capacity must be at least 1')
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def acquire(self):
+        while not self.try_acquire():
+            self.sleep((1 - self.tokens) / self.rate)
+
+def reminder_rate():
+    """Messages per second allowed by the reminder_rate_per_minute setting"""
+    return float(SystemSetting.get_setting('reminder_rate_per_minute', '60')) / 60
+
+def reminder_burst():
+    """Messages sent back to back before the rate applies, the reminder_burst setting"""
+    return int(SystemSetting.get_setting('reminder_burst', '10'))
+
+def valid_reminder_rate(value):
+    """Whether a reminder_rate_per_minute value is a positive number"""
+    try:
+        return float(value) > 0
+    except (TypeError, ValueError):
+        return False
+
+def valid_reminder_burst(value):
+    """Whether a reminder_burst value is a whole number of at least 1"""
+    try:
+        return int(value) >= 1
+    except (TypeError, ValueError):
+        return False
+
+def claim_message(message_id):
+    """
+    Claim a queued message for one send attempt: count the attempt and push
+    its next attempt CLAIM_SECONDS out, only if it is still queued and due.
+    A concurrent drain's claim on the same row matches nothing, so returns False.
+    """
+    now = datetime.utcnow()
+    claimed = db.session.execute(update(ReminderMessage).where(
+        ReminderMessage.id == message_id,
+        ReminderMessage.status == 'queued',
+        ReminderMessage.next_attempt_at <= now
+    ).values(
+        attempts=ReminderMessage.attempts + 1,
+        next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+    ).execution_options(synchronize_session=False))
+    db.session.commit()
+    return claimed.rowcount == 1
+
+def reminder_candidates_query(as_of):
+    """
+    One row per active or overdue loan with an installment due on the next
+    business day or one already missed, across the whole book: the amount
+    due, the missed count and amount, and the borrower's contact
+    """
+    due_date = get_business_calendar().add_business_days(as_of, 1)
+    is_due = Installment.due_date == due_date
+    is_missed = Installment.due_date < as_of
+    unpaid = Installment.expected_amount - Installment.paid_amount
+
+    already_queued = db.session.query(ReminderMessage.id).filter(
+        ReminderMessage.loan_id == Loan.id,
+        ReminderMessage.reminder_date == as_of
+    ).exists()
+
+    return due_date, db.session.query(
+        Loan.id,
+        Borrower.id,
+        Borrower.name,
+        Borrower.phone,
+        func.sum(case((is_due, unpaid), else_=0)).label('due_amount'),
+        func.sum(case((is_missed, 1), else_=0)).label('missed_count'),
+        func.sum(case((is_missed, unpaid), else_=0)).label('missed_amount'),
+        func.min(Installment.day).label('first_day')
+    ).join(
+        Loan, Installment.loan_id == Loan.id
+    ).join(
+        Borrower, Loan.borrower_id == Borrower.id
+    ).filter(
+        Loan.status.in_(['active', 'overdue']),
+        Installment.paid_amount < Installment.expected_amount,
+        is_due | is_missed,
+        Borrower.phone.isnot(None),
+        Borrower.phone != '',
+        ~already_queued
+    ).group_by(Loan.id, Borrower.id, Borrower.name, Borrower.phone).order_by(Loan.id)
+
+def render_message(row, due_date):
+    """Message for one loan: the missed installments first, the one falling due after"""
+    loan_id, _, name, _, due_amount, missed_count, missed_amount, _ = row
+    parts = []
+    if missed_count:
+        parts.append(MISSED_TEMPLATE.format(name=name, loan_id=loan_id, missed_count=missed_count,
+                                            missed_amount=float(missed_amount)))
+    if due_amount:
+        parts.append(DUE_TEMPLATE.format(name=name, loan_id=loan_id, due_amount=float(due_amount), due_date=due_date))
+    return ' '.join(parts)
+
+def generate_reminders(as_of=None, dry_run=False):
+    """
+    Select every loan to remind in one query, render the messages in one
+    pass and queue them in the outbox. A loan gets at most one message per
+    day, so reruns queue nothing new.
+    """
+    as_of = as_of or date.today()
+    backfill_installments()
+
+    due_date, query = reminder_candidates_query(as_of)
+    rows = query.all()
+    now = datetime.utcnow()
+    messages = [
+        {
+            'loan_id': row[0],
+            'borrower_id': row[1],
+            'phone': row[3],
+            'kind': 'missed' if row[5] else 'due',
+            'reminder_date': as_of,
+            'installment_day': row[7],
+            'amount': round(float(row[4] or 0) + float(row[6] or 0), 2),
+            'body': render_message(row, due_date),
+            'status': 'queued',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        }
+        for row in rows
+    ]
+
+    if not dry_run and messages:
+        # The unique (loan, date) constraint stops a concurrent run from queueing twice
+        db.session.bulk_insert_mappings(ReminderMessage, messages)
+        db.session.commit()
+
+    return {
+        'as_of': as_of.isoformat(),
+        'due_date': due_date.isoformat(),
+        'dry_run': dry_run,
+        'queued': len(messages),
+        'due': sum(1 for message in messages if message['kind'] == 'due'),
+        'missed': sum(1 for message in messages if message['kind'] == 'missed'),
+        'messages': [
+            {key: message[key] for key in ('loan_id', 'phone', 'kind', 'amount', 'body')}
+            for message in messages[:100]
+        ]
+    }
+
+def drain_outbox(sender=None, bucket=None, limit=DRAIN_BATCH):
+    """
+    Send queued messages whose next attempt is due, oldest first, at most
+    as fast as the token bucket allows. Each message is claimed before it
+    is sent, so the scheduled drain and POST /drain never both send it.
+    Failures are retried with exponential backoff and marked failed after
+    MAX_ATTEMPTS.
+    """
+    sender = sender or get_sender()
+    bucket = bucket or TokenBucket(reminder_rate(), reminder_burst())
+
+    message_ids = [message_id for (message_id,) in db.session.query(ReminderMessage.id).filter(
+        ReminderMessage.status == 'queued',
+        ReminderMessage.next_attempt_at <= datetime.utcnow()
+    ).order_by(ReminderMessage.id).limit(limit)]
+
+    result = {'sent': 0, 'retrying': 0, 'failed': 0}
+    for message_id in message_ids:
+        bucket.acquire()
+        if not claim_message(message_id):
+            continue
+        message = db.session.get(ReminderMessage, message_id)
+        try:
+            sender.send(message.phone, message.body)
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            result['sent'] += 1
+        except Exception as e:
+            message.last_error = str(e)
+            if message.attempts >= MAX_ATTEMPTS:
+                message.status = 'failed'
+                result['failed'] += 1
+            else:
+                message.next_attempt_at = datetime.utcnow() + timedelta(
+                    seconds=RETRY_DELAY_SECONDS * 2 ** (message.attempts - 1))
+                result['retrying'] += 1
+        # Delivery is at least once: a crash between the send and this commit
+        # leaves the message claimed, and it is sent again once the claim expires
+        db.session.commit()
+    return result
+
+@job_handler('reminder_drain')
+def run_reminder_drain_job(job, output_folder):
+    """Background job sending the queued reminders"""
+    result = drain_outbox(limit=job.get_params().get('limit', DRAIN_BATCH))
+    logger.info('Reminder outbox drained: %s', result)
+    return None
+
+@reminders_bp.route('/', methods=['GET'])
+@login_required
+@admin_required
+def get_reminders():
+    """Get reminder messages, optionally filtered by ?status= and ?date="""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+
+        query = ReminderMessage.query
+        if request.args.get('status'):
+            query = query.filter(ReminderMessage.status == request.args['status'])
+        if request.args.get('date'):
+            query = query.filter(ReminderMessage.reminder_date == request.args['date'])
+
+        reminders = query.order_by(ReminderMessage.id.desc()).paginate(page=page, per_page=per_page)
+        counts = dict(db.session.query(ReminderMessage.status, func.count(ReminderMessage.id)).group_by(
+            ReminderMessage.status))
+        return jsonify({
+            'reminders': [reminder.to_dict() for reminder in reminders.items],
+            'counts': counts,
+            'total_pages': reminders.pages,
+            'current_page': reminders.page
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reminders_bp.route('/generate', methods=['POST'])
+@login_required
+@admin_required
+def trigger_reminders():
+    """Queue today's reminders (?date=YYYY-MM-DD to backfill a day, ?dry_run=1 to preview)"""
+    try:
+        as_of = None
+        if request.args.get('date'):
+            try:
+                as_of = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+        result = generate_reminders(as_of=as_of, dry_run=request.args.get('dry_run') == '1')
+        return jsonify({
+            'message': f"{result['queued']} reminders {'would be queued' if result['dry_run'] else 'queued'}",
+            'reminders': result
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@reminders_bp.route('/drain', methods=['POST'])
+@login_required
+@admin_required
+def trigger_drain():
+    """
+    Starts sending the queued reminders in the background, at most ?limit=
+    (DRAIN_BATCH by default); pacing by the rate limit can take minutes.
+    """
+    try:
+        limit = min(request.args.get('limit', DRAIN_BATCH, type=int), DRAIN_BATCH)
+        job = enqueue_job('reminder_drain', {'limit': limit}, current_user.id)
+        return jsonify({
+            'message': 'Reminder drain started',
+            'job': job.to_dict(),
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Model Definition
+class ReminderMessage(db.Model):
+    __tablename__ = 'reminder_messages'
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'reminder_date', name='uq_reminder_messages_loan_date'),
+        db.Index('ix_reminder_messages_queue', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=False)
+    borrower_id = db.Column(db.Integer, db.ForeignKey('borrowers.id'), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    kind = db.Column(db.Enum('due', 'missed', name='reminder_kind'), nullable=False)
+    reminder_date = db.Column(db.Date, nullable=False)
+    installment_day = db.Column(db.Integer)  # Oldest unpaid installment the reminder covers
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum('queued', 'sent', 'failed', name='reminder_status'), default='queued', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'loan_id': self.loan_id,
+            'borrower_id': self.borrower_id,
+            'phone': self.phone,
+            'kind': self.kind,
+            'reminder_date': self.reminder_date.isoformat(),
+            'installment_day': self.installment_day,
+            'amount': float(self.amount),
+            'body': self.body,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<ReminderMessage Loan {self.loan_id} - {self.reminder_date} - {self.status}>'
@@ -1,10 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_login import login_required, current_user
 from user import db, User
+from borrowers import Borrower
 from loans import Loan
 from payments import Payment
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from archive import ArchivedLoan, ArchivedPayment
+from jobs import enqueue_job, job_handler
+from vintages import get_vintage_curves
+from forecast import get_cash_forecast
+from simulation import run_loss_simulation
+from auth import admin_required
+from aging import (BUCKET_NAMES, LoanAgingSnapshot, PortfolioAgingSnapshot,
+                   compute_aging_snapshot, latest_snapshot_date, par_summary)
+from sqlalchemy import func, case
+from datetime import datetime, date, timedelta
+import io
+import os
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -135,7 +146,7 @@ def outstanding_loans_report():
 @login_required
 def profit_loss_report():
     """
-    Report for profit and loss analysis.
+    Report for profit and loss analysis, archived loans included.
     """
     try:
         # Get date range from query params
@@ -149,7 +160,8 @@ def profit_loss_report():
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
         # Revenue calculation
-        loans_in_period = Loan.query.filter(Loan.start_date.between(start_date, end_date)).all()
+        loans_in_period = Loan.query.filter(Loan.start_date.between(start_date, end_date)).all() + \
+            ArchivedLoan.query.filter(ArchivedLoan.start_date.between(start_date, end_date)).all()
 
         principal_disbursed = sum(loan.principal_amount for loan in loans_in_period)
         interest_income = sum(loan.interest_amount for loan in loans_in_period)
@@ -231,7 +243,8 @@ def loans_by_purpose_report():
 @login_required
 def performance_report():
     """
-    Report for staff performance metrics.
+    Report for staff performance metrics. Loan counts, collections and the
+    portfolio total include archived loans.
     """
     try:
         # Get user filter from query params
@@ -249,19 +262,22 @@ def performance_report():
         for user in users:
             # Loan metrics
             loans = Loan.query.filter_by(account_officer_id=user.id).all()
-            total_loans = len(loans)
+            archived_loans = ArchivedLoan.query.filter_by(account_officer_id=user.id).all()
+            total_loans = len(loans) + len(archived_loans)
             active_loans = len([l for l in loans if l.status == 'active'])
-            completed_loans = len([l for l in loans if l.status == 'completed'])
+            completed_loans = len([l for l in loans + archived_loans if l.status == 'completed'])
             completion_rate = (completed_loans / total_loans * 100) if total_loans > 0 else 0
             
             # Collection metrics
-            payments = Payment.query.join(Loan).filter(Loan.account_officer_id == user.id).all()
+            payments = Payment.query.join(Loan).filter(Loan.account_officer_id == user.id).all() + \
+                ArchivedPayment.query.join(ArchivedLoan, ArchivedPayment.loan_id == ArchivedLoan.id).filter(
+                    ArchivedLoan.account_officer_id == user.id).all()
             total_expected = sum(p.expected_amount for p in payments)
             total_collected = sum(p.actual_amount for p in payments)
             collection_rate = (total_collected / total_expected * 100) if total_expected > 0 else 0
             
             # Portfolio metrics
-            total_portfolio = sum(l.principal_amount for l in loans)
+            total_portfolio = sum(l.principal_amount for l in loans + archived_loans)
             outstanding_portfolio = sum(l.get_outstanding_balance() for l in loans if l.status == 'active')
             
             performance_data.append({
@@ -293,3 +309,466 @@ def performance_report():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/portfolio-at-risk', methods=['GET'])
+@login_required
+def portfolio_at_risk_report():
+    """
+    Portfolio-at-risk (PAR1/7/30/60) from the stored daily aging snapshot.
+    Today's snapshot is computed on first use if the nightly job has not
+    produced it yet; a past ?date= only reads the snapshots stored by then.
+    Pass ?loans=1 for the per-loan aging of the latest day.
+    """
+    try:
+        date_str = request.args.get('date')
+        try:
+            as_of = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+        snapshot_date = latest_snapshot_date(as_of)
+        if as_of >= date.today() and (snapshot_date is None or (not date_str and snapshot_date < date.today())):
+            # Only today's snapshot is computed here: past days would be aged with today's payments
+            compute_aging_snapshot()
+            snapshot_date = date.today()
+        elif snapshot_date is None:
+            return jsonify({'error': f'No aging snapshot on or before {as_of.isoformat()}'}), 404
+
+        query = db.session.query(
+            PortfolioAgingSnapshot.account_officer_id,
+            User.full_name,
+            PortfolioAgingSnapshot.bucket,
+            PortfolioAgingSnapshot.loan_count,
+            PortfolioAgingSnapshot.outstanding_balance
+        ).join(User, PortfolioAgingSnapshot.account_officer_id == User.id).filter(
+            PortfolioAgingSnapshot.snapshot_date == snapshot_date
+        )
+
+        # Filter by user role if not admin
+        if not current_user.is_admin():
+            query = query.filter(PortfolioAgingSnapshot.account_officer_id == current_user.id)
+
+        portfolio_totals = {}
+        officer_totals = {}
+        officer_names = {}
+        for officer_id, officer_name, bucket, loan_count, balance in query:
+            officer_names[officer_id] = officer_name
+            officer_totals.setdefault(officer_id, {})[bucket] = (loan_count, balance)
+            count, total = portfolio_totals.get(bucket, (0, 0))
+            portfolio_totals[bucket] = (count + loan_count, total + balance)
+
+        report = {
+            'title': 'Portfolio at Risk Report',
+            'snapshot_date': snapshot_date.isoformat(),
+            'summary': par_summary(portfolio_totals),
+            'buckets': {
+                bucket: {
+                    'loan_count': portfolio_totals.get(bucket, (0, 0))[0],
+                    'outstanding': float(portfolio_totals.get(bucket, (0, 0))[1])
+                }
+                for bucket in BUCKET_NAMES
+            },
+            'officer_breakdown': [
+                dict(officer_id=officer_id, officer_name=officer_names[officer_id], **par_summary(totals))
+                for officer_id, totals in officer_totals.items()
+            ]
+        }
+
+        if request.args.get('loans') == '1':
+            loans_query = db.session.query(
+                LoanAgingSnapshot, Borrower.name
+            ).join(Loan, LoanAgingSnapshot.loan_id == Loan.id).join(
+                Borrower, Loan.borrower_id == Borrower.id
+            ).filter(LoanAgingSnapshot.snapshot_date == snapshot_date)
+            if not current_user.is_admin():
+                loans_query = loans_query.filter(LoanAgingSnapshot.account_officer_id == current_user.id)
+
+            report['loans'] = [
+                {
+                    'loan_id': aging.loan_id,
+                    'borrower_name': borrower_name,
+                    'days_past_due': aging.days_past_due,
+                    'bucket': aging.bucket,
+                    'outstanding_balance': float(aging.outstanding_balance)
+                }
+                for aging, borrower_name in loans_query.order_by(LoanAgingSnapshot.days_past_due.desc())
+            ]
+
+        return jsonify({'report': report}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/vintages', methods=['GET'])
+@login_required
+@admin_required
+def vintages_report():
+    """
+    Monthly vintage curves per loan start-month cohort. Cohorts are cached
+    and only recomputed when their loans or payments change.
+    """
+    try:
+        result = get_vintage_curves()
+        return jsonify({
+            'report': {
+                'title': 'Vintage Analysis',
+                'cohorts': result['cohorts'],
+                'recomputed_cohorts': result['recomputed']
+            }
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@reports_bp.route('/cash-forecast', methods=['GET'])
+@login_required
+def cash_forecast_report():
+    """
+    Expected inflows over the next ?days=N days (30 by default) per day and
+    per officer, net of prepayments, with a variant weighted by each
+    officer's collection rate. Cached until the next payment write.
+    """
+    try:
+        days = request.args.get('days', 30, type=int)
+        if days < 1 or days > 366:
+            return jsonify({'error': 'days must be between 1 and 366'}), 400
+
+        # Filter by user role if not admin
+        officer_id = None if current_user.is_admin() else current_user.id
+
+        forecast = get_cash_forecast(days, officer_id)
+        return jsonify({
+            'report': dict(title='Cash Flow Forecast', **forecast)
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/loss-simulation', methods=['GET'])
+@login_required
+def loss_simulation_report():
+    """
+    Monte Carlo expected loss, VaR95 and VaR99 of the active book, overall,
+    per officer and per loan purpose. Accepts ?scenarios=, ?seed= and, for
+    admins, ?workers= to split the scenarios across processes.
+    """
+    try:
+        scenarios = request.args.get('scenarios', 10000, type=int)
+        if scenarios < 100 or scenarios > 100000:
+            return jsonify({'error': 'scenarios must be between 100 and 100000'}), 400
+
+        workers = request.args.get('workers', 1, type=int)
+        if workers > 1 and not current_user.is_admin():
+            return jsonify({'error': 'Only admins can run the simulation on several workers'}), 403
+        workers = min(max(workers, 1), os.cpu_count() or 1)
+        seed = request.args.get('seed', type=int)
+
+        # Filter by user role if not admin
+        officer_id = None if current_user.is_admin() else current_user.id
+
+        result = run_loss_simulation(scenarios=scenarios, workers=workers, seed=seed, officer_id=officer_id)
+        return jsonify({
+            'report': dict(title='Portfolio Loss Simulation', **result)
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+# XLSX exports
+#
+# Each report below has a "table" builder returning its title, column headers
+# and an iterable of rows. Row-per-loan reports stream their rows straight from
+# the database, and the workbook is written in openpyxl's write-only mode, so
+# neither side holds the whole report in memory.
+
+# Reports with more rows than this are exported by a background job
+REPORT_BACKGROUND_ROWS = 5000
+
+# Rows fetched from the database per round trip while streaming
+REPORT_BATCH_SIZE = 1000
+
+def parse_report_date(value, name):
+    """Parse a YYYY-MM-DD report parameter"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {name}. Use YYYY-MM-DD')
+
+def daily_collections_table(user, args):
+    """Daily collections per officer"""
+    report_date = parse_report_date(args.get('date', date.today().isoformat()), 'date')
+
+    query = db.session.query(
+        User.full_name,
+        func.count(Payment.id),
+        func.sum(Payment.expected_amount),
+        func.sum(Payment.actual_amount)
+    ).join(User, Payment.recorded_by == User.id).filter(
+        Payment.payment_date == report_date
+    ).group_by(User.id, User.full_name)
+
+    if not user.is_admin():
+        query = query.join(Loan, Payment.loan_id == Loan.id).filter(Loan.account_officer_id == user.id)
+
+    def rows():
+        for name, count, expected, collected in query:
+            expected = expected or 0
+            collected = collected or 0
+            rate = round(float(collected / expected) * 100, 2) if expected > 0 else 0
+            yield [name, count, expected, collected, rate]
+
+    return {
+        'title': f'DAILY COLLECTIONS REPORT {report_date.isoformat()}',
+        'headers': ['ACCOUNT OFFICER', 'PAYMENTS', 'EXPECTED', 'COLLECTED', 'COLLECTION RATE %'],
+        'rows': rows()
+    }
+
+def outstanding_loans_query(user):
+    """Query one row per outstanding loan with its amount paid so far"""
+    paid = db.session.query(
+        Payment.loan_id,
+        func.sum(Payment.actual_amount).label('paid')
+    ).group_by(Payment.loan_id).subquery()
+
+    query = db.session.query(
+        Borrower.name,
+        Loan.start_date,
+        User.full_name,
+        Loan.principal_amount,
+        Loan.daily_repayment,
+        Loan.interest_amount,
+        Loan.expenses,
+        Loan.total_amount,
+        Loan.penalty_amount,
+        func.coalesce(paid.c.paid, 0),
+        Loan.status,
+        Loan.expected_end_date
+    ).join(Borrower, Loan.borrower_id == Borrower.id).join(
+        User, Loan.account_officer_id == User.id
+    ).outerjoin(paid, paid.c.loan_id == Loan.id).filter(
+        Loan.status.in_(['active', 'overdue'])
+    )
+
+    if not user.is_admin():
+        query = query.filter(Loan.account_officer_id == user.id)
+
+    return query.order_by(Loan.id)
+
+def outstanding_loans_table(user, args):
+    """Outstanding loans in the legacy repayment schedule layout"""
+    query = outstanding_loans_query(user)
+    today = date.today()
+
+    def rows():
+        for row in query.yield_per(REPORT_BATCH_SIZE):
+            (name, start_date, officer, principal, repayment, interest,
+             expenses, total, penalty, paid, status, expected_end_date) = row
+            days_overdue = (today - expected_end_date).days if today > expected_end_date else 0
+            yield [name, start_date, officer, principal, repayment, interest,
+                   expenses, total, penalty, paid, total + penalty - paid, status, days_overdue]
+
+    return {
+        'title': 'OUTSTANDING LOANS REPORT',
+        'headers': ['NAME', 'DATE', 'ACCOUNT OFFICER', 'PRINCIPAL', 'REPAYMENT AMOUNT', 'INTEREST',
+                    'EXPENSES', 'TOTAL', 'PENALTY', 'PAID', 'OUTSTANDING', 'STATUS', 'DAYS OVERDUE'],
+        'rows': rows(),
+        'row_count': query.count
+    }
+
+def profit_loss_table(user, args):
+    """Profit and loss line items for a period"""
+    start_date = parse_report_date(args.get('start_date'), 'start date')
+    end_date = parse_report_date(args.get('end_date'), 'end date')
+
+    principal, interest, fees = db.session.query(
+        func.coalesce(func.sum(Loan.principal_amount), 0),
+        func.coalesce(func.sum(Loan.interest_amount), 0),
+        func.coalesce(func.sum(Loan.expenses), 0)
+    ).filter(Loan.start_date.between(start_date, end_date)).one()
+
+    gross_revenue = interest + fees
+    salary_expenses = 0  # Placeholder for salary expenses, as in profit_loss_report
+
+    return {
+        'title': f'PROFIT & LOSS REPORT {start_date.isoformat()} TO {end_date.isoformat()}',
+        'headers': ['ITEM', 'AMOUNT'],
+        'rows': [
+            ['PRINCIPAL DISBURSED', principal],
+            ['INTEREST INCOME', interest],
+            ['FEE INCOME', fees],
+            ['GROSS REVENUE', gross_revenue],
+            ['SALARY EXPENSES', salary_expenses],
+            ['NET PROFIT', gross_revenue - salary_expenses]
+        ]
+    }
+
+def loans_by_purpose_table(user, args):
+    """Loan counts per purpose"""
+    query = db.session.query(
+        Loan.loan_purpose,
+        func.count(Loan.id)
+    ).group_by(Loan.loan_purpose)
+
+    if not user.is_admin():
+        query = query.filter(Loan.account_officer_id == user.id)
+
+    return {
+        'title': 'LOANS BY PURPOSE',
+        'headers': ['PURPOSE', 'LOANS'],
+        'rows': ([purpose or 'Unspecified', count] for purpose, count in query)
+    }
+
+def performance_table(user, args):
+    """Staff performance metrics per account officer"""
+    loan_stats = db.session.query(
+        Loan.account_officer_id,
+        func.count(Loan.id),
+        func.sum(case((Loan.status == 'active', 1), else_=0)),
+        func.sum(case((Loan.status == 'completed', 1), else_=0)),
+        func.sum(Loan.principal_amount)
+    ).group_by(Loan.account_officer_id)
+
+    payment_stats = db.session.query(
+        Loan.account_officer_id,
+        func.count(Payment.id),
+        func.sum(Payment.expected_amount),
+        func.sum(Payment.actual_amount)
+    ).join(Loan, Payment.loan_id == Loan.id).group_by(Loan.account_officer_id)
+
+    officers = User.query.filter_by(role='account_officer')
+    user_id = args.get('user_id')
+    if user_id:
+        officers = officers.filter_by(id=user_id)
+
+    loans_by_officer = {row[0]: row[1:] for row in loan_stats}
+    payments_by_officer = {row[0]: row[1:] for row in payment_stats}
+
+    def rows():
+        for officer in officers.order_by(User.full_name):
+            total_loans, active, completed, portfolio = loans_by_officer.get(officer.id, (0, 0, 0, 0))
+            payment_count, expected, collected = payments_by_officer.get(officer.id, (0, 0, 0))
+            expected = expected or 0
+            collected = collected or 0
+            yield [
+                officer.full_name, total_loans, active, completed,
+                round(completed / total_loans * 100, 2) if total_loans else 0,
+                payment_count, expected, collected,
+                round(float(collected / expected) * 100, 2) if expected > 0 else 0,
+                portfolio or 0
+            ]
+
+    return {
+        'title': 'STAFF PERFORMANCE REPORT',
+        'headers': ['ACCOUNT OFFICER', 'LOANS', 'ACTIVE', 'COMPLETED', 'COMPLETION RATE %',
+                    'PAYMENTS', 'EXPECTED', 'COLLECTED', 'COLLECTION RATE %', 'PORTFOLIO'],
+        'rows': rows()
+    }
+
+REPORT_TABLES = {
+    'daily-collections': daily_collections_table,
+    'outstanding-loans': outstanding_loans_table,
+    'profit-loss': profit_loss_table,
+    'loans-by-purpose': loans_by_purpose_table,
+    'performance': performance_table
+}
+
+def write_report_xlsx(target, table):
+    """Write a report table to ``target`` using the legacy schedule layout.
+
+    Like ADELABLOANREPAYMENTSCHEDULE.xlsx: the title is merged across row 2-3,
+    headers are on row 4 starting with S/N and data starts on row 5.
+    """
+    # Imported here so only workers that export spreadsheets pay for openpyxl
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Report')
+    headers = ['S/N'] + table['headers']
+
+    ws.freeze_panes = 'C5'
+    ws.merged_cells.add(f'B2:{chr(ord("A") + min(len(headers), 10) - 1)}3')
+    ws.column_dimensions['B'].width = 30
+
+    title = WriteOnlyCell(ws, value=table['title'])
+    title.font = Font(bold=True, size=14)
+    ws.append([])
+    ws.append([None, title])
+    ws.append([])
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for serial, row in enumerate(table['rows'], start=1):
+        ws.append([serial] + list(row))
+
+    wb.save(target)
+
+def report_filename(report_name):
+    """Get the download name of an exported report"""
+    return f"{report_name}_{date.today().isoformat()}.xlsx"
+
+@job_handler('report_xlsx')
+def run_report_export_job(job, output_folder):
+    """Background job writing a report workbook to disk"""
+    params = job.get_params()
+    report_name = params['report']
+    table = REPORT_TABLES[report_name](db.session.get(User, job.requested_by), params.get('args', {}))
+
+    filename = f"job_{job.id}_{report_filename(report_name)}"
+    write_report_xlsx(os.path.join(output_folder, filename), table)
+    return filename
+
+@reports_bp.route('/<report_name>/export', methods=['GET'])
+@login_required
+def export_report(report_name):
+    """
+    Download a report as XLSX. Large reports are handed to a background
+    job and a link to poll for the download is returned instead.
+    """
+    try:
+        if report_name not in REPORT_TABLES:
+            return jsonify({'error': 'Unknown report'}), 404
+
+        args = request.args.to_dict()
+        background = args.pop('background', None) == '1'
+
+        try:
+            table = REPORT_TABLES[report_name](current_user, args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not background and 'row_count' in table:
+            background = table['row_count']() > REPORT_BACKGROUND_ROWS
+
+        if background:
+            job = enqueue_job('report_xlsx', {'report': report_name, 'args': args}, current_user.id)
+            return jsonify({
+                'message': 'Report export started',
+                'job': job.to_dict(),
+                'status_url': f'/api/jobs/{job.id}'
+            }), 202
+
+        output = io.BytesIO()
+        write_report_xlsx(output, table)
+        output.seek(0)
+        return send_file(
+            output,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=report_filename(report_name)
+        )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,264 @@
+from user import db
+from loans import Loan, DEFAULT_STATUSES
+from payments import Payment
+from installments import Installment
+from jobs import job_handler
+from sqlalchemy import event, func, case, and_, inspect
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+# Score points taken off per defaulted loan
+DEFAULT_PENALTY = 25
+
+# Days of average lateness at which the lateness component is halved
+LATENESS_HALF_LIFE_DAYS = 7
+
+# Running aggregates kept per borrower
+COMPONENTS = ('payment_count', 'on_time_count', 'days_late_total', 'partial_count',
+              'loan_count', 'completed_loans', 'defaulted_loans')
+
+def loaded_due_dates(session):
+    """Due dates of the installments already loaded in the session, by loan and day"""
+    due_dates = {}
+    for instance in session.identity_map.values():
+        if isinstance(instance, Installment):
+            values = inspect(instance).dict
+            if 'loan_id' in values and 'day' in values and 'due_date' in values:
+                due_dates[values['loan_id'], values['day']] = values['due_date']
+    return due_dates
+
+def payment_contribution(session, loan_id, payment_day, payment_date, actual_amount, expected_amount, due_dates=None):
+    """
+    What one payment adds to its borrower's aggregates. Lateness is measured
+    against the due date of the installment the payment is for, taken from
+    ``due_dates`` when given and queried otherwise.
+    """
+    due_date = None
+    if payment_day is not None:
+        due_date = (due_dates or {}).get((loan_id, payment_day)) or \
+            session.query(Installment.due_date).filter_by(loan_id=loan_id, day=payment_day).scalar()
+    days_late = max((payment_date - due_date).days, 0) if due_date and payment_date else 0
+    return {
+        'payment_count': 1,
+        'on_time_count': 1 if days_late == 0 else 0,
+        'days_late_total': days_late,
+        'partial_count': 1 if (actual_amount or 0) < (expected_amount or 0) else 0
+    }
+
+def loan_contribution(status):
+    """What one loan in a given status adds to its borrower's aggregates"""
+    return {
+        'loan_count': 1,
+        'completed_loans': 1 if status == 'completed' else 0,
+        'defaulted_loans': 1 if status in DEFAULT_STATUSES else 0
+    }
+
+def previous_value(instance, attribute):
+    """The value an attribute had when the instance was loaded"""
+    history = inspect(instance).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(instance, attribute)
+
+def payment_values(payment, previous=False):
+    """The fields of a payment that feed the score, as loaded or as they are now"""
+    read = (lambda attribute: previous_value(payment, attribute)) if previous else \
+        (lambda attribute: getattr(payment, attribute))
+    return (read('loan_id'), read('payment_day'), read('payment_date'),
+            read('actual_amount'), read('expected_amount'))
+
+@event.listens_for(Session, 'before_flush')
+def _update_risk_scores(session, flush_context, instances):
+    """
+    Fold payment and loan changes into the borrowers' running aggregates in
+    the same transaction, so every write path keeps the scores current.
+    """
+    deltas = {}
+
+    def add(loan_id, contribution, sign):
+        loan = session.get(Loan, loan_id) if loan_id else None
+        if loan is None or loan.borrower_id is None:
+            return
+        totals = deltas.setdefault(loan.borrower_id, dict.fromkeys(COMPONENTS, 0))
+        for component, value in contribution.items():
+            totals[component] += sign * value
+
+    with session.no_autoflush:
+        # Bulk recorded payments find their installments loaded already, saving a query each
+        new_payments = sum(isinstance(instance, Payment) for instance in session.new)
+        due_dates = loaded_due_dates(session) if new_payments > 1 else None
+
+        for instance in session.new:
+            if isinstance(instance, Payment):
+                add(instance.loan_id, payment_contribution(session, *payment_values(instance), due_dates=due_dates), 1)
+            elif isinstance(instance, Loan):
+                deltas.setdefault(instance.borrower_id, dict.fromkeys(COMPONENTS, 0))
+                for component, value in loan_contribution(instance.status or 'active').items():
+                    deltas[instance.borrower_id][component] += value
+
+        for instance in session.dirty:
+            if isinstance(instance, Payment) and session.is_modified(instance):
+                old, new = payment_values(instance, previous=True), payment_values(instance)
+                if old != new:
+                    add(old[0], payment_contribution(session, *old), -1)
+                    add(new[0], payment_contribution(session, *new), 1)
+            elif isinstance(instance, Loan):
+                old_status = previous_value(instance, 'status')
+                if old_status != instance.status:
+                    add(instance.id, loan_contribution(old_status), -1)
+                    add(instance.id, loan_contribution(instance.status), 1)
+
+        for instance in session.deleted:
+            if isinstance(instance, Payment):
+                add(previous_value(instance, 'loan_id'),
+                    payment_contribution(session, *payment_values(instance, previous=True)), -1)
+            elif isinstance(instance, Loan):
+                add(instance.id, loan_contribution(previous_value(instance, 'status')), -1)
+
+        deltas = {borrower: totals for borrower, totals in deltas.items() if borrower and any(totals.values())}
+        if not deltas:
+            return
+
+        scores = {
+            score.borrower_id: score
+            for score in session.query(BorrowerRiskScore).filter(BorrowerRiskScore.borrower_id.in_(deltas))
+        }
+        for borrower_id, totals in deltas.items():
+            score = scores.get(borrower_id)
+            if score is None:
+                score = BorrowerRiskScore(borrower_id=borrower_id, **dict.fromkeys(COMPONENTS, 0))
+                session.add(score)
+            for component, value in totals.items():
+                setattr(score, component, max((getattr(score, component) or 0) + value, 0))
+            score.refresh_score()
+
+def history_stats(loans, payments, installments, borrower_ids=None):
+    """Per borrower payment and loan aggregates over one set of loan, payment and installment tables"""
+    days_late = func.max(func.coalesce(func.julianday(payments.c.payment_date) - func.julianday(installments.c.due_date), 0), 0)
+    payment_stats = db.session.query(
+        loans.c.borrower_id,
+        func.count(payments.c.id),
+        func.sum(case((days_late == 0, 1), else_=0)),
+        func.coalesce(func.sum(days_late), 0),
+        func.sum(case((payments.c.actual_amount < payments.c.expected_amount, 1), else_=0))
+    ).select_from(payments).join(loans, payments.c.loan_id == loans.c.id).outerjoin(installments, and_(
+        installments.c.loan_id == payments.c.loan_id,
+        installments.c.day == payments.c.payment_day
+    )).group_by(loans.c.borrower_id)
+
+    loan_stats = db.session.query(
+        loans.c.borrower_id,
+        func.count(loans.c.id),
+        func.sum(case((loans.c.status == 'completed', 1), else_=0)),
+        func.sum(case((loans.c.status.in_(DEFAULT_STATUSES), 1), else_=0))
+    ).group_by(loans.c.borrower_id)
+
+    if borrower_ids is not None:
+        payment_stats = payment_stats.filter(loans.c.borrower_id.in_(borrower_ids))
+        loan_stats = loan_stats.filter(loans.c.borrower_id.in_(borrower_ids))
+    return payment_stats, loan_stats
+
+def recompute_risk_scores(borrower_ids=None):
+    """
+    Rebuild the running aggregates from the full payment and loan history
+    with two grouped queries on the hot tables and two on the archive,
+    replacing the stored rows. Returns the number of borrowers scored.
+    """
+    from archive import archive_of
+
+    models = (Loan, Payment, Installment)
+    rows = {}
+    for loans, payments, installments in ([model.__table__ for model in models], [archive_of(model) for model in models]):
+        payment_stats, loan_stats = history_stats(loans, payments, installments, borrower_ids)
+
+        for borrower_id, loan_count, completed, defaulted in loan_stats:
+            if borrower_id not in rows:
+                rows[borrower_id] = BorrowerRiskScore(borrower_id=borrower_id, **dict.fromkeys(COMPONENTS, 0))
+            score = rows[borrower_id]
+            score.loan_count += loan_count
+            score.completed_loans += completed or 0
+            score.defaulted_loans += defaulted or 0
+        for borrower_id, payment_count, on_time, total_late, partial in payment_stats:
+            score = rows[borrower_id]
+            score.payment_count += payment_count
+            score.on_time_count += on_time or 0
+            score.days_late_total += int(total_late or 0)
+            score.partial_count += partial or 0
+
+    stale = BorrowerRiskScore.query
+    if borrower_ids is not None:
+        stale = stale.filter(BorrowerRiskScore.borrower_id.in_(borrower_ids))
+    stale.delete(synchronize_session=False)
+
+    for score in rows.values():
+        score.refresh_score()
+    db.session.add_all(rows.values())
+    db.session.commit()
+    return len(rows)
+
+def get_borrower_score(borrower_id):
+    """Get a borrower's stored score row (a single indexed lookup)"""
+    return BorrowerRiskScore.query.filter_by(borrower_id=borrower_id).first()
+
+@job_handler('risk_score_recompute')
+def run_risk_score_recompute_job(job, output_folder):
+    """Background job rebuilding every borrower's risk score"""
+    recompute_risk_scores()
+    return None
+
+
+# Model Definition
+class BorrowerRiskScore(db.Model):
+    __tablename__ = 'borrower_risk_scores'
+
+    id = db.Column(db.Integer, primary_key=True)
+    borrower_id = db.Column(db.Integer, db.ForeignKey('borrowers.id'), unique=True, nullable=False)
+
+    # Running aggregates
+    payment_count = db.Column(db.Integer, default=0, nullable=False)
+    on_time_count = db.Column(db.Integer, default=0, nullable=False)
+    days_late_total = db.Column(db.Integer, default=0, nullable=False)
+    partial_count = db.Column(db.Integer, default=0, nullable=False)
+    loan_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_loans = db.Column(db.Integer, default=0, nullable=False)
+    defaulted_loans = db.Column(db.Integer, default=0, nullable=False)
+
+    score = db.Column(db.Numeric(5, 2))  # 0-100, None without repayment history
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def refresh_score(self):
+        """
+        Recompute the score from the aggregates: half on-time ratio, a fifth
+        full-payment ratio and the rest for low average lateness, less
+        DEFAULT_PENALTY points per defaulted loan
+        """
+        if not self.payment_count and not self.defaulted_loans:
+            self.score = None
+            return
+
+        payments = self.payment_count or 0
+        on_time_ratio = self.on_time_count / payments if payments else 1
+        partial_ratio = self.partial_count / payments if payments else 0
+        average_days_late = self.days_late_total / payments if payments else 0
+        lateness = LATENESS_HALF_LIFE_DAYS / (LATENESS_HALF_LIFE_DAYS + average_days_late)
+
+        score = 100 * (0.5 * on_time_ratio + 0.2 * (1 - partial_ratio) + 0.3 * lateness)
+        score -= DEFAULT_PENALTY * self.defaulted_loans
+        self.score = round(min(max(score, 0), 100), 2)
+
+    def to_dict(self):
+        """Serialize the score and its components for API responses"""
+        payments = self.payment_count or 0
+        return {
+            'borrower_id': self.borrower_id,
+            'score': float(self.score) if self.score is not None else None,
+            'payment_count': payments,
+            'on_time_ratio': round(self.on_time_count / payments, 4) if payments else None,
+            'average_days_late': round(self.days_late_total / payments, 2) if payments else None,
+            'partial_payment_ratio': round(self.partial_count / payments, 4) if payments else None,
+            'loan_count': self.loan_count,
+            'completed_loans': self.completed_loans,
+            'defaulted_loans': self.defaulted_loans,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<BorrowerRiskScore Borrower {self.borrower_id} - {self.score}>'
@@ -1,13 +1,227 @@
-from flask import Blueprint
-from user import db
-from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from user import db, User
+from loans import Loan
+from payments import Payment
+from archive import archive_of
+from settings import SystemSetting
+from auth import admin_required
+from pricing import to_cents, to_rate_units, interest_cents, from_cents
+from sqlalchemy import func, or_, select
+from datetime import datetime, date
+from decimal import Decimal
 
 salary_bp = Blueprint('salary', __name__)
 
+def parse_period(period):
+    """Parse a YYYY-MM period into its first day and the first day of the next month"""
+    try:
+        start = datetime.strptime(period or '', '%Y-%m').date()
+    except ValueError:
+        raise ValueError('Invalid period format. Use YYYY-MM')
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+def officer_collections(start, end):
+    """
+    Collections and payment counts per account officer between two dates
+    (end exclusive), archived payments included, in one grouped query per
+    table pair
+    """
+    collections = {}
+    for loans, payments in ((Loan.__table__, Payment.__table__), (archive_of(Loan), archive_of(Payment))):
+        for officer_id, amount, count in db.session.execute(select(
+            loans.c.account_officer_id,
+            func.coalesce(func.sum(payments.c.actual_amount), 0),
+            func.count(payments.c.id)
+        ).join_from(payments, loans, payments.c.loan_id == loans.c.id).where(
+            payments.c.payment_date >= start,
+            payments.c.payment_date < end
+        ).group_by(loans.c.account_officer_id)):
+            total, payment_count = collections.get(officer_id, (0, 0))
+            collections[officer_id] = (total + amount, payment_count + count)
+    return collections
+
+def compute_salaries(start, end, officer_id=None):
+    """
+    Base salary plus commission on collections for every active account
+    officer, and anyone else who collected in the period, using per-officer
+    overrides where set and the settings defaults otherwise
+    """
+    collections = officer_collections(start, end)
+    default_base = SystemSetting.get_setting('base_salary_default', '0')
+    default_rate = SystemSetting.get_setting('commission_rate_default', '0')
+    overrides = {override.user_id: override for override in OfficerCompensation.query}
+
+    officers = User.query.filter(or_(
+        (User.role == 'account_officer') & User.is_active,
+        User.id.in_(list(collections))
+    ))
+    if officer_id:
+        officers = officers.filter(User.id == officer_id)
+
+    salaries = []
+    for officer in officers.order_by(User.full_name):
+        override = overrides.get(officer.id)
+        base_salary = override.base_salary if override and override.base_salary is not None else default_base
+        commission_rate = override.commission_rate if override and override.commission_rate is not None else default_rate
+        total_collections, payment_count = collections.get(officer.id, (0, 0))
+
+        base_cents = int(to_cents(base_salary))
+        commission_cents = int(interest_cents(to_cents(total_collections), to_rate_units(commission_rate)))
+        salaries.append({
+            'user_id': officer.id,
+            'officer_name': officer.full_name,
+            'base_salary': from_cents(base_cents),
+            'commission_rate': Decimal(str(commission_rate)),
+            'total_collections': from_cents(to_cents(total_collections)),
+            'payment_count': payment_count,
+            'commission_amount': from_cents(commission_cents),
+            'total_salary': from_cents(base_cents + commission_cents)
+        })
+    return salaries
+
+def salary_json(salary):
+    """JSON friendly copy of a computed salary"""
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in salary.items()}
+
+@salary_bp.route('/run', methods=['POST'])
+@login_required
+@admin_required
+def run_salaries():
+    """
+    Compute and store the salaries of every officer for a period
+    (?period=YYYY-MM). Rerunning a period updates its rows in place.
+    """
+    try:
+        period = request.args.get('period')
+        try:
+            start, end = parse_period(period)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if start > date.today():
+            return jsonify({'error': 'Salaries cannot be run for a future period'}), 400
+        period = start.strftime('%Y-%m')
+
+        salaries = compute_salaries(start, end)
+        existing = {
+            calculation.user_id: calculation
+            for calculation in SalaryCalculation.query.filter_by(calculation_period=period)
+        }
+        for salary in salaries:
+            calculation = existing.get(salary['user_id'])
+            if not calculation:
+                calculation = SalaryCalculation(user_id=salary['user_id'], calculation_period=period)
+                db.session.add(calculation)
+            for field in ('base_salary', 'commission_rate', 'total_collections', 'commission_amount', 'total_salary'):
+                setattr(calculation, field, salary[field])
+        db.session.commit()
+
+        return jsonify({
+            'message': f'Salaries computed for {period}',
+            'period': period,
+            'salaries': [salary_json(salary) for salary in salaries],
+            'total_salaries': float(sum(salary['total_salary'] for salary in salaries))
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@salary_bp.route('/', methods=['GET'])
+@login_required
+def get_salaries():
+    """Get stored salary calculations, optionally for one period (?period=YYYY-MM)"""
+    try:
+        query = SalaryCalculation.query
+
+        # Filter by user role
+        if not current_user.is_admin():
+            query = query.filter(SalaryCalculation.user_id == current_user.id)
+
+        if request.args.get('period'):
+            query = query.filter(SalaryCalculation.calculation_period == request.args['period'])
+
+        calculations = query.order_by(SalaryCalculation.calculation_period.desc(), SalaryCalculation.user_id).all()
+        return jsonify({
+            'salaries': [calculation.to_dict() for calculation in calculations]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@salary_bp.route('/preview', methods=['GET'])
+@login_required
+def preview_salaries():
+    """Live month-to-date salary and commission, from the same aggregates as the salary run"""
+    try:
+        today = date.today()
+        start, end = parse_period(today.strftime('%Y-%m'))
+        officer_id = None if current_user.is_admin() else current_user.id
+
+        salaries = compute_salaries(start, end, officer_id=officer_id)
+        return jsonify({
+            'period': start.strftime('%Y-%m'),
+            'as_of': today.isoformat(),
+            'salaries': [salary_json(salary) for salary in salaries]
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@salary_bp.route('/compensation', methods=['GET'])
+@login_required
+@admin_required
+def get_compensation():
+    """Get the per-officer compensation overrides"""
+    try:
+        return jsonify({
+            'compensation': [override.to_dict() for override in OfficerCompensation.query.order_by(OfficerCompensation.user_id)],
+            'defaults': {
+                'base_salary': float(SystemSetting.get_setting('base_salary_default', '0')),
+                'commission_rate': float(SystemSetting.get_setting('commission_rate_default', '0'))
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@salary_bp.route('/compensation/<int:user_id>', methods=['PUT'])
+@login_required
+@admin_required
+def set_compensation(user_id):
+    """Set an officer's base salary and/or commission rate; null falls back to the defaults"""
+    try:
+        User.query.get_or_404(user_id)
+        data = request.get_json() or {}
+
+        for field in ('base_salary', 'commission_rate'):
+            if data.get(field) is not None and float(data[field]) < 0:
+                return jsonify({'error': f'{field} must be 0 or greater'}), 400
+
+        override = OfficerCompensation.query.filter_by(user_id=user_id).first()
+        if not override:
+            override = OfficerCompensation(user_id=user_id)
+            db.session.add(override)
+        for field in ('base_salary', 'commission_rate'):
+            if field in data:
+                setattr(override, field, Decimal(str(data[field])) if data[field] is not None else None)
+        override.updated_by = current_user.id
+        override.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Compensation updated successfully',
+            'compensation': override.to_dict()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 # Model Definition
 class SalaryCalculation(db.Model):
     __tablename__ = 'salary_calculations'
-    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'calculation_period', name='uq_salary_calculations_user_period'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     calculation_period = db.Column(db.String(20), nullable=False)
@@ -17,3 +231,34 @@ class SalaryCalculation(db.Model):
     commission_amount = db.Column(db.Numeric(10, 2), default=0.00)
     total_salary = db.Column(db.Numeric(10, 2), default=0.00)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'calculation_period': self.calculation_period,
+            'base_salary': float(self.base_salary or 0),
+            'commission_rate': float(self.commission_rate or 0),
+            'total_collections': float(self.total_collections or 0),
+            'commission_amount': float(self.commission_amount or 0),
+            'total_salary': float(self.total_salary or 0),
+            'created_at': self.created_at.isoformat()
+        }
+
+class OfficerCompensation(db.Model):
+    __tablename__ = 'officer_compensations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    base_salary = db.Column(db.Numeric(10, 2))  # None uses base_salary_default
+    commission_rate = db.Column(db.Numeric(5, 2))  # None uses commission_rate_default
+    updated_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'base_salary': float(self.base_salary) if self.base_salary is not None else None,
+            'commission_rate': float(self.commission_rate) if self.commission_rate is not None else None,
+            'updated_at': self.updated_at.isoformat()
+        }
@@ -0,0 +1,115 @@
+import numpy as np
+
+from business_calendar import get_business_calendar
+from products import DEFAULT_PLAN, plan_for
+
+class PaymentScheduleBatch:
+    """
+    Payment schedules of many loans as flat parallel arrays, one entry per
+    installment: loan_id, day (1-based), date (datetime64[D]) and amount.
+    Entries are grouped by loan in input order, days ascending.
+    """
+
+    def __init__(self, loan_id, day, date, amount):
+        self.loan_id = loan_id
+        self.day = day
+        self.date = date
+        self.amount = amount
+
+    def __len__(self):
+        return len(self.loan_id)
+
+    def for_loan(self, loan_id):
+        """Get the schedule of one loan as a new batch"""
+        mask = self.loan_id == loan_id
+        return PaymentScheduleBatch(self.loan_id[mask], self.day[mask], self.date[mask], self.amount[mask])
+
+    def to_dicts(self):
+        """Convert to the list of dicts returned by Loan.get_payment_schedule"""
+        return [
+            {'day': int(day), 'date': date, 'expected_amount': float(amount)}
+            for day, date, amount in zip(self.day, self.date.astype(object), self.amount)
+        ]
+
+def schedule_arrays(loan_ids, start_dates, durations, amounts, calendar=None, plan=None):
+    """
+    Build the payment schedules of many loans at once.
+
+    ``durations`` are installment counts and ``amounts`` the amount of
+    every installment of each loan. By default
+    installment n of a loan falls on the n-th business day on or after its
+    start date, which is what stepping day by day and skipping non-business
+    days produces; every due date is computed in a single vectorized call.
+    A RepaymentPlan can supply other frequencies. Without a BusinessCalendar
+    only weekends are skipped.
+    """
+    loan_ids = np.asarray(loan_ids, dtype=np.int64)
+    starts = np.asarray(start_dates, dtype='datetime64[D]')
+    durations = np.maximum(np.asarray(durations, dtype=np.int64), 0)
+    amounts = np.asarray(amounts, dtype=np.float64)
+
+    # Offset of each loan's first installment in the flat arrays
+    first = np.cumsum(durations) - durations
+    day = np.arange(durations.sum(), dtype=np.int64) - np.repeat(first, durations) + 1
+
+    loan_starts = np.repeat(starts, durations)
+    if plan is not None:
+        date = plan.due_dates(loan_starts, day - 1, calendar)
+    elif calendar is None:
+        date = np.busday_offset(loan_starts, day - 1, roll='forward')
+    else:
+        date = calendar.offset(loan_starts, day - 1)
+
+    return PaymentScheduleBatch(
+        np.repeat(loan_ids, durations),
+        day,
+        date,
+        np.repeat(amounts, durations)
+    )
+
+def concatenate_batches(batches):
+    """Join schedule batches into one"""
+    return PaymentScheduleBatch(*(
+        np.concatenate([getattr(batch, name) for batch in batches])
+        for name in ('loan_id', 'day', 'date', 'amount')
+    ))
+
+def batch_payment_schedule(loans, calendar=None):
+    """
+    Build the payment schedules of many Loan objects at once, on the app's
+    business calendar unless another one is given. Loans are scheduled by
+    their product's repayment plan, one vectorized pass per plan.
+    """
+    loans = list(loans)
+    calendar = calendar or get_business_calendar()
+
+    by_plan = {}
+    for position, loan in enumerate(loans):
+        plan = plan_for(loan)
+        by_plan.setdefault(plan.key, (plan, []))[1].append(position)
+
+    batches = []
+    loan_positions = []
+    for plan, positions in by_plan.values() or [(DEFAULT_PLAN, [])]:
+        group = [loans[position] for position in positions]
+        counts, amounts = plan.schedule_arrays(group)
+        batch = schedule_arrays(
+            [loan.id or 0 for loan in group],
+            [loan.start_date for loan in group],
+            counts,
+            np.zeros(len(group)),
+            calendar,
+            plan
+        )
+        # Installment amounts differ within a loan (remainder, amortization)
+        batch.amount = amounts / 100
+        batches.append(batch)
+        loan_positions.append(np.repeat(np.asarray(positions, dtype=np.int64), counts))
+
+    if len(batches) == 1:
+        return batches[0]
+
+    # Put installments back in the order the loans were given
+    order = np.argsort(np.concatenate(loan_positions), kind='stable')
+    batch = concatenate_batches(batches)
+    return PaymentScheduleBatch(batch.loan_id[order], batch.day[order], batch.date[order], batch.amount[order])
@@ -0,0 +1,258 @@
+from user import db, User
+from loans import Loan, DEFAULT_STATUSES
+from payments import Payment
+from installments import Installment, backfill_installments
+from allocations import PaymentAllocation
+from archive import archive_of
+from sqlalchemy import func, case, and_, select
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+# Share of the outstanding balance lost when a loan defaults
+DEFAULT_LGD = 0.6
+
+# Share of the outstanding balance lost (collection cost, delayed cash) when a loan runs late
+DEFAULT_LATE_LOSS_RATE = 0.05
+
+# Volatility of the systematic default factor (CreditRisk+ style, mean 1)
+DEFAULT_FACTOR_VOLATILITY = 0.5
+
+# Weight, in installments, of the portfolio-wide rates a loan's own history is shrunk towards
+PRIOR_WEIGHT = 10
+
+# Scenarios simulated per block, bounding memory to block x loans floats
+SCENARIO_BLOCK = 200
+
+def loan_history_query(as_of):
+    """
+    Query exposure and repayment history of every active or overdue loan:
+    outstanding balance, installments due so far, installments missed and
+    installments paid in full by a payment made after their due date
+    """
+    paid_on = db.session.query(
+        PaymentAllocation.installment_id,
+        func.max(Payment.payment_date).label('paid_on')
+    ).join(Payment, PaymentAllocation.payment_id == Payment.id).group_by(
+        PaymentAllocation.installment_id
+    ).subquery()
+
+    history = db.session.query(
+        Installment.loan_id,
+        func.count(Installment.id).label('due'),
+        func.sum(case((Installment.paid_amount < Installment.expected_amount, 1), else_=0)).label('missed'),
+        func.sum(case((and_(Installment.paid_amount >= Installment.expected_amount,
+                            paid_on.c.paid_on > Installment.due_date), 1), else_=0)).label('late')
+    ).outerjoin(
+        paid_on, paid_on.c.installment_id == Installment.id
+    ).filter(Installment.due_date < as_of).group_by(Installment.loan_id).subquery()
+
+    paid_by_loan = db.session.query(
+        Payment.loan_id,
+        func.sum(Payment.actual_amount).label('paid')
+    ).group_by(Payment.loan_id).subquery()
+
+    return db.session.query(
+        Loan.id,
+        Loan.account_officer_id,
+        func.coalesce(Loan.loan_purpose, 'Unspecified'),
+        Loan.total_amount + Loan.penalty_amount - func.coalesce(paid_by_loan.c.paid, 0),
+        func.coalesce(history.c.due, 0),
+        func.coalesce(history.c.missed, 0),
+        func.coalesce(history.c.late, 0)
+    ).outerjoin(
+        paid_by_loan, paid_by_loan.c.loan_id == Loan.id
+    ).outerjoin(
+        history, history.c.loan_id == Loan.id
+    ).filter(Loan.status.in_(['active', 'overdue']))
+
+def portfolio_default_rate():
+    """
+    Share of closed loans, archived ones included, that defaulted or were
+    written off, with a uniform prior
+    """
+    completed = defaulted = 0
+    for loans in (Loan.__table__, archive_of(Loan)):
+        completed_count, defaulted_count = db.session.execute(select(
+            func.sum(case((loans.c.status == 'completed', 1), else_=0)),
+            func.sum(case((loans.c.status.in_(DEFAULT_STATUSES), 1), else_=0))
+        )).one()
+        completed += completed_count or 0
+        defaulted += defaulted_count or 0
+    return (defaulted + 1) / (completed + defaulted + 2)
+
+def estimate_probabilities(due, missed, late, base_default_rate):
+    """
+    Estimate per-loan default and late-payment probabilities from repayment
+    history. The share of installments missed and the share of paid ones
+    paid late are shrunk towards the portfolio rates by PRIOR_WEIGHT, so new
+    loans with little history sit near the portfolio average.
+    """
+    due, missed, late = (np.asarray(values, dtype=float) for values in (due, missed, late))
+    paid = due - missed
+    base_late_rate = late.sum() / paid.sum() if paid.sum() else 0.0
+
+    default_probability = (base_default_rate * PRIOR_WEIGHT + missed) / (PRIOR_WEIGHT + due)
+    late_probability = (base_late_rate * PRIOR_WEIGHT + late) / (PRIOR_WEIGHT + paid)
+    late_probability = np.minimum(late_probability, 1 - default_probability)
+    return default_probability, late_probability
+
+def simulate_losses(default_probability, late_probability, exposure, groups, scenarios,
+                    lgd=DEFAULT_LGD, late_loss_rate=DEFAULT_LATE_LOSS_RATE,
+                    factor_volatility=DEFAULT_FACTOR_VOLATILITY, seed=None):
+    """
+    Simulate portfolio losses. Each scenario draws a gamma distributed
+    systematic factor with mean 1 that scales every loan's probabilities,
+    then one uniform per loan decides default, late payment or neither.
+    ``groups`` is a loans x groups 0/1 matrix; the result is a scenarios x
+    groups matrix of losses. Scenarios are run in blocks to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    default_probability = np.asarray(default_probability, dtype=np.float32)
+    late_probability = np.asarray(late_probability, dtype=np.float32)
+    default_loss = np.asarray(exposure, dtype=np.float32) * np.float32(lgd)
+    late_loss = np.asarray(exposure, dtype=np.float32) * np.float32(late_loss_rate)
+    groups = np.asarray(groups, dtype=np.float32)
+
+    shape = 1 / factor_volatility ** 2
+    losses = np.empty((scenarios, groups.shape[1]), dtype=np.float64)
+
+    for first in range(0, scenarios, SCENARIO_BLOCK):
+        block = min(SCENARIO_BLOCK, scenarios - first)
+        factor = rng.gamma(shape, 1 / shape, size=(block, 1)).astype(np.float32)
+        defaults = np.minimum(default_probability * factor, 1)
+        lates = np.minimum(late_probability * factor, 1 - defaults) + defaults
+
+        draws = rng.random((block, len(default_loss)), dtype=np.float32)
+        loan_losses = np.where(draws < defaults, default_loss, np.where(draws < lates, late_loss, 0))
+        losses[first:first + block] = loan_losses @ groups
+
+    return losses
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def process_pool():
+    """
+    The simulation process pool, created on first use in each process and
+    kept for later runs. Its workers are spawned rather than forked: the web
+    process runs scheduler, audit writer and event stream threads, and a
+    fork would copy their locks mid-use.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _simulate_part(arguments):
+    """Process pool entry point"""
+    args, kwargs = arguments
+    return simulate_losses(*args, **kwargs)
+
+def simulate_losses_parallel(default_probability, late_probability, exposure, groups, scenarios,
+                             workers=1, seed=None, **kwargs):
+    """
+    Run simulate_losses, splitting the scenarios into ``workers`` parts run
+    on the shared process pool when it is more than one. Each part gets an
+    independent random stream spawned from ``seed``.
+    """
+    if workers <= 1:
+        return simulate_losses(default_probability, late_probability, exposure, groups, scenarios,
+                               seed=seed, **kwargs)
+
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    parts = [scenarios // workers + (1 if worker < scenarios % workers else 0) for worker in range(workers)]
+    tasks = [
+        ((default_probability, late_probability, exposure, groups, part), dict(kwargs, seed=part_seed))
+        for part, part_seed in zip(parts, seeds) if part
+    ]
+    return np.vstack(list(process_pool().map(_simulate_part, tasks)))
+
+def loss_summary(losses):
+    """Expected loss and value-at-risk of a vector of scenario losses"""
+    return {
+        'expected_loss': round(float(losses.mean()), 2),
+        'var_95': round(float(np.quantile(losses, 0.95)), 2),
+        'var_99': round(float(np.quantile(losses, 0.99)), 2)
+    }
+
+def run_loss_simulation(scenarios=10000, workers=1, seed=None, as_of=None, officer_id=None,
+                        lgd=DEFAULT_LGD, late_loss_rate=DEFAULT_LATE_LOSS_RATE,
+                        factor_volatility=DEFAULT_FACTOR_VOLATILITY):
+    """
+    Estimate expected loss, VaR95 and VaR99 of the active book, for the
+    whole portfolio and per officer and per loan purpose
+    """
+    as_of = as_of or date.today()
+    backfill_installments()
+
+    query = loan_history_query(as_of)
+    if officer_id:
+        query = query.filter(Loan.account_officer_id == officer_id)
+    rows = query.all()
+
+    report = {
+        'as_of': as_of.isoformat(),
+        'scenarios': scenarios,
+        'loan_count': len(rows),
+        'assumptions': {
+            'loss_given_default': lgd,
+            'late_loss_rate': late_loss_rate,
+            'factor_volatility': factor_volatility
+        }
+    }
+    if not rows:
+        return dict(report, exposure=0, portfolio=loss_summary(np.zeros(1)), officers=[], purposes=[])
+
+    _, officers, purposes, exposure, due, missed, late = zip(*rows)
+    exposure = np.maximum(np.array(exposure, dtype=float), 0)
+    default_probability, late_probability = estimate_probabilities(due, missed, late, portfolio_default_rate())
+
+    # One column for the whole book, then one per officer and one per purpose
+    officer_ids = sorted(set(officers))
+    purpose_names = sorted(set(purposes))
+    groups = np.zeros((len(rows), 1 + len(officer_ids) + len(purpose_names)), dtype=np.float32)
+    groups[:, 0] = 1
+    groups[np.arange(len(rows)), 1 + np.searchsorted(officer_ids, officers)] = 1
+    groups[np.arange(len(rows)), 1 + len(officer_ids) + np.searchsorted(purpose_names, purposes)] = 1
+
+    losses = simulate_losses_parallel(
+        default_probability, late_probability, exposure, groups, scenarios,
+        workers=workers, seed=seed, lgd=lgd, late_loss_rate=late_loss_rate,
+        factor_volatility=factor_volatility
+    )
+
+    officer_names = dict(db.session.query(User.id, User.full_name).filter(User.id.in_(officer_ids)))
+
+    def group_report(column, **fields):
+        members = groups[:, column] > 0
+        return dict(
+            fields,
+            loan_count=int(members.sum()),
+            exposure=round(float(exposure[members].sum()), 2),
+            mean_default_probability=round(float(default_probability[members].mean()), 4),
+            mean_late_probability=round(float(late_probability[members].mean()), 4),
+            **loss_summary(losses[:, column])
+        )
+
+    return dict(
+        report,
+        exposure=round(float(exposure.sum()), 2),
+        portfolio=group_report(0),
+        officers=[
+            group_report(1 + index, officer_id=officer, officer_name=officer_names.get(officer))
+            for index, officer in enumerate(officer_ids)
+        ],
+        purposes=[
+            group_report(1 + len(officer_ids) + index, loan_purpose=purpose)
+            for index, purpose in enumerate(purpose_names)
+        ]
+    )
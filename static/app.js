@@ -95,6 +95,7 @@ async function logout() {
         });
         
         currentUser = null;
+        unsubscribeDashboardEvents();
         showLoginInterface();
         showAlert('Logged out successfully', 'info');
     } catch (error) {
@@ -181,20 +182,17 @@ function hideAllContentSections() {
 // Load dashboard data
 async function loadDashboard() {
     try {
-        // Load dashboard statistics
-        const statsResponse = await apiCall('/admin/dashboard/stats');
-        updateDashboardStats(statsResponse.stats);
-        
-        // Load recent loans
-        const loansResponse = await apiCall('/loans?limit=5');
-        updateRecentLoans(loansResponse.loans);
-        
-        // Load today's payments
-        const paymentsResponse = await apiCall('/payments/today');
-        updateTodayPayments(paymentsResponse);
-        
-        // Load dashboard charts
-        loadDashboardCharts();
+        // Stats, recent loans, today's payments and chart series come in one bundle
+        const dashboard = await apiCall('/admin/dashboard');
+        updateDashboardStats(dashboard.stats);
+        updateRecentLoans(dashboard.recent_loans);
+        updateTodayPayments(dashboard.today);
+        loadDashboardCharts(dashboard.charts);
+        
+        // Keep the figures current from the live event stream
+        dashboardStats = dashboard.stats;
+        dashboardToday = dashboard.today;
+        subscribeDashboardEvents();
         
     } catch (error) {
         console.error('Dashboard load error:', error);
@@ -202,31 +200,135 @@ async function loadDashboard() {
     }
 }
 
-async function loadDashboardCharts() {
-    try {
-        const statsResponse = await apiCall('/admin/dashboard/stats');
-        const stats = statsResponse.stats;
+// Live dashboard updates
+let dashboardStats = null;
+let dashboardToday = null;
+let dashboardEvents = null;
+
+function subscribeDashboardEvents() {
+    if (dashboardEvents || !window.EventSource) {
+        return;
+    }
+    
+    dashboardEvents = new EventSource(`${API_BASE}/events/stream`, { withCredentials: true });
+    
+    // Today's totals as of (re)connecting, then deltas as payments dated today change
+    dashboardEvents.addEventListener('snapshot', event => applyTodaySnapshot(JSON.parse(event.data)));
+    dashboardEvents.addEventListener('today_totals', event => applyTodayTotals(JSON.parse(event.data)));
+    
+    ['payment_recorded', 'payment_updated', 'payment_deleted'].forEach(kind => {
+        dashboardEvents.addEventListener(kind, event => applyPaymentChange(JSON.parse(event.data), kind));
+    });
+    
+    dashboardEvents.addEventListener('loan_created', event => {
+        const loan = JSON.parse(event.data);
+        dashboardStats.total_loans += 1;
+        adjustStatusCount(loan.status, 1);
+        updateDashboardStats(dashboardStats);
+    });
+    
+    dashboardEvents.addEventListener('loan_status_changed', event => {
+        const change = JSON.parse(event.data);
+        adjustStatusCount(change.from, -1);
+        adjustStatusCount(change.to, 1);
+        updateDashboardStats(dashboardStats);
+    });
+    
+    // The server dropped our backlog, reload the whole dashboard
+    dashboardEvents.addEventListener('resync', () => loadDashboard());
+}
 
+function unsubscribeDashboardEvents() {
+    if (dashboardEvents) {
+        dashboardEvents.close();
+        dashboardEvents = null;
+    }
+}
+
+function applyPaymentChange(payment, kind) {
+    dashboardStats.total_collections += payment.change;
+    updateDashboardStats(dashboardStats);
+    
+    // Keep today's payment list in step; its totals come with today_totals
+    if (!dashboardToday || payment.payment_date !== dashboardToday.date) {
+        return;
+    }
+    if (kind === 'payment_recorded') {
+        dashboardToday.payments = [{
+            id: payment.payment_id,
+            loan_id: payment.loan_id,
+            payment_day: payment.payment_day,
+            actual_amount: payment.amount
+        }, ...dashboardToday.payments].slice(0, 5);
+    } else if (kind === 'payment_deleted') {
+        dashboardToday.payments = dashboardToday.payments.filter(existing => existing.id !== payment.payment_id);
+    } else {
+        dashboardToday.payments.forEach(existing => {
+            if (existing.id === payment.payment_id) {
+                existing.actual_amount = payment.amount;
+            }
+        });
+    }
+    updateTodayPayments(dashboardToday);
+}
+
+function applyTodaySnapshot(totals) {
+    if (!dashboardToday || totals.date !== dashboardToday.date) {
+        // The day rolled over while we were connected
+        loadDashboard();
+        return;
+    }
+    setTodayTotals(totals.collected, totals.payments);
+}
+
+function applyTodayTotals(change) {
+    if (!dashboardToday || change.date !== dashboardToday.date) {
+        return;
+    }
+    const summary = dashboardToday.summary;
+    setTodayTotals(summary.total_collected + change.collected_change, summary.total_payments + change.payments_change);
+}
+
+function setTodayTotals(collected, payments) {
+    const summary = dashboardToday.summary;
+    summary.total_collected = collected;
+    summary.total_payments = payments;
+    summary.collection_rate = summary.total_expected ? collected / summary.total_expected * 100 : 0;
+    dashboardStats.today_collections = collected;
+    updateTodayPayments(dashboardToday);
+}
+
+function adjustStatusCount(status, change) {
+    const key = `${status}_loans`;
+    if (key in dashboardStats) {
+        dashboardStats[key] += change;
+    }
+}
+
+function loadDashboardCharts(charts) {
+    try {
         // Loan Status Chart
         const loanStatusCtx = document.getElementById('loanStatusChart').getContext('2d');
         new Chart(loanStatusCtx, {
             type: 'pie',
             data: {
-                labels: ['Active', 'Completed', 'Overdue', 'Defaulted'],
+                labels: charts.loan_status.labels,
                 datasets: [{
                     label: 'Loan Status',
-                    data: [stats.active_loans, stats.completed_loans, stats.overdue_loans, stats.defaulted_loans],
+                    data: charts.loan_status.data,
                     backgroundColor: [
                         'rgba(255, 99, 132, 0.2)',
                         'rgba(54, 162, 235, 0.2)',
                         'rgba(255, 206, 86, 0.2)',
-                        'rgba(75, 192, 192, 0.2)'
+                        'rgba(75, 192, 192, 0.2)',
+                        'rgba(153, 102, 255, 0.2)'
                     ],
                     borderColor: [
                         'rgba(255, 99, 132, 1)',
                         'rgba(54, 162, 235, 1)',
                         'rgba(255, 206, 86, 1)',
-                        'rgba(75, 192, 192, 1)'
+                        'rgba(75, 192, 192, 1)',
+                        'rgba(153, 102, 255, 1)'
                     ],
                     borderWidth: 1
                 }]
@@ -234,8 +336,7 @@ async function loadDashboardCharts() {
         });
 
         // Loans by Purpose Chart
-        const loanPurposeResponse = await apiCall('/reports/loans-by-purpose');
-        const loanPurposeData = loanPurposeResponse.report;
+        const loanPurposeData = charts.loans_by_purpose;
         const loanPurposeCtx = document.getElementById('loanPurposeChart').getContext('2d');
         new Chart(loanPurposeCtx, {
             type: 'doughnut',
@@ -270,16 +371,16 @@ async function loadDashboardCharts() {
         new Chart(loanedVsCollectedCtx, {
             type: 'bar',
             data: {
-                labels: ['Total'],
+                labels: charts.loaned_vs_collected.labels,
                 datasets: [{
                     label: 'Loaned',
-                    data: [stats.total_principal],
+                    data: charts.loaned_vs_collected.loaned,
                     backgroundColor: 'rgba(255, 99, 132, 0.2)',
                     borderColor: 'rgba(255, 99, 132, 1)',
                     borderWidth: 1
                 }, {
                     label: 'Collected',
-                    data: [stats.total_collections],
+                    data: charts.loaned_vs_collected.collected,
                     backgroundColor: 'rgba(54, 162, 235, 0.2)',
                     borderColor: 'rgba(54, 162, 235, 1)',
                     borderWidth: 1
@@ -701,36 +802,18 @@ function filterBorrowers() {
 
 // Export borrowers
 function exportBorrowers() {
-    if (!allBorrowers || allBorrowers.length === 0) {
-        showAlert('No borrowers to export', 'warning');
-        return;
-    }
+    // The server streams every matching borrower, not just the loaded page
+    const params = new URLSearchParams({ format: 'csv' });
+    const searchTerm = document.getElementById('borrowerSearch').value;
+    if (searchTerm) params.append('search', searchTerm);
     
-    // Create CSV content
-    const headers = ['ID', 'Name', 'Phone', 'Address', 'Created Date'];
-    const csvContent = [
-        headers.join(','),
-        ...allBorrowers.map(borrower => [
-            borrower.id,
-            `"${borrower.name}"`,
-            borrower.phone || '',
-            `"${(borrower.address || '').replace(/"/g, '""')}"`,
-            formatDate(borrower.created_at)
-        ].join(','))
-    ].join('\n');
-    
-    // Download file
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
-    a.href = url;
-    a.download = `borrowers_${new Date().toISOString().split('T')[0]}.csv`;
+    a.href = `${API_BASE}/exports/borrowers?${params.toString()}`;
     document.body.appendChild(a);
     a.click();
-    window.URL.revokeObjectURL(url);
     document.body.removeChild(a);
     
-    showAlert('Borrowers exported successfully!', 'success');
+    showAlert('Borrower export started', 'success');
 }
 
 // Create loan for borrower (placeholder)
@@ -808,7 +891,8 @@ function displayLoans(loans) {
             'active': 'success',
             'completed': 'primary',
             'overdue': 'warning',
-            'defaulted': 'danger'
+            'defaulted': 'danger',
+            'written_off': 'dark'
         }[loan.status] || 'secondary';
         
         return `
@@ -1540,7 +1624,7 @@ let currentReportType = null;
 async function loadReports() {
     try {
         // Load quick stats
-        const statsResponse = await apiCall('/admin/dashboard/stats');
+        const statsResponse = await apiCall('/admin/dashboard');
         const stats = statsResponse.stats;
         
         document.getElementById('quickStatsLoans').textContent = stats.total_loans || 0;
@@ -1869,8 +1953,75 @@ function generatePerformanceHTML(report) {
     `;
 }
 
-function exportReport() {
-    showAlert('Export functionality will be implemented soon', 'info');
+async function exportReport() {
+    if (!currentReportType) {
+        showAlert('Please select a report type first', 'warning');
+        return;
+    }
+    
+    try {
+        const params = new URLSearchParams();
+        const startDate = document.getElementById('reportStartDate').value;
+        const endDate = document.getElementById('reportEndDate').value;
+        const userId = document.getElementById('reportUserFilter').value;
+        
+        if (startDate) params.append('start_date', startDate);
+        if (endDate) params.append('end_date', endDate);
+        if (userId) params.append('user_id', userId);
+        
+        const response = await fetch(`${API_BASE}/reports/${currentReportType}/export?${params.toString()}`, {
+            credentials: 'include'
+        });
+        
+        if (response.status === 202) {
+            // Large reports are built by a background job
+            const data = await response.json();
+            showAlert('Large report is being generated, the download will start when it is ready', 'info');
+            waitForReportJob(data.status_url);
+            return;
+        }
+        
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Export failed');
+        }
+        
+        downloadBlob(await response.blob(), `${currentReportType}_${new Date().toISOString().split('T')[0]}.xlsx`);
+        showAlert('Report exported successfully!', 'success');
+        
+    } catch (error) {
+        console.error('Failed to export report:', error);
+        showAlert('Failed to export report: ' + error.message, 'danger');
+    }
+}
+
+async function waitForReportJob(statusUrl) {
+    try {
+        const response = await fetch(statusUrl, { credentials: 'include' });
+        const data = await response.json();
+        
+        if (data.job.status === 'completed') {
+            window.location.href = data.job.download_url;
+        } else if (data.job.status === 'failed') {
+            showAlert('Report export failed: ' + data.job.error, 'danger');
+        } else {
+            setTimeout(() => waitForReportJob(statusUrl), 2000);
+        }
+    } catch (error) {
+        console.error('Failed to check report export:', error);
+        showAlert('Failed to check report export: ' + error.message, 'danger');
+    }
+}
+
+function downloadBlob(blob, filename) {
+    const url = window.URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    window.URL.revokeObjectURL(url);
+    document.body.removeChild(a);
 }
 
 function printReport() {
@@ -0,0 +1,203 @@
+from user import db
+from loans import Loan, DEFAULT_STATUSES
+from payments import Payment
+from archive import archive_of
+from sqlalchemy import func, select, union_all
+from datetime import datetime, date
+import json
+
+import numpy as np
+
+def cohort_of(column):
+    """SQL expression for the YYYY-MM cohort of a date column"""
+    return func.strftime('%Y-%m', column)
+
+def months_between(start, end):
+    """Whole calendar months from ``start`` to ``end`` (Series or scalars)"""
+    return (end.year - start.year) * 12 + (end.month - start.month)
+
+def history_tables():
+    """The (loans, payments) tables of the hot book and of the archive"""
+    return [(Loan.__table__, Payment.__table__), (archive_of(Loan), archive_of(Payment))]
+
+def cohort_fingerprints(as_of):
+    """
+    Fingerprint every start-month cohort with two grouped queries on the
+    hot tables and two on the archive. A cohort whose fingerprint changed
+    has had loans or payments added, edited or deleted since it was cached;
+    archiving moves rows without changing it. The as-of month is included
+    so curves are extended as cohorts age.
+    """
+    loan_stats, payment_stats = {}, {}
+    for loans, payments in history_tables():
+        cohort = cohort_of(loans.c.start_date)
+        for stats, query in (
+            (loan_stats, select(cohort, func.count(loans.c.id), func.sum(loans.c.id), func.max(loans.c.updated_at))
+                .group_by(cohort)),
+            (payment_stats, select(cohort, func.count(payments.c.id), func.sum(payments.c.id), func.max(payments.c.updated_at))
+                .join_from(payments, loans, payments.c.loan_id == loans.c.id).group_by(cohort))
+        ):
+            for month, count, id_sum, last_update in db.session.execute(query):
+                total = stats.setdefault(month, [0, 0, None])
+                total[0] += count
+                total[1] += id_sum or 0
+                if last_update is not None and (total[2] is None or last_update > total[2]):
+                    total[2] = last_update
+
+    fingerprints = {}
+    for month, (count, id_sum, last_update) in loan_stats.items():
+        fingerprints[month] = [as_of.strftime('%Y-%m'), count, id_sum, str(last_update)]
+        if month in payment_stats:
+            count, id_sum, last_update = payment_stats[month]
+            fingerprints[month] += [count, id_sum, str(last_update)]
+
+    return {month: json.dumps(fingerprint) for month, fingerprint in fingerprints.items()}
+
+def load_frame(statement):
+    """Run a select into a DataFrame"""
+    import pandas as pd  # Imported here: only the vintage reports need pandas, and it is slow to import
+    return pd.read_sql(statement, db.session.connection())
+
+def compute_vintage_curves(cohorts, as_of):
+    """
+    Compute vintage curves for the given cohorts in one vectorized pass.
+
+    Archived loans and payments are included. For every cohort and month
+    since disbursement (0 = the start month) the curve holds cumulative collection % of the amount due, and the share of
+    loans completed and defaulted (written off included) by then. Defaults are dated by the loan's
+    last update, as status changes are not timestamped separately.
+    """
+    import pandas as pd
+
+    loan_selects, payment_selects = [], []
+    for loans, payments in history_tables():
+        cohort = cohort_of(loans.c.start_date)
+        loan_selects.append(select(
+            loans.c.id.label('loan_id'),
+            cohort.label('cohort'),
+            loans.c.start_date,
+            loans.c.principal_amount,
+            loans.c.total_amount,
+            loans.c.status,
+            loans.c.actual_end_date,
+            loans.c.updated_at
+        ).where(cohort.in_(cohorts)))
+        payment_selects.append(select(
+            payments.c.loan_id,
+            payments.c.payment_date,
+            payments.c.actual_amount
+        ).join_from(payments, loans, payments.c.loan_id == loans.c.id).where(cohort.in_(cohorts)))
+
+    loans = load_frame(union_all(*loan_selects))
+    payments = load_frame(union_all(*payment_selects))
+
+    for column in ('start_date', 'actual_end_date', 'updated_at'):
+        loans[column] = pd.to_datetime(loans[column])
+    payments['payment_date'] = pd.to_datetime(payments['payment_date'])
+    for column in ('principal_amount', 'total_amount'):
+        loans[column] = loans[column].astype(float)
+    payments['actual_amount'] = payments['actual_amount'].astype(float)
+
+    as_of = pd.Timestamp(as_of)
+    loans['horizon'] = months_between(loans['start_date'].dt, as_of).clip(lower=0)
+
+    payments = payments.merge(loans[['loan_id', 'cohort', 'start_date']], on='loan_id')
+    payments['month'] = months_between(payments['start_date'].dt, payments['payment_date'].dt).clip(lower=0)
+
+    completed = loans[loans['status'] == 'completed'].copy()
+    completed['month'] = months_between(completed['start_date'].dt, completed['actual_end_date'].fillna(as_of).dt).clip(lower=0)
+    defaulted = loans[loans['status'].isin(DEFAULT_STATUSES)].copy()
+    defaulted['month'] = months_between(defaulted['start_date'].dt, defaulted['updated_at'].dt).clip(lower=0)
+
+    cohort_stats = loans.groupby('cohort').agg(
+        loan_count=('loan_id', 'size'),
+        principal=('principal_amount', 'sum'),
+        total_due=('total_amount', 'sum'),
+        horizon=('horizon', 'max')
+    )
+
+    months = int(cohort_stats['horizon'].max()) if len(cohort_stats) else 0
+
+    def cumulative(frame, value=None):
+        """Cohort x month matrix of cumulative sums (or counts)"""
+        grouped = frame.groupby(['cohort', 'month'])
+        totals = grouped[value].sum() if value else grouped.size()
+        matrix = totals.unstack('month', fill_value=0)
+        matrix = matrix.reindex(index=cohort_stats.index, columns=range(months + 1), fill_value=0)
+        return matrix.cumsum(axis=1).to_numpy(dtype=float)
+
+    loan_counts = cohort_stats['loan_count'].to_numpy(dtype=float)[:, None]
+    total_due = cohort_stats['total_due'].to_numpy(dtype=float)[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        collection = np.nan_to_num(cumulative(payments, 'actual_amount') / total_due * 100)
+        completion = cumulative(completed) / loan_counts * 100
+        default = cumulative(defaulted) / loan_counts * 100
+
+    curves = {}
+    for row, (month, stats) in enumerate(cohort_stats.iterrows()):
+        horizon = int(stats['horizon'])
+        curves[month] = {
+            'cohort': month,
+            'loan_count': int(stats['loan_count']),
+            'principal_disbursed': round(float(stats['principal']), 2),
+            'total_due': round(float(stats['total_due']), 2),
+            'curve': [
+                {
+                    'month': offset,
+                    'collection_pct': round(float(collection[row, offset]), 2),
+                    'completion_pct': round(float(completion[row, offset]), 2),
+                    'default_pct': round(float(default[row, offset]), 2)
+                }
+                for offset in range(horizon + 1)
+            ]
+        }
+    return curves
+
+def get_vintage_curves(as_of=None):
+    """
+    Get vintage curves for every cohort, recomputing only the cohorts whose
+    loans or payments changed since they were cached.
+    """
+    as_of = as_of or date.today()
+    fingerprints = cohort_fingerprints(as_of)
+    cached = {row.cohort: row for row in VintageCohort.query.all()}
+
+    stale = sorted(
+        cohort for cohort, fingerprint in fingerprints.items()
+        if cohort not in cached or cached[cohort].fingerprint != fingerprint
+    )
+
+    if stale:
+        for cohort, curve in compute_vintage_curves(stale, as_of).items():
+            row = cached.get(cohort) or VintageCohort(cohort=cohort)
+            row.fingerprint = fingerprints[cohort]
+            row.curve = json.dumps(curve)
+            row.computed_at = datetime.utcnow()
+            db.session.add(row)
+            cached[cohort] = row
+
+    # Cohorts whose loans were all deleted
+    for cohort in [cohort for cohort in cached if cohort not in fingerprints]:
+        db.session.delete(cached.pop(cohort))
+
+    db.session.commit()
+
+    return {
+        'cohorts': [json.loads(cached[cohort].curve) for cohort in sorted(cached)],
+        'recomputed': stale
+    }
+
+
+# Model Definition
+class VintageCohort(db.Model):
+    __tablename__ = 'vintage_cohorts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cohort = db.Column(db.String(7), unique=True, nullable=False)  # YYYY-MM
+    fingerprint = db.Column(db.Text, nullable=False)
+    curve = db.Column(db.Text, nullable=False)  # JSON encoded curve
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<VintageCohort {self.cohort}>'